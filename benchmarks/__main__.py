@@ -0,0 +1,4 @@
+from benchmarks.suite import cli
+
+if __name__ == "__main__":
+    cli()
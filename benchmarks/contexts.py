@@ -0,0 +1,175 @@
+import random
+
+
+def synthetic_socket(
+    *, slug, example_value_size=8, is_image=False, is_json=True
+):
+    """
+    Returns a socket of an image, a JSON value or a non-JSON file.
+
+    JSON example values are objects with `example_value_size` keys.
+    """
+    if is_image:
+        return {
+            "slug": slug,
+            "kind": "Image",
+            "super_kind": "Image",
+            "relative_path": f"images/{slug}",
+            "example_value": None,
+        }
+
+    if is_json:
+        return {
+            "slug": slug,
+            "kind": "Anything",
+            "super_kind": "Value",
+            "relative_path": f"{slug}.json",
+            "example_value": {
+                f"key-{idx}": [idx, f"value-{idx}"]
+                for idx in range(example_value_size)
+            },
+        }
+
+    return {
+        "slug": slug,
+        "kind": "Anything",
+        "super_kind": "File",
+        "relative_path": slug,
+        "example_value": None,
+    }
+
+
+def _synthetic_sockets(*, rng, prefix, count, example_value_size, image_share):
+    return [
+        synthetic_socket(
+            slug=f"{prefix}-socket-{idx}",
+            example_value_size=example_value_size,
+            is_image=rng.random() < image_share,
+            is_json=rng.random() < 0.75,
+        )
+        for idx in range(count)
+    ]
+
+
+def synthetic_interfaces(
+    *,
+    rng,
+    prefix,
+    interfaces,
+    sockets_per_interface,
+    example_value_size,
+    image_share,
+):
+    return [
+        {
+            kind: _synthetic_sockets(
+                rng=rng,
+                prefix=f"{prefix}-interface-{idx}-{kind}",
+                count=sockets_per_interface,
+                example_value_size=example_value_size,
+                image_share=image_share,
+            )
+            for kind in ("inputs", "outputs")
+        }
+        for idx in range(interfaces)
+    ]
+
+
+def synthetic_pack_context(
+    *,
+    phases=2,
+    interfaces_per_phase=2,
+    sockets_per_interface=4,
+    example_value_size=8,
+    image_share=0.5,
+    seed=0,
+):
+    """
+    Returns a large, valid, pack context.
+
+    The same arguments always result in the same context.
+
+    Args
+    ----
+        phases (int): Number of phases, each with its own archive.
+        interfaces_per_phase (int): Number of algorithm interfaces per phase.
+        sockets_per_interface (int): Number of inputs and of outputs per
+        interface, also used for the additional evaluation sockets.
+        example_value_size (int): Number of keys in JSON example values.
+        image_share (float): Fraction, between 0 and 1, of image sockets.
+        seed (int): Seed of the kinds of sockets.
+    """
+    rng = random.Random(seed)
+
+    archives = [
+        {
+            "slug": f"archive-{idx}",
+            "url": f"https://grand-challenge.org/archives/archive-{idx}/",
+        }
+        for idx in range(phases)
+    ]
+
+    return {
+        "challenge": {
+            "slug": "synthetic-challenge",
+            "url": "https://synthetic-challenge.grand-challenge.org/",
+            "archives": archives,
+            "phases": [
+                {
+                    "slug": f"phase-{idx}",
+                    "archive": archive,
+                    "algorithm_interfaces": synthetic_interfaces(
+                        rng=rng,
+                        prefix=f"phase-{idx}",
+                        interfaces=interfaces_per_phase,
+                        sockets_per_interface=sockets_per_interface,
+                        example_value_size=example_value_size,
+                        image_share=image_share,
+                    ),
+                    **{
+                        f"evaluation_additional_{kind}": _synthetic_sockets(
+                            rng=rng,
+                            prefix=f"phase-{idx}-additional-{kind}",
+                            count=sockets_per_interface,
+                            example_value_size=example_value_size,
+                            image_share=image_share,
+                        )
+                        for kind in ("inputs", "outputs")
+                    },
+                }
+                for idx, archive in enumerate(archives)
+            ],
+        }
+    }
+
+
+def synthetic_algorithm_template_context(
+    *,
+    interfaces=2,
+    sockets_per_interface=4,
+    example_value_size=8,
+    image_share=0.5,
+    seed=0,
+):
+    """
+    Returns a large, valid, algorithm template context.
+
+    See `synthetic_pack_context` for a description of the arguments.
+    """
+    rng = random.Random(seed)
+
+    return {
+        "algorithm": {
+            "title": "A synthetic algorithm",
+            "slug": "synthetic-algorithm",
+            "url": "https://grand-challenge.org/algorithms/synthetic/",
+            "algorithm_interfaces": synthetic_interfaces(
+                rng=rng,
+                prefix="algorithm",
+                interfaces=interfaces,
+                sockets_per_interface=sockets_per_interface,
+                example_value_size=example_value_size,
+                image_share=image_share,
+            ),
+        }
+    }
@@ -0,0 +1,331 @@
+import json
+import platform
+import statistics
+import tempfile
+import time
+import zipfile
+from functools import partial
+from io import BytesIO
+from pathlib import Path
+
+import click
+
+from benchmarks.contexts import (
+    synthetic_algorithm_template_context,
+    synthetic_pack_context,
+)
+from grand_challenge_forge.forge import (
+    generate_algorithm_template,
+    generate_challenge_pack,
+)
+from grand_challenge_forge.generation_utils import zipfile_to_filesystem
+from grand_challenge_forge.schemas import validate_pack_context
+from grand_challenge_forge.sinks import MemorySink, ZipSink
+from grand_challenge_forge.utils import get_forge_version
+
+BASELINE_PATH = Path(__file__).parent / "baseline.json"
+
+SCENARIOS = {
+    "small": {
+        "phases": 1,
+        "interfaces_per_phase": 1,
+        "sockets_per_interface": 2,
+        "example_value_size": 4,
+        "image_share": 0.5,
+    },
+    "large": {
+        "phases": 8,
+        "interfaces_per_phase": 4,
+        "sockets_per_interface": 8,
+        "example_value_size": 64,
+        "image_share": 0.5,
+    },
+    "many-values": {
+        "phases": 2,
+        "interfaces_per_phase": 2,
+        "sockets_per_interface": 16,
+        "example_value_size": 1024,
+        "image_share": 0.0,
+    },
+}
+
+
+def _bench_validate_pack_context(*, pack_context, **_):
+    validate_pack_context(pack_context)
+
+
+def _bench_generate_challenge_pack(*, pack_context, **_):
+    with zipfile.ZipFile(BytesIO(), "w") as zip_file:
+        generate_challenge_pack(
+            output_zip_file=zip_file,
+            target_zpath=Path("pack"),
+            context=pack_context,
+        )
+
+
+def _bench_generate_algorithm_template(*, algorithm_context, **_):
+    with zipfile.ZipFile(BytesIO(), "w") as zip_file:
+        generate_algorithm_template(
+            output_zip_file=zip_file,
+            target_zpath=Path("template"),
+            context=algorithm_context,
+        )
+
+
+def _bench_zipfile_to_filesystem(*, pack_context, output_path, **_):
+    with zipfile_to_filesystem(output_path=output_path) as sink:
+        generate_challenge_pack(
+            output_zip_file=sink,
+            target_zpath=Path("pack"),
+            context=pack_context,
+        )
+
+
+def _bench_zip(*, pack_members, compression, max_workers=None, **_):
+    # Only times building the zip: the members are rendered beforehand
+    buffer = BytesIO()
+    with zipfile.ZipFile(buffer, "w") as zip_file:
+        with ZipSink(
+            zip_file, compression=compression, max_workers=max_workers
+        ) as sink:
+            pack_members.replay(sink)
+    return len(buffer.getvalue())
+
+
+BENCHMARKS = {
+    "validate_pack_context": _bench_validate_pack_context,
+    "generate_challenge_pack": _bench_generate_challenge_pack,
+    "generate_algorithm_template": _bench_generate_algorithm_template,
+    "zipfile_to_filesystem": _bench_zipfile_to_filesystem,
+    "zip_stored": partial(_bench_zip, compression=zipfile.ZIP_STORED),
+    "zip_deflate": partial(_bench_zip, compression=zipfile.ZIP_DEFLATED),
+    "zip_deflate_parallel": partial(
+        _bench_zip, compression=zipfile.ZIP_DEFLATED, max_workers=4
+    ),
+    "zip_bzip2": partial(_bench_zip, compression=zipfile.ZIP_BZIP2),
+    "zip_lzma": partial(_bench_zip, compression=zipfile.ZIP_LZMA),
+    "zip_lzma_parallel": partial(
+        _bench_zip, compression=zipfile.ZIP_LZMA, max_workers=4
+    ),
+}
+
+
+def time_function(fn, *, repeats, **kwargs):
+    """
+    Returns the wall times, in seconds, of calling fn after a warm-up, and
+    the result of the warm-up call.
+    """
+    result = fn(**kwargs)
+
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn(**kwargs)
+        timings.append(time.perf_counter() - start)
+    return timings, result
+
+
+def run_benchmarks(*, scenarios=None, benchmarks=None, repeats=5):
+    """
+    Times each of the benchmarks for each of the scenarios.
+
+    Args
+    ----
+        scenarios (list, optional): Names of the scenarios to run, defaults
+        to all.
+        benchmarks (list, optional): Names of the benchmarks to run, defaults
+        to all.
+        repeats (int): Number of timed calls of each benchmark.
+
+    Returns
+    -------
+        The results, keyed by '<scenario>/<benchmark>', with metadata.
+    """
+    results = {}
+
+    for scenario in scenarios or SCENARIOS:
+        parameters = SCENARIOS[scenario]
+        pack_context = synthetic_pack_context(**parameters)
+        algorithm_context = synthetic_algorithm_template_context(
+            interfaces=parameters["interfaces_per_phase"],
+            sockets_per_interface=parameters["sockets_per_interface"],
+            example_value_size=parameters["example_value_size"],
+            image_share=parameters["image_share"],
+        )
+        pack_members = MemorySink()
+        generate_challenge_pack(
+            output_zip_file=pack_members,
+            target_zpath=Path("pack"),
+            context=pack_context,
+        )
+
+        for benchmark in benchmarks or BENCHMARKS:
+            with tempfile.TemporaryDirectory() as output_path:
+                timings, size = time_function(
+                    BENCHMARKS[benchmark],
+                    repeats=repeats,
+                    pack_context=pack_context,
+                    algorithm_context=algorithm_context,
+                    pack_members=pack_members,
+                    output_path=Path(output_path),
+                )
+            results[f"{scenario}/{benchmark}"] = {
+                "min": min(timings),
+                "median": statistics.median(timings),
+                "repeats": repeats,
+            }
+            if size is not None:
+                results[f"{scenario}/{benchmark}"]["size"] = size
+
+    return {
+        "metadata": {
+            "grand_challenge_forge_version": get_forge_version(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+        },
+        "results": results,
+    }
+
+
+def compare_results(*, baseline, current, threshold=0.25):
+    """
+    Compares the fastest timings of the current results to the baseline.
+
+    Returns
+    -------
+        A list of (name, baseline, current, relative change, is_regression)
+        for each benchmark that is in both results.
+    """
+    comparison = []
+
+    for name, result in current["results"].items():
+        if name not in baseline["results"]:
+            continue
+
+        before = baseline["results"][name]["min"]
+        after = result["min"]
+        change = (after - before) / before if before else 0.0
+
+        comparison.append((name, before, after, change, change > threshold))
+
+    return comparison
+
+
+def _format_duration(seconds):
+    if seconds < 1:
+        return f"{seconds * 1000:.2f}ms"
+    return f"{seconds:.3f}s"
+
+
+@click.group()
+def cli():
+    """Benchmarks of generating packs and algorithm templates."""
+    pass
+
+
+_scenario_option = click.option(
+    "-s",
+    "--scenario",
+    "scenarios",
+    type=click.Choice(list(SCENARIOS)),
+    multiple=True,
+    help="Scenario to run, can be repeated. Defaults to all.",
+)
+_benchmark_option = click.option(
+    "-b",
+    "--benchmark",
+    "benchmarks",
+    type=click.Choice(list(BENCHMARKS)),
+    multiple=True,
+    help="Benchmark to run, can be repeated. Defaults to all.",
+)
+_repeats_option = click.option(
+    "-r",
+    "--repeats",
+    type=click.IntRange(min=1),
+    default=5,
+    show_default=True,
+)
+
+
+@cli.command()
+@_scenario_option
+@_benchmark_option
+@_repeats_option
+@click.option(
+    "-o",
+    "--output",
+    type=click.Path(dir_okay=False, writable=True),
+    help="Write the results as JSON, for instance to update the baseline.",
+)
+def run(scenarios, benchmarks, repeats, output):
+    """Runs the benchmarks and prints the timings."""
+    results = run_benchmarks(
+        scenarios=scenarios, benchmarks=benchmarks, repeats=repeats
+    )
+
+    for name, result in results["results"].items():
+        size = f" size {result['size']:>10}" if "size" in result else ""
+        click.echo(
+            f"{name:<50} min {_format_duration(result['min']):>10} "
+            f"median {_format_duration(result['median']):>10}{size}"
+        )
+
+    if output:
+        with open(output, "w") as f:
+            json.dump(results, f, indent=2)
+            f.write("\n")
+
+
+@cli.command()
+@click.argument(
+    "baseline",
+    type=click.Path(exists=True, dir_okay=False),
+    default=BASELINE_PATH,
+)
+@click.argument(
+    "current",
+    type=click.Path(exists=True, dir_okay=False),
+    required=False,
+)
+@_scenario_option
+@_benchmark_option
+@_repeats_option
+@click.option(
+    "-t",
+    "--threshold",
+    type=click.FloatRange(min=0),
+    default=0.25,
+    show_default=True,
+    help="Relative slowdown that is reported as a regression.",
+)
+def compare(baseline, current, scenarios, benchmarks, repeats, threshold):
+    """
+    Compares results to a baseline, exiting with 1 on a regression.
+
+    Without CURRENT results, the benchmarks are run first.
+    """
+    with open(baseline) as f:
+        baseline = json.load(f)
+
+    if current:
+        with open(current) as f:
+            current = json.load(f)
+    else:
+        current = run_benchmarks(
+            scenarios=scenarios, benchmarks=benchmarks, repeats=repeats
+        )
+
+    comparison = compare_results(
+        baseline=baseline, current=current, threshold=threshold
+    )
+
+    for name, before, after, change, is_regression in comparison:
+        click.echo(
+            f"{name:<50} {_format_duration(before):>10} -> "
+            f"{_format_duration(after):>10} {change:>+8.1%}"
+            f"{'  REGRESSION' if is_regression else ''}"
+        )
+
+    if any(is_regression for *_, is_regression in comparison):
+        raise click.exceptions.Exit(1)
@@ -0,0 +1,377 @@
+import asyncio
+import concurrent.futures
+import os
+import threading
+from functools import partial
+from pathlib import Path
+
+from grand_challenge_forge.sinks import Sink, _file_mode, _to_bytes, as_sink
+
+# Generations running at the same time in the default executor
+DEFAULT_MAX_WORKERS = min(4, os.cpu_count() or 1)
+
+# Items, members or chunks, produced ahead of the consumer
+MAX_QUEUED = 16
+
+# Interval, in seconds, at which a blocked producer checks for cancellation
+_CANCEL_POLL_INTERVAL = 0.1
+
+_default_executor = None
+_default_executor_lock = threading.Lock()
+
+_END_OF_MEMBER = object()
+_END_OF_MEMBERS = object()
+
+
+def get_default_executor():
+    """
+    Returns the thread pool that generations run in when no executor is
+    provided, shared by all of them so concurrent requests are bounded
+    """
+    global _default_executor
+    with _default_executor_lock:
+        if _default_executor is None:
+            _default_executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=DEFAULT_MAX_WORKERS,
+                thread_name_prefix="grand-challenge-forge",
+            )
+        return _default_executor
+
+
+def _thread_executor(executor):
+    """
+    Returns the executor to generate in. The sinks that members are handed
+    to share state with the caller, so they cannot be sent to a process.
+    """
+    if executor is None:
+        return get_default_executor()
+    if not isinstance(executor, concurrent.futures.ThreadPoolExecutor):
+        raise TypeError(
+            f"Generations run in a ThreadPoolExecutor, not in "
+            f"{type(executor).__name__}"
+        )
+    return executor
+
+
+class _CancellableSink(Sink):
+    """Sink that stops the generation, once cancelled, at the next member"""
+
+    def __init__(self, sink, *, cancelled):
+        self.sink = sink
+        self.cancelled = cancelled
+
+    def _check(self):
+        if self.cancelled.is_set():
+            raise concurrent.futures.CancelledError
+
+    def add(self, zpath, content, *, mode=None):
+        self._check()
+        self.sink.add(zpath, content, mode=mode)
+
+    def add_file(self, source, zpath, *, mode=None):
+        self._check()
+        self.sink.add_file(source, zpath, mode=mode)
+
+    def add_deferred(self, zpath, produce, *, mode=None):
+        self._check()
+        self.sink.add_deferred(zpath, produce, mode=mode)
+
+    def add_chunks(self, zpath, chunks, *, mode=None):
+        self._check()
+
+        def checked():
+            for chunk in chunks:
+                self._check()
+                yield chunk
+
+        self.sink.add_chunks(zpath, checked(), mode=mode)
+
+    def flush(self):
+        flush = getattr(self.sink, "flush", None)
+        if flush is not None:
+            flush()
+
+
+async def _run(generate, *, output_zip_file, executor, **kwargs):
+    executor = _thread_executor(executor)
+    loop = asyncio.get_running_loop()
+    cancelled = threading.Event()
+    future = loop.run_in_executor(
+        executor,
+        partial(
+            generate,
+            output_zip_file=_CancellableSink(
+                as_sink(output_zip_file), cancelled=cancelled
+            ),
+            **kwargs,
+        ),
+    )
+
+    try:
+        return await asyncio.shield(future)
+    except asyncio.CancelledError:
+        cancelled.set()
+        # Only hand back the output once nothing writes to it anymore
+        try:
+            await future
+        except (Exception, asyncio.CancelledError):
+            pass
+        raise
+
+
+async def agenerate_challenge_pack(
+    *, output_zip_file, executor=None, **kwargs
+):
+    """
+    Generates a challenge pack in an executor, without blocking the event
+    loop. See `forge.generate_challenge_pack` for the arguments.
+
+    When the awaiting task is cancelled the generation stops at the next
+    member, the cancellation is raised once it has stopped.
+
+    Args
+    ----
+        output_zip_file (Sink, ZipFile): Output to write the pack to, it is
+        written to from a thread of the executor.
+        executor (ThreadPoolExecutor, optional): Thread pool to generate
+        in, defaults to one shared by all generations (see
+        `get_default_executor`). Process pools are rejected with a
+        TypeError: the output is written to from the generation.
+
+    Returns
+    -------
+        The result of `generate_challenge_pack`.
+    """
+    from grand_challenge_forge.forge import generate_challenge_pack
+
+    return await _run(
+        generate_challenge_pack,
+        output_zip_file=output_zip_file,
+        executor=executor,
+        **kwargs,
+    )
+
+
+async def agenerate_algorithm_template(
+    *, output_zip_file, executor=None, **kwargs
+):
+    """
+    Generates an algorithm template in an executor, without blocking the
+    event loop. See `agenerate_challenge_pack` for cancellation and
+    `forge.generate_algorithm_template` for the arguments.
+    """
+    from grand_challenge_forge.forge import generate_algorithm_template
+
+    return await _run(
+        generate_algorithm_template,
+        output_zip_file=output_zip_file,
+        executor=executor,
+        **kwargs,
+    )
+
+
+class AsyncMember:
+    """
+    A file of a pack or algorithm template, streamed from an executor.
+
+    The content is produced while it is read, and must be read before the
+    next member is requested: content that is left unread is discarded.
+    """
+
+    def __init__(self, path, mode, *, content=None, stream=None):
+        self.path = path
+        self.mode = mode
+        self._content = content
+        self._stream = stream
+
+    def __repr__(self):
+        return f"AsyncMember(path={self.path!r}, mode={self.mode!r})"
+
+    async def chunks(self):
+        """Yields the content as byte chunks"""
+        if self._stream is None:
+            content, self._content = self._content, None
+            if content is not None:
+                yield content
+            return
+
+        while self._stream is not None:
+            chunk = await self._stream.get()
+            if chunk is _END_OF_MEMBER:
+                self._stream = None
+            else:
+                yield chunk
+
+    async def read(self):
+        """Returns the content as bytes"""
+        return b"".join([chunk async for chunk in self.chunks()])
+
+    async def _discard(self):
+        async for _ in self.chunks():
+            pass
+
+
+class _QueueSink(Sink):
+    """
+    Sink that hands members, from the thread that generates them, to an
+    asyncio queue of the event loop. Chunked members are handed over chunk
+    by chunk, so large files are never held as a whole.
+    """
+
+    def __init__(self, *, loop, queue, cancelled):
+        self.loop = loop
+        self.queue = queue
+        self.cancelled = cancelled
+
+    def _put(self, item):
+        if self.cancelled.is_set():
+            raise concurrent.futures.CancelledError
+
+        future = asyncio.run_coroutine_threadsafe(
+            self.queue.put(item), self.loop
+        )
+        # Block while the consumer is behind, but not past a cancellation
+        while True:
+            try:
+                return future.result(timeout=_CANCEL_POLL_INTERVAL)
+            except concurrent.futures.TimeoutError:
+                if self.cancelled.is_set():
+                    future.cancel()
+                    raise concurrent.futures.CancelledError from None
+
+    def add(self, zpath, content, *, mode=None):
+        self._put((Path(zpath), mode, _to_bytes(content)))
+
+    def add_file(self, source, zpath, *, mode=None):
+        if mode is None:
+            mode = _file_mode(source)
+        self.add(zpath, Path(source).read_bytes(), mode=mode)
+
+    def add_chunks(self, zpath, chunks, *, mode=None):
+        self._put((Path(zpath), mode, None))
+        for chunk in chunks:
+            self._put(_to_bytes(chunk))
+        self._put(_END_OF_MEMBER)
+
+
+class _Stream:
+    """Items of a queue, until the generation that fills it is done"""
+
+    def __init__(self, *, queue, future):
+        self.queue = queue
+        self.future = future
+
+    async def get(self):
+        if self.queue.empty() and not self.future.done():
+            getter = asyncio.ensure_future(self.queue.get())
+            try:
+                await asyncio.wait(
+                    {getter, self.future},
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+            finally:
+                getter.cancel()
+            if not getter.cancelled() and getter.done():
+                return getter.result()
+
+        if not self.queue.empty():
+            return self.queue.get_nowait()
+
+        # The generation is done: raise its error, if any
+        self.future.result()
+        return _END_OF_MEMBERS
+
+
+async def _aiter_files(generate, *, target_zpath, executor, **kwargs):
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue(maxsize=MAX_QUEUED)
+    cancelled = threading.Event()
+    future = loop.run_in_executor(
+        executor,
+        partial(
+            generate,
+            output_zip_file=_QueueSink(
+                loop=loop, queue=queue, cancelled=cancelled
+            ),
+            target_zpath=Path(target_zpath),
+            **kwargs,
+        ),
+    )
+    stream = _Stream(queue=queue, future=future)
+
+    member = None
+    try:
+        while True:
+            if member is not None:
+                await member._discard()
+
+            item = await stream.get()
+            if item is _END_OF_MEMBERS:
+                return
+
+            path, mode, content = item
+            if content is None:
+                member = AsyncMember(path, mode, stream=stream)
+            else:
+                member = AsyncMember(path, mode, content=content)
+            yield member
+    finally:
+        # Stop a generation that is abandoned, and wait for it to stop
+        cancelled.set()
+        try:
+            await future
+        except (Exception, asyncio.CancelledError):
+            pass
+
+
+def aiter_pack_files(*, context, target_zpath, executor=None, **kwargs):
+    """
+    Returns an async iterator over the members of a challenge pack, which
+    is generated in an executor while the members are consumed.
+
+    At most `MAX_QUEUED` members, or chunks of large members, are generated
+    ahead of the consumer. Breaking out of the iteration, or cancelling the
+    consuming task, stops the generation.
+
+    Args
+    ----
+        context (dict): The pack context.
+        target_zpath (Path): Path to generate the pack at.
+        executor (ThreadPoolExecutor, optional): Thread pool to generate
+        in, defaults to one shared by all generations (see
+        `get_default_executor`). Process pools are rejected with a
+        TypeError: the members are handed over from the generation.
+        **kwargs: Other arguments of `forge.generate_challenge_pack`.
+
+    Returns
+    -------
+        An async iterator of AsyncMember.
+    """
+    from grand_challenge_forge.forge import generate_challenge_pack
+
+    return _aiter_files(
+        generate_challenge_pack,
+        context=context,
+        target_zpath=target_zpath,
+        executor=_thread_executor(executor),
+        **kwargs,
+    )
+
+
+def aiter_algorithm_template_files(
+    *, context, target_zpath, executor=None, **kwargs
+):
+    """
+    Returns an async iterator over the members of an algorithm template.
+
+    See `aiter_pack_files` for how the members are generated.
+    """
+    from grand_challenge_forge.forge import generate_algorithm_template
+
+    return _aiter_files(
+        generate_algorithm_template,
+        context=context,
+        target_zpath=target_zpath,
+        executor=_thread_executor(executor),
+        **kwargs,
+    )
@@ -0,0 +1,230 @@
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DISK_CACHE_SIZE = 256 * 1024 * 1024  # 256 MiB
+
+
+def hash_key(*parts):
+    """Returns a stable hex digest for the provided str or bytes parts"""
+    digest = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, str):
+            part = part.encode("utf-8")
+        digest.update(len(part).to_bytes(8, "little"))
+        digest.update(part)
+    return digest.hexdigest()
+
+
+class LRUCache:
+    """Thread-safe, bounded, in-memory least-recently-used cache"""
+
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                self._data.move_to_end(key)
+            except KeyError:
+                self.misses += 1
+                return default
+            self.hits += 1
+            return self._data[key]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class DiskCache:
+    """
+    Persistent cache that stores bytes values as files in a directory.
+
+    When the total size exceeds `max_size` the least-recently-used entries,
+    based on their modification time, are evicted.
+
+    Args
+    ----
+        directory (str, Path): Directory to store the entries in.
+        max_size (int): Maximum total size, in bytes, of all entries.
+    """
+
+    suffix = ".cache"
+
+    def __init__(self, directory, *, max_size=DEFAULT_DISK_CACHE_SIZE):
+        self.directory = Path(directory)
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self._size = None
+
+    def _path(self, key):
+        return self.directory / key[:2] / f"{key}{self.suffix}"
+
+    def get(self, key, default=None):
+        path = self._path(key)
+        try:
+            value = path.read_bytes()
+        except (FileNotFoundError, NotADirectoryError):
+            self.misses += 1
+            return default
+
+        self._touch(path)
+        self.hits += 1
+        return value
+
+    def open(self, key):
+        """
+        Returns the entry opened for reading in binary mode, or None.
+
+        An entry that is open can still be read after it is evicted.
+        """
+        path = self._path(key)
+        try:
+            f = open(path, "rb")
+        except (FileNotFoundError, NotADirectoryError):
+            self.misses += 1
+            return None
+
+        self._touch(path)
+        self.hits += 1
+        return f
+
+    @staticmethod
+    def _touch(path):
+        # Mark as recently used
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+    def set(self, key, value):
+        if len(value) > self.max_size:
+            return
+
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        # Write atomically, other processes could be reading the same entry
+        fd, temp_name = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(value)
+            os.replace(temp_name, path)
+        except BaseException:
+            os.remove(temp_name)
+            raise
+
+        self._added(len(value))
+
+    def set_file(self, key, source):
+        """
+        Moves the source file into the cache as the entry for the key.
+
+        The source should be on the same file system as the cache, for
+        instance a temporary file in the cache directory.
+        """
+        size = os.stat(source).st_size
+        if size > self.max_size:
+            os.remove(source)
+            return
+
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(source, path)
+
+        self._added(size)
+
+    def _added(self, size):
+        with self._lock:
+            if self._size is None:
+                self._size = self._total_size()
+            else:
+                self._size += size
+
+            if self._size > self.max_size:
+                self._evict()
+
+    def _entries(self):
+        return [
+            (entry.stat(), entry)
+            for entry in self.directory.glob(f"*/*{self.suffix}")
+        ]
+
+    def _total_size(self):
+        return sum(stat.st_size for stat, _ in self._entries())
+
+    def _evict(self):
+        entries = sorted(self._entries(), key=lambda e: e[0].st_mtime)
+        self._size = sum(stat.st_size for stat, _ in entries)
+
+        for stat, entry in entries:
+            if self._size <= self.max_size:
+                break
+            try:
+                entry.unlink()
+            except FileNotFoundError:
+                pass
+            self._size -= stat.st_size
+            logger.debug(f"Evicted {entry.name} from {self.directory}")
+
+    def clear(self):
+        with self._lock:
+            for _, entry in self._entries():
+                entry.unlink(missing_ok=True)
+            self._size = 0
+
+
+class TieredCache:
+    """
+    Cache of bytes values backed by an in-memory LRU cache and, optionally,
+    by a persistent disk cache.
+
+    Entries found on disk are promoted to memory.
+    """
+
+    def __init__(self, *, memory, disk=None):
+        self.memory = memory
+        self.disk = disk
+
+    def get(self, key, default=None):
+        value = self.memory.get(key)
+        if value is None and self.disk is not None:
+            value = self.disk.get(key)
+            if value is not None:
+                self.memory.set(key, value)
+        return default if value is None else value
+
+    def set(self, key, value):
+        self.memory.set(key, value)
+        if self.disk is not None:
+            self.disk.set(key, value)
+
+    def clear(self):
+        self.memory.clear()
+        if self.disk is not None:
+            self.disk.clear()
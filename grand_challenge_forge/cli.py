@@ -1,18 +1,18 @@
 import json
 import logging
 import shutil
-from importlib import metadata
+import tempfile
+import time
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 from pathlib import Path
 
 import click
 
 from grand_challenge_forge import logger
 from grand_challenge_forge.exceptions import ChallengeForgeError
-from grand_challenge_forge.forge import (
-    generate_algorithm_template,
-    generate_challenge_pack,
-)
-from grand_challenge_forge.generation_utils import zipfile_to_filesystem
+from grand_challenge_forge.sinks import SyncDirectorySink
 from grand_challenge_forge.utils import truncate_with_epsilons
 
 
@@ -39,10 +39,81 @@ def common_options(func):
         is_flag=True,
         default=False,
     )(func)
+    func = click.option(
+        "--sync",
+        is_flag=True,
+        default=False,
+        help=(
+            "Update existing output in place: only write changed files and "
+            "remove stale ones, using a manifest kept next to the output. "
+            "Without a manifest, all files that are not generated are stale. "
+            "Identifiers are derived from --seed, 0 if not given"
+        ),
+    )(func)
     func = click.argument(
         "contexts",
         nargs=-1,
     )(func)
+    func = click.option(
+        "-j",
+        "--jobs",
+        type=click.IntRange(min=1),
+        default=1,
+        show_default=True,
+        help="Number of contexts to process concurrently",
+    )(func)
+    func = click.option(
+        "--profile",
+        is_flag=True,
+        default=False,
+        help="Print a report of where the time goes for each context",
+    )(func)
+    func = click.option(
+        "--profile-json",
+        type=click.Path(dir_okay=False, writable=True),
+        default=None,
+        help="Write the profile reports to this file as JSON",
+    )(func)
+    func = click.option(
+        "--image-stub",
+        callback=_parse_image_stub,
+        default=None,
+        metavar="SHAPE[:PIXEL_TYPE][:compressed]",
+        help=(
+            "Generate synthetic images for image sockets, for instance "
+            "512x512x300:int16:compressed"
+        ),
+    )(func)
+    func = click.option(
+        "--seed",
+        type=int,
+        default=None,
+        help=(
+            "Generate identical output for identical contexts, deriving "
+            "identifiers from this seed"
+        ),
+    )(func)
+    func = click.option(
+        "--source-date-epoch",
+        type=click.IntRange(min=0),
+        envvar="SOURCE_DATE_EPOCH",
+        default=None,
+        help=(
+            "Generate identical output for identical contexts, using this "
+            "timestamp as the current time"
+        ),
+    )(func)
+    func = click.option(
+        "--format",
+        "python_format",
+        type=click.Choice(["never", "verify", "always"]),
+        default="always",
+        show_default=True,
+        help=(
+            "Format rendered Python code with black: always, only verify "
+            "that the templates emitted it formatted, or never"
+        ),
+    )(func)
     func = click.option(
         "-v",
         "--verbose",
@@ -52,8 +123,20 @@ def common_options(func):
     return func
 
 
+def _parse_image_stub(ctx, param, value):
+    from grand_challenge_forge.images import ImageStub
+
+    if value is None:
+        return None
+    try:
+        return ImageStub.parse(value)
+    except ValueError as e:
+        raise click.BadParameter(str(e)) from e
+
+
 @click.group()
-@click.version_option(metadata.version("grand-challenge-forge"), "--version")
+# The version is only looked up when requested
+@click.version_option(None, "--version", package_name="grand-challenge-forge")
 def cli():
     """Main CLI entry point."""
     pass
@@ -61,7 +144,47 @@ def cli():
 
 @cli.command()
 @common_options
-def pack(output, force, contexts, verbose=0):
+@click.option(
+    "--max-workers",
+    type=click.IntRange(min=1),
+    default=None,
+    help="Render the phases of a pack in parallel using this many processes",
+)
+@click.option(
+    "--number-of-cases",
+    type=click.IntRange(min=0),
+    default=None,
+    help=(
+        "Number of archive cases to generate per interface, overrides "
+        "the number_of_cases of the phases  [default: 3]"
+    ),
+)
+@click.option(
+    "--number-of-jobs",
+    type=click.IntRange(min=0),
+    default=None,
+    help=(
+        "Number of algorithm jobs to generate predictions for per "
+        "interface, overrides the number_of_jobs of the phases  [default: 3]"
+    ),
+)
+def pack(
+    output,
+    force,
+    sync,
+    contexts,
+    jobs,
+    profile=False,
+    profile_json=None,
+    verbose=0,
+    max_workers=None,
+    number_of_cases=None,
+    number_of_jobs=None,
+    image_stub=None,
+    seed=None,
+    source_date_epoch=None,
+    python_format="always",
+):
     """
     Generates a challenge pack using provided context.
 
@@ -73,45 +196,109 @@ def pack(output, force, contexts, verbose=0):
 
     _set_verbosity(verbosity=verbose)
 
-    for index, context in enumerate(contexts):
-        resolved_context = _resolve_context(src=context)
-        if resolved_context:
-            try:
-                logger.info(
-                    f"🏗️Started working on pack [{index + 1} of {len(contexts)}]"
-                )
-                with zipfile_to_filesystem(output_path=output_dir) as zip_file:
-                    pack_zpath = Path(
-                        f"{resolved_context['challenge']['slug']}-challenge-pack"
-                    )
-                    generate_challenge_pack(
-                        target_zpath=pack_zpath,
-                        context=resolved_context,
-                        output_zip_file=zip_file,
-                    )
-                    pack_dir = output_dir / pack_zpath
-
-                    if pack_dir.exists():
-                        if force:
-                            shutil.rmtree(pack_dir)
-                        else:
-                            raise ChallengeForgeError(
-                                f"Pack {pack_dir.stem!r} already exists!"
-                            )
-
-                logger.info(f"📦 Created Pack {pack_dir.stem!r}")
-                logger.info(f"📢 Pack is here: {pack_dir}")
-                print(str(pack_dir))
-            except Exception as e:
-                if isinstance(e, ChallengeForgeError):
-                    logger.error(f"💔 {e}", exc_info=True)
-                else:
-                    raise e
+    _forge_contexts(
+        forge=partial(
+            _forge_pack,
+            total=len(contexts),
+            output_dir=output_dir,
+            force=force,
+            sync=sync,
+            max_workers=max_workers,
+            number_of_cases=number_of_cases,
+            number_of_jobs=number_of_jobs,
+            image_stub=image_stub,
+            reproducible=_reproducible(
+                seed=seed, source_date_epoch=source_date_epoch, sync=sync
+            ),
+            python_format=python_format,
+            profile=profile or bool(profile_json),
+        ),
+        contexts=contexts,
+        jobs=jobs,
+        verbosity=verbose,
+        description="Packs",
+        print_profiles=profile,
+        profile_json=profile_json,
+    )
+
+
+def _forge_pack(
+    index,
+    context,
+    *,
+    total,
+    output_dir,
+    force,
+    sync,
+    max_workers,
+    profile,
+    number_of_cases=None,
+    number_of_jobs=None,
+    image_stub=None,
+    reproducible=None,
+    python_format=None,
+):
+    from grand_challenge_forge.forge import generate_challenge_pack
+
+    resolved_context = _resolve_context(src=context)
+    if not resolved_context:
+        return None
+
+    try:
+        logger.info(f"🏗️Started working on pack [{index + 1} of {total}]")
+        pack_zpath = Path(
+            f"{resolved_context['challenge']['slug']}-challenge-pack"
+        )
+        pack_dir = output_dir / pack_zpath
+
+        replace = pack_dir.exists() and not sync
+        if replace and not force:
+            raise ChallengeForgeError(
+                f"Pack {pack_dir.stem!r} already exists!"
+            )
+
+        with _output_sink(
+            output_dir=output_dir,
+            zpath=pack_zpath,
+            sync=sync,
+            replace=replace,
+        ) as zip_file:
+            report = generate_challenge_pack(
+                target_zpath=pack_zpath,
+                context=resolved_context,
+                output_zip_file=zip_file,
+                max_workers=max_workers,
+                number_of_cases=number_of_cases,
+                number_of_jobs=number_of_jobs,
+                image_stub=image_stub,
+                reproducible=reproducible,
+                python_format=python_format,
+                profile=profile,
+            )
+
+        logger.info(f"📦 Created Pack {pack_dir.stem!r}")
+        logger.info(f"📢 Pack is here: {pack_dir}")
+        return pack_dir, report
+    except ChallengeForgeError as e:
+        logger.error(f"💔 {e}", exc_info=True)
 
 
 @cli.command()
 @common_options
-def algorithm(output, force, contexts, verbose):
+def algorithm(
+    output,
+    force,
+    sync,
+    contexts,
+    jobs,
+    profile,
+    profile_json,
+    verbose,
+    image_stub=None,
+    seed=None,
+    source_date_epoch=None,
+    python_format="always",
+):
     """
     Generates an algorithm template using provided context.
 
@@ -124,44 +311,339 @@ def algorithm(output, force, contexts, verbose):
 
     _set_verbosity(verbosity=verbose)
 
-    for index, context in enumerate(contexts):
-        resolved_context = _resolve_context(src=context)
-        if resolved_context:
-            try:
-                logger.info(
-                    f"🏗️Started working on Algorithm Template [{index + 1} "
-                    f"of {len(contexts)}]"
-                )
-
-                with zipfile_to_filesystem(output_path=output_dir) as zip_file:
-                    template_zpath = Path(
-                        f"{resolved_context['algorithm']['slug']}-template"
-                    )
-                    generate_algorithm_template(
-                        target_zpath=template_zpath,
-                        context=resolved_context,
-                        output_zip_file=zip_file,
+    _forge_contexts(
+        forge=partial(
+            _forge_algorithm_template,
+            total=len(contexts),
+            output_dir=output_dir,
+            force=force,
+            sync=sync,
+            image_stub=image_stub,
+            reproducible=_reproducible(
+                seed=seed, source_date_epoch=source_date_epoch, sync=sync
+            ),
+            python_format=python_format,
+            profile=profile or bool(profile_json),
+        ),
+        contexts=contexts,
+        jobs=jobs,
+        verbosity=verbose,
+        description="Algorithm Templates",
+        print_profiles=profile,
+        profile_json=profile_json,
+    )
+
+
+def _forge_algorithm_template(
+    index,
+    context,
+    *,
+    total,
+    output_dir,
+    force,
+    sync,
+    profile,
+    image_stub=None,
+    reproducible=None,
+    python_format=None,
+):
+    from grand_challenge_forge.forge import generate_algorithm_template
+
+    resolved_context = _resolve_context(src=context)
+    if not resolved_context:
+        return None
+
+    try:
+        logger.info(
+            f"🏗️Started working on Algorithm Template [{index + 1} "
+            f"of {total}]"
+        )
+
+        template_zpath = Path(
+            f"{resolved_context['algorithm']['slug']}-template"
+        )
+        template_dir = output_dir / template_zpath
+
+        replace = template_dir.exists() and not sync
+        if replace and not force:
+            raise ChallengeForgeError(
+                f"Algorithm Template {template_dir.stem!r} " "already exists!"
+            )
+
+        with _output_sink(
+            output_dir=output_dir,
+            zpath=template_zpath,
+            sync=sync,
+            replace=replace,
+        ) as zip_file:
+            report = generate_algorithm_template(
+                target_zpath=template_zpath,
+                context=resolved_context,
+                output_zip_file=zip_file,
+                image_stub=image_stub,
+                reproducible=reproducible,
+                python_format=python_format,
+                profile=profile,
+            )
+
+        logger.info(f"📦 Created Algorithm Template {template_dir.stem!r}")
+        logger.info(f"📢 Algorithm Template is here: {template_dir}")
+        return template_dir, report
+    except ChallengeForgeError as e:
+        logger.error(f"💔 {e}")
+
+
+@cli.command()
+@click.option(
+    "--stdio",
+    is_flag=True,
+    default=False,
+    help="Answer line-delimited JSON requests on stdin instead of HTTP",
+)
+@click.option("--host", default="127.0.0.1", show_default=True)
+@click.option(
+    "--port",
+    type=click.IntRange(min=0, max=65535),
+    default=8000,
+    show_default=True,
+    help="Port to listen on, 0 picks a free port",
+)
+@click.option(
+    "--workers",
+    type=click.IntRange(min=0),
+    default=0,
+    show_default=True,
+    help="Number of worker processes, 0 renders in the server process",
+)
+@click.option(
+    "--max-concurrency",
+    type=click.IntRange(min=1),
+    default=4,
+    show_default=True,
+    help="Maximum number of requests rendered at the same time",
+)
+@click.option(
+    "--compression",
+    type=click.Choice(["stored", "deflate", "bzip2", "lzma"]),
+    default="deflate",
+    show_default=True,
+    help="Compression of the members of the zip files",
+)
+@click.option(
+    "--compression-level",
+    type=click.IntRange(min=0, max=9),
+    default=None,
+    help="Level of compression, defaults to that of the compression",
+)
+@click.option(
+    "--compression-workers",
+    type=click.IntRange(min=1),
+    default=None,
+    help="Compress the members of a zip file using this many threads",
+)
+@click.option(
+    "--result-cache",
+    type=click.Path(file_okay=False, writable=True, resolve_path=True),
+    default=None,
+    help="Cache zip files in this directory and serve repeated requests",
+)
+@click.option(
+    "--result-cache-size",
+    type=click.IntRange(min=1),
+    default=1024,
+    show_default=True,
+    help="Maximum size, in MiB, of the result cache",
+)
+@click.option(
+    "-v",
+    "--verbose",
+    count=True,
+    help="Sets verbosity level. Stacks (e.g. -vv = debug)",
+)
+def serve(
+    stdio,
+    host,
+    port,
+    workers,
+    max_concurrency,
+    compression,
+    compression_level,
+    compression_workers,
+    result_cache,
+    result_cache_size,
+    verbose,
+):
+    """
+    Serves pack and algorithm template generation, keeping the generator
+    warm between requests.
+
+    Over HTTP, POST a context to /pack or /algorithm to get a zip file.
+    Over stdio, send one JSON request per line: {"id": ..., "kind": "pack"
+    or "algorithm", "context": {...}}. Each response line holds the id and
+    the base64 encoded zip, or an error.
+    """
+    from grand_challenge_forge.result_cache import ResultCache
+    from grand_challenge_forge.server import (
+        ForgeService,
+        make_http_server,
+        serve_stdio,
+    )
+    from grand_challenge_forge.sinks import get_compression
+
+    _set_verbosity(verbosity=verbose)
+
+    try:
+        compression = get_compression(compression)
+    except ValueError as e:
+        raise click.BadParameter(str(e), param_hint="--compression") from e
+
+    with ForgeService(
+        workers=workers,
+        max_concurrency=max_concurrency,
+        compression=compression,
+        compresslevel=compression_level,
+        compression_workers=compression_workers,
+        result_cache=(
+            ResultCache(result_cache, max_size=result_cache_size * 1024**2)
+            if result_cache
+            else None
+        ),
+    ) as service:
+        if stdio:
+            serve_stdio(service)
+            return
+
+        server = make_http_server(service, host=host, port=port)
+        click.echo(
+            f"🔥 Serving on http://{host}:{server.server_address[1]}",
+            err=True,
+        )
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+
+
+def _reproducible(*, seed, source_date_epoch, sync=False):
+    from grand_challenge_forge.reproducibility import Reproducible
+
+    if seed is None and source_date_epoch is None:
+        if not sync:
+            return None
+        # Synced members are only unchanged if their identifiers are: derive
+        # those from the default seed, but keep using the current time
+        return Reproducible(timestamp=int(time.time()))
+
+    settings = Reproducible(seed=seed or 0)
+    if source_date_epoch is not None:
+        settings = settings._replace(timestamp=source_date_epoch)
+    return settings
+
+
+@contextmanager
+def _output_sink(*, output_dir, zpath, sync, replace=False):
+    """
+    Context manager that provides the sink to generate the output at zpath
+    in the output directory with.
+
+    Unless syncing, the output is generated in a temporary directory next
+    to it and only moved in place once generation succeeded, so a failed
+    generation leaves no output, or the output it would replace, behind.
+    """
+    from grand_challenge_forge.generation_utils import zipfile_to_filesystem
+
+    manifest_path = output_dir / f".{zpath}.manifest.json"
+
+    if sync:
+        with SyncDirectorySink(
+            output_dir, manifest_path=manifest_path, root=zpath
+        ) as sink:
+            yield sink
+        return
+
+    output_dir.mkdir(parents=True, exist_ok=True)
+    staging_dir = Path(tempfile.mkdtemp(prefix=f".{zpath}.", dir=output_dir))
+    try:
+        with zipfile_to_filesystem(output_path=staging_dir) as sink:
+            yield sink
+        if replace:
+            shutil.rmtree(output_dir / zpath)
+        (staging_dir / zpath).rename(output_dir / zpath)
+        # The manifest of an earlier sync no longer describes the output
+        manifest_path.unlink(missing_ok=True)
+    finally:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+
+
+def _forge_contexts(
+    *,
+    forge,
+    contexts,
+    jobs,
+    verbosity,
+    description,
+    print_profiles=False,
+    profile_json=None,
+):
+    """
+    Forges each of the contexts, optionally using a pool of processes.
+
+    Output directories are printed in the order of the contexts. Failures
+    because of a ChallengeForgeError are logged by the forge function, any
+    other exception propagates.
+
+    The forge function returns the output directory and the profile report,
+    or None if it failed.
+    """
+    start = time.perf_counter()
+    succeeded = 0
+    reports = []
+
+    if jobs > 1 and len(contexts) > 1:
+        executor = ProcessPoolExecutor(
+            max_workers=jobs,
+            initializer=_set_verbosity,
+            initargs=(verbosity,),
+        )
+        results = executor.map(forge, range(len(contexts)), contexts)
+    else:
+        executor = None
+        results = map(forge, range(len(contexts)), contexts)
+
+    try:
+        for result in results:
+            if result is None:
+                continue
+
+            output_dir, report = result
+            succeeded += 1
+            print(str(output_dir))
+
+            if report is not None:
+                reports.append({"output": str(output_dir), **report.as_dict()})
+                if print_profiles:
+                    click.echo(
+                        f"⏱️ Profile of {output_dir.name}\n{report.format()}",
+                        err=True,
                     )
-                    template_dir = output_dir / template_zpath
-
-                    if template_dir.exists():
-                        if force:
-                            shutil.rmtree(template_dir)
-                        else:
-                            raise ChallengeForgeError(
-                                f"Algorithm Template {template_dir.stem!r} "
-                                "already exists!"
-                            )
-                logger.info(
-                    f"📦 Created Algorithm Template {template_dir.stem!r}"
-                )
-                logger.info(f"📢 Algorithm Template is here: {template_dir}")
-                print(str(template_dir))
-            except Exception as e:
-                if isinstance(e, ChallengeForgeError):
-                    logger.error(f"💔 {e}")
-                else:
-                    raise
+    finally:
+        if executor:
+            # Do not wait for pending contexts if something went wrong
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    elapsed = time.perf_counter() - start
+    failed = len(contexts) - succeeded
+    click.echo(
+        f"🏁 {description}: {succeeded} succeeded, {failed} failed "
+        f"in {elapsed:.2f}s ({succeeded / elapsed:.2f} per second)",
+        err=True,
+    )
+
+    if profile_json:
+        with open(profile_json, "w") as f:
+            json.dump(reports, f, indent=2)
 
 
 def _set_verbosity(verbosity):
@@ -180,7 +662,7 @@ def _set_verbosity(verbosity):
 
 def _resolve_context(src):
     try:
-        if (p := Path(src)).exists() and p.is_file():
+        if _is_file(p := Path(src)):
             return _read_json_file(p)
         return json.loads(src)
     except json.decoder.JSONDecodeError as e:
@@ -190,6 +672,13 @@ def _resolve_context(src):
         )
 
 
+def _is_file(path):
+    try:
+        return path.is_file()
+    except OSError:  # For instance, a JSON string too long to be a filename
+        return False
+
+
 def _read_json_file(json_file):
     with open(json_file, "r") as f:
         context = json.load(f)
@@ -0,0 +1,181 @@
+import itertools
+import logging
+import os
+import threading
+import weakref
+from pathlib import Path
+
+from grand_challenge_forge.cache import (
+    DEFAULT_DISK_CACHE_SIZE,
+    DiskCache,
+    LRUCache,
+    TieredCache,
+    hash_key,
+)
+from grand_challenge_forge.generation_utils import get_jinja2_environment
+from grand_challenge_forge.template_analysis import (
+    context_digest,
+    find_context_reads,
+)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TEMPLATE_CACHE_SIZE = 400
+DEFAULT_FORMAT_CACHE_SIZE = 256
+DEFAULT_RENDER_CACHE_SIZE = 512
+
+CACHE_DIR = os.getenv("GRAND_CHALLENGE_FORGE_CACHE_DIR")
+
+
+class Forge:
+    """
+    Long-lived rendering engine that keeps warm Jinja2 environments.
+
+    One environment is kept per partials directory. Each environment holds a
+    bounded cache of compiled templates which is invalidated when the
+    modification time of a template source changes.
+
+    A single instance can safely be shared between threads.
+
+    Results of formatting rendered Python code with black are cached in
+    memory and, if a cache directory is provided, on disk.
+
+    Args
+    ----
+        template_cache_size (int): Maximum number of compiled templates
+        to keep per partials directory.
+        format_cache_size (int): Maximum number of formatted sources to keep
+        in memory.
+        render_cache_size (int): Maximum number of rendered templates to keep
+        in memory, 0 disables the render cache.
+        cache_dir (str, Path, optional): Directory for persistent caches.
+        max_cache_dir_size (int): Maximum size, in bytes, of each persistent
+        cache.
+    """
+
+    def __init__(
+        self,
+        *,
+        template_cache_size=DEFAULT_TEMPLATE_CACHE_SIZE,
+        format_cache_size=DEFAULT_FORMAT_CACHE_SIZE,
+        render_cache_size=DEFAULT_RENDER_CACHE_SIZE,
+        cache_dir=None,
+        max_cache_dir_size=DEFAULT_DISK_CACHE_SIZE,
+    ):
+        self._init_kwargs = {
+            "template_cache_size": template_cache_size,
+            "format_cache_size": format_cache_size,
+            "render_cache_size": render_cache_size,
+            "cache_dir": cache_dir,
+            "max_cache_dir_size": max_cache_dir_size,
+        }
+
+        self.template_cache_size = template_cache_size
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+
+        self.format_cache = TieredCache(
+            memory=LRUCache(maxsize=format_cache_size),
+            disk=(
+                DiskCache(
+                    self.cache_dir / "black", max_size=max_cache_dir_size
+                )
+                if self.cache_dir
+                else None
+            ),
+        )
+
+        self.render_cache = (
+            LRUCache(maxsize=render_cache_size) if render_cache_size else None
+        )
+
+        self._environments = {}
+        self._template_reads = weakref.WeakKeyDictionary()
+        self._template_ids = itertools.count()
+        self._lock = threading.Lock()
+
+    def __reduce__(self):
+        # Caches and locks are process-local, only the configuration is
+        # transferred to other processes
+        return (_rebuild_forge, (self._init_kwargs,))
+
+    def get_environment(self, source_path):
+        """Returns the (cached) Jinja2 environment for a partials directory"""
+        key = Path(source_path)
+
+        env = self._environments.get(key)
+        if env is None:
+            with self._lock:
+                env = self._environments.get(key)
+                if env is None:
+                    logger.debug(f"Creating Jinja2 environment for {key}")
+                    env = get_jinja2_environment(
+                        searchpath=key,
+                        cache_size=self.template_cache_size,
+                    )
+                    self._environments[key] = env
+        return env
+
+    def get_template(self, source_path, name):
+        """Returns the compiled template, recompiling only if it changed"""
+        return self.get_environment(source_path).get_template(name=name)
+
+    def get_template_reads(self, template):
+        """
+        Returns an id that is unique to the compiled template and the context
+        paths it reads, analysing the template only once
+        """
+        with self._lock:
+            result = self._template_reads.get(template)
+        if result is not None:
+            return result
+
+        env = template.environment
+        get_context_reads = getattr(env.loader, "get_context_reads", None)
+        reads = (
+            get_context_reads(env, template.name)
+            if get_context_reads
+            else None
+        )
+        if reads is None:
+            source, _, _ = env.loader.get_source(env, template.name)
+            reads = find_context_reads(env.parse(source))
+
+        with self._lock:
+            return self._template_reads.setdefault(
+                template, (str(next(self._template_ids)), reads)
+            )
+
+    def render_key(self, template, context):
+        """
+        Returns the render cache key of the template with the context, which
+        only depends on the context values the template reads
+        """
+        template_id, reads = self.get_template_reads(template)
+        return hash_key(template_id, context_digest(context, reads))
+
+    def clear(self):
+        with self._lock:
+            self._environments.clear()
+            self._template_reads.clear()
+        self.format_cache.memory.clear()
+        if self.render_cache is not None:
+            self.render_cache.clear()
+
+
+def _rebuild_forge(kwargs):
+    return Forge(**kwargs)
+
+
+_default_forge = None
+_default_forge_lock = threading.Lock()
+
+
+def get_default_forge():
+    """Returns the process-wide engine used when none is provided"""
+    global _default_forge
+
+    if _default_forge is None:
+        with _default_forge_lock:
+            if _default_forge is None:
+                _default_forge = Forge(cache_dir=CACHE_DIR)
+    return _default_forge
@@ -8,7 +8,13 @@ class ChallengeForgeError(Exception):
 
 
 class InvalidContextError(ChallengeForgeError):
-    pass
+    # The errors are not in args, __reduce__ pickles and copies them instead
+    def __init__(self, message, errors=()):  # noqa: B042
+        self.errors = list(errors)
+        super().__init__(message)
+
+    def __reduce__(self):
+        return self.__class__, (self.message, self.errors)
 
 
 class OutputOverwriteError(ChallengeForgeError):
@@ -17,3 +23,7 @@ class OutputOverwriteError(ChallengeForgeError):
 
 class QualityFailureError(ChallengeForgeError):
     pass
+
+
+class ServiceBusyError(ChallengeForgeError):
+    pass
@@ -1,64 +1,348 @@
 import json
 import logging
-import uuid
-from copy import deepcopy
-from importlib import metadata
+import textwrap
+from collections import ChainMap
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from functools import partial
 from pathlib import Path
+from types import MappingProxyType
 
+from grand_challenge_forge import reproducibility
 from grand_challenge_forge.generation_utils import (
     copy_and_render,
+    formatting,
     generate_socket_value_stub_file,
+    get_python_format,
+    memoizing_example_values,
     socket_to_socket_value,
 )
+from grand_challenge_forge.images import ImageStub
+from grand_challenge_forge.profiling import (
+    CacheCounters,
+    Profile,
+    ProfiledSink,
+    get_active_profile,
+    profiling,
+    stage,
+)
+from grand_challenge_forge.reproducibility import as_reproducible
 from grand_challenge_forge.schemas import (
     validate_algorithm_template_context,
     validate_pack_context,
 )
+from grand_challenge_forge.sinks import MemorySink, as_sink
+from grand_challenge_forge.utils import get_forge_version
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_NUMBER_OF_CASES = 3
+DEFAULT_NUMBER_OF_JOBS = 3
+
 
 def generate_challenge_pack(
     *,
     output_zip_file,
     target_zpath,
     context,
+    validate=True,
+    engine=None,
+    max_workers=None,
+    number_of_cases=None,
+    number_of_jobs=None,
+    image_stub=None,
+    reproducible=None,
+    python_format=None,
+    profile=None,
+    on_profile=None,
+):
+    """
+    Generates a challenge pack into the output zip file.
+
+    Args
+    ----
+        output_zip_file (Sink, ZipFile): Sink or zip handle to write the pack
+        to.
+        target_zpath (Path): Path in the zip file to generate the pack at.
+        context (dict): The pack context.
+        validate (bool): Validate the context, only skip this for contexts
+        that were validated before.
+        engine (Forge, optional): Engine to render with.
+        max_workers (int, optional): If larger than 1, the phases are
+        rendered in parallel using a pool of this many processes. The output
+        is identical to that of rendering serially.
+        number_of_cases (int, optional): Number of archive cases to generate
+        per interface, overriding the number_of_cases of the phases.
+        Defaults to that of each phase, or 3.
+        number_of_jobs (int, optional): Number of algorithm jobs to generate
+        predictions for per interface, overriding the number_of_jobs of the
+        phases. Defaults to that of each phase, or 3.
+        image_stub (ImageStub, optional): Synthetic image to generate for
+        image sockets, overriding the image_stub of the phases. Defaults to
+        that of each phase, or a tiny example image.
+        reproducible (bool, Reproducible, optional): Generate identical
+        output for identical contexts, using the seed and timestamp of the
+        Reproducible. If True the timestamp is taken from SOURCE_DATE_EPOCH.
+        python_format (str, optional): How rendered Python code is
+        formatted: 'always' with black (the default), 'verify' that it is
+        formatted as black would, raising a QualityFailureError if not, or
+        'never', skipping black.
+        profile (bool, Profile, optional): Collect a report of timings and
+        counters. If True a new Profile is used, a Profile is added to.
+        on_profile (callable, optional): Called with the collected Profile,
+        implies profiling.
+
+    Returns
+    -------
+        The Profile if profiling, otherwise None.
+    """
+    with (
+        reproducibility.reproducible(as_reproducible(reproducible)),
+        formatting(python_format),
+        memoizing_example_values(),
+        _profiled(
+            output_zip_file=output_zip_file,
+            engine=engine,
+            profile=profile,
+            on_profile=on_profile,
+        ) as (output_zip_file, profile),
+    ):
+        if validate:
+            with stage("validate"):
+                validate_pack_context(context)
+
+        context = layer_context(
+            context,
+            grand_challenge_forge_version=get_forge_version(),
+        )
+
+        # Generate the README.md file
+        copy_and_render(
+            templates_dir_name="pack-readme",
+            output_zip_file=output_zip_file,
+            target_zpath=target_zpath,
+            context=context,
+            engine=engine,
+        )
+
+        phases = context["challenge"]["phases"]
+
+        if max_workers and max_workers > 1 and len(phases) > 1:
+            _generate_phases_in_parallel(
+                phases=phases,
+                output_zip_file=output_zip_file,
+                target_zpath=target_zpath,
+                engine=engine,
+                max_workers=max_workers,
+                number_of_cases=number_of_cases,
+                number_of_jobs=number_of_jobs,
+                image_stub=image_stub,
+            )
+        else:
+            for phase in phases:
+                generate_phase(
+                    phase=phase,
+                    output_zip_file=output_zip_file,
+                    target_zpath=target_zpath / phase["slug"],
+                    engine=engine,
+                    number_of_cases=number_of_cases,
+                    number_of_jobs=number_of_jobs,
+                    image_stub=image_stub,
+                )
+
+    return profile
+
+
+@contextmanager
+def _profiled(*, output_zip_file, engine, profile, on_profile):
+    """
+    Yields the output sink and the profile that collects while generating.
+
+    Without profiling this yields the plain sink and None.
+    """
+    output_zip_file = as_sink(output_zip_file)
+
+    if not profile and on_profile is None:
+        yield output_zip_file, None
+        return
+
+    from grand_challenge_forge.engine import get_default_forge
+
+    if not isinstance(profile, Profile):
+        profile = Profile()
+
+    counters = CacheCounters(engine or get_default_forge())
+    output_zip_file = ProfiledSink(output_zip_file, profile=profile)
+
+    with profiling(profile), profile.stage("generate"):
+        yield output_zip_file, profile
+        # Include writes that are still pending
+        output_zip_file.flush()
+
+    counters.add_to(profile)
+
+    if on_profile is not None:
+        on_profile(profile)
+
+
+def generate_phase(
+    *,
+    phase,
+    output_zip_file,
+    target_zpath,
+    engine=None,
+    number_of_cases=None,
+    number_of_jobs=None,
+    image_stub=None,
 ):
-    validate_pack_context(context)
+    phase_context = {"phase": phase}
+
+    # Integral numbers such as 2.0 are valid integers in the context
+    if number_of_cases is None:
+        number_of_cases = int(
+            phase.get("number_of_cases", DEFAULT_NUMBER_OF_CASES)
+        )
+    if number_of_jobs is None:
+        number_of_jobs = int(
+            phase.get("number_of_jobs", DEFAULT_NUMBER_OF_JOBS)
+        )
+    if image_stub is None and phase.get("image_stub"):
+        image_stub = ImageStub.from_context(phase["image_stub"])
 
-    context["grand_challenge_forge_version"] = metadata.version(
-        "grand-challenge-forge"
+    generate_upload_to_archive_script(
+        context=phase_context,
+        output_zip_file=output_zip_file,
+        target_zpath=target_zpath / "upload-to-archive",
+        engine=engine,
+        number_of_cases=number_of_cases,
+        image_stub=image_stub,
     )
 
-    # Generate the README.md file
-    copy_and_render(
-        templates_dir_name="pack-readme",
+    generate_example_algorithm(
+        context=phase_context,
         output_zip_file=output_zip_file,
-        target_zpath=target_zpath,
-        context=context,
+        target_zpath=target_zpath / "example-algorithm",
+        engine=engine,
+        image_stub=image_stub,
     )
 
-    for phase in context["challenge"]["phases"]:
-        phase_zpath = target_zpath / phase["slug"]
-        phase_context = {"phase": phase}
+    generate_example_evaluation(
+        context=phase_context,
+        output_zip_file=output_zip_file,
+        target_zpath=target_zpath / "example-evaluation-method",
+        engine=engine,
+        number_of_jobs=number_of_jobs,
+        image_stub=image_stub,
+    )
 
-        generate_upload_to_archive_script(
-            context=phase_context,
-            output_zip_file=output_zip_file,
-            target_zpath=phase_zpath / "upload-to-archive",
-        )
 
-        generate_example_algorithm(
-            context=phase_context,
-            output_zip_file=output_zip_file,
-            target_zpath=phase_zpath / "example-algorithm",
+def _generate_phases_in_parallel(
+    *,
+    phases,
+    output_zip_file,
+    target_zpath,
+    engine,
+    max_workers,
+    number_of_cases=None,
+    number_of_jobs=None,
+    image_stub=None,
+):
+    """
+    Renders each phase in a separate process into its own in-memory sink and
+    adds the members, in phase order, to the output.
+    """
+    profile = get_active_profile()
+
+    with ProcessPoolExecutor(
+        max_workers=max_workers,
+        initializer=_init_phase_worker,
+        initargs=(engine,),
+    ) as executor:
+        results = executor.map(
+            partial(
+                _render_phase,
+                number_of_cases=number_of_cases,
+                number_of_jobs=number_of_jobs,
+                image_stub=image_stub,
+                # Context variables are not passed on to the workers
+                reproducible=reproducibility.get_active_settings(),
+                python_format=get_python_format(),
+            ),
+            phases,
+            [target_zpath / phase["slug"] for phase in phases],
+            [profile is not None] * len(phases),
         )
 
-        generate_example_evaluation(
-            context=phase_context,
-            output_zip_file=output_zip_file,
-            target_zpath=phase_zpath / "example-evaluation-method",
-        )
+        for phase_sink, phase_profile in results:
+            if phase_profile is not None:
+                profile.merge(phase_profile)
+            phase_sink.replay(output_zip_file)
+
+
+_worker_engine = None
+
+
+def _init_phase_worker(engine):
+    global _worker_engine
+    _worker_engine = engine
+
+
+def _render_phase(
+    phase,
+    target_zpath,
+    collect_profile=False,
+    *,
+    number_of_cases=None,
+    number_of_jobs=None,
+    image_stub=None,
+    reproducible=None,
+    python_format=None,
+):
+    sink = MemorySink()
+    generate = partial(
+        _generate_phase_in_context,
+        reproducible=reproducible,
+        python_format=python_format,
+        phase=phase,
+        output_zip_file=sink,
+        target_zpath=target_zpath,
+        engine=_worker_engine,
+        number_of_cases=number_of_cases,
+        number_of_jobs=number_of_jobs,
+        image_stub=image_stub,
+    )
+
+    if not collect_profile:
+        generate()
+        return sink, None
+
+    from grand_challenge_forge.engine import get_default_forge
+
+    # Members are counted when added to the output, in the parent process
+    profile = Profile()
+    counters = CacheCounters(_worker_engine or get_default_forge())
+    with profiling(profile):
+        generate()
+    counters.add_to(profile)
+
+    return sink, profile
+
+
+def _generate_phase_in_context(*, reproducible, python_format, **kwargs):
+    with (
+        reproducibility.reproducible(reproducible),
+        formatting(python_format),
+        memoizing_example_values(),
+    ):
+        generate_phase(**kwargs)
+
+
+def layer_context(context, **derived):
+    """
+    Returns a copy-on-write view of the context with the derived keys
+    layered on top: the caller's context is never modified.
+    """
+    return ChainMap(derived, MappingProxyType(context))
 
 
 def generate_upload_to_archive_script(
@@ -66,8 +350,11 @@ def generate_upload_to_archive_script(
     output_zip_file,
     target_zpath,
     context,
+    engine=None,
+    number_of_cases=DEFAULT_NUMBER_OF_CASES,
+    image_stub=None,
 ):
-    context = deepcopy(context)
+    output_zip_file = as_sink(output_zip_file)
 
     expected_cases_per_interface = {}
     for idx, interface in enumerate(context["phase"]["algorithm_interfaces"]):
@@ -76,7 +363,8 @@ def generate_upload_to_archive_script(
             inputs=interface["inputs"],
             output_zip_file=output_zip_file,
             target_zpath=target_zpath / interface_name,
-            number_of_cases=3,
+            number_of_cases=number_of_cases,
+            image_stub=image_stub,
         )
 
         # Make cases relative to the script
@@ -91,11 +379,10 @@ def generate_upload_to_archive_script(
         for socket in interface["inputs"]:
             all_algorithm_inputs[socket["slug"]] = socket
 
-    context.update(
-        {
-            "all_algorithm_inputs": all_algorithm_inputs,
-            "expected_cases_per_interface": expected_cases_per_interface,
-        }
+    context = layer_context(
+        context,
+        all_algorithm_inputs=all_algorithm_inputs,
+        expected_cases_per_interface=expected_cases_per_interface,
     )
 
     copy_and_render(
@@ -103,11 +390,12 @@ def generate_upload_to_archive_script(
         output_zip_file=output_zip_file,
         target_zpath=target_zpath,
         context=context,
+        engine=engine,
     )
 
 
 def generate_archive_cases(
-    *, inputs, output_zip_file, target_zpath, number_of_cases
+    *, inputs, output_zip_file, target_zpath, number_of_cases, image_stub=None
 ):
     result = []
     for i in range(0, number_of_cases):
@@ -123,6 +411,7 @@ def generate_archive_cases(
                 output_zip_file=output_zip_file,
                 target_zpath=zpath,
                 socket=input_socket,
+                image_stub=image_stub,
             )
 
             item_files[input_socket["slug"]] = zpath
@@ -157,8 +446,10 @@ def _interface_context(interfaces):
     }
 
 
-def generate_example_algorithm(*, output_zip_file, target_zpath, context):
-    context = deepcopy(context)
+def generate_example_algorithm(
+    *, output_zip_file, target_zpath, context, engine=None, image_stub=None
+):
+    output_zip_file = as_sink(output_zip_file)
 
     interface_names = []
     for idx, interface in enumerate(context["phase"]["algorithm_interfaces"]):
@@ -169,8 +460,8 @@ def generate_example_algorithm(*, output_zip_file, target_zpath, context):
         inputs = interface["inputs"]
 
         # create inputs.json
-        output_zip_file.writestr(
-            str(input_zdir / "inputs.json"),
+        output_zip_file.add(
+            input_zdir / "inputs.json",
             json.dumps(
                 [socket_to_socket_value(socket) for socket in inputs], indent=4
             ),
@@ -182,10 +473,14 @@ def generate_example_algorithm(*, output_zip_file, target_zpath, context):
                 output_zip_file=output_zip_file,
                 target_zpath=input_zdir / input["relative_path"],
                 socket=input,
+                image_stub=image_stub,
             )
 
-    context.update(
-        _interface_context(interfaces=context["phase"]["algorithm_interfaces"])
+    context = layer_context(
+        context,
+        **_interface_context(
+            interfaces=context["phase"]["algorithm_interfaces"]
+        ),
     )
 
     copy_and_render(
@@ -193,36 +488,62 @@ def generate_example_algorithm(*, output_zip_file, target_zpath, context):
         output_zip_file=output_zip_file,
         target_zpath=target_zpath,
         context=context,
+        engine=engine,
     )
 
 
-def generate_example_evaluation(*, output_zip_file, target_zpath, context):
-    context = deepcopy(context)
-    context.update(
-        _interface_context(interfaces=context["phase"]["algorithm_interfaces"])
+def generate_example_evaluation(
+    *,
+    output_zip_file,
+    target_zpath,
+    context,
+    engine=None,
+    number_of_jobs=DEFAULT_NUMBER_OF_JOBS,
+    image_stub=None,
+):
+    output_zip_file = as_sink(output_zip_file)
+    context = layer_context(
+        context,
+        **_interface_context(
+            interfaces=context["phase"]["algorithm_interfaces"]
+        ),
     )
 
     input_zdir = target_zpath / "test" / "input"
+    interfaces = context["phase"]["algorithm_interfaces"]
+
+    # Only the keys are kept: the predictions themselves are built, and
+    # released, while being written
+    pks_per_interface = [
+        [
+            str(reproducibility.new_uuid("prediction", input_zdir, i, job))
+            for job in range(number_of_jobs)
+        ]
+        for i in range(len(interfaces))
+    ]
 
-    predictions_json = []
-    for interface in context["phase"]["algorithm_interfaces"]:
-        predictions_json.extend(
-            generate_predictions_json(
-                inputs=interface["inputs"],
-                outputs=interface["outputs"],
-                number_of_jobs=3,
-            )
-        )
-
-    output_zip_file.writestr(
-        str(input_zdir / "predictions.json"),
-        json.dumps(predictions_json, indent=4),
+    output_zip_file.add_chunks(
+        input_zdir / "predictions.json",
+        iter_predictions_json(
+            interfaces=interfaces, pks_per_interface=pks_per_interface
+        ),
     )
 
     generate_prediction_files(
         output_zip_file=output_zip_file,
         target_zpath=target_zpath / "test" / "input",
-        predictions=predictions_json,
+        predictions=(
+            prediction
+            for interface, pks in zip(
+                interfaces, pks_per_interface, strict=True
+            )
+            for prediction in iter_predictions(
+                inputs=interface["inputs"],
+                outputs=interface["outputs"],
+                pks=pks,
+            )
+        ),
+        image_stub=image_stub,
     )
 
     for socket in context["phase"]["evaluation_additional_inputs"]:
@@ -230,6 +551,7 @@ def generate_example_evaluation(*, output_zip_file, target_zpath, context):
             output_zip_file=output_zip_file,
             target_zpath=input_zdir / socket["relative_path"],
             socket=socket,
+            image_stub=image_stub,
         )
 
     copy_and_render(
@@ -237,6 +559,7 @@ def generate_example_evaluation(*, output_zip_file, target_zpath, context):
         output_zip_file=output_zip_file,
         target_zpath=target_zpath,
         context=context,
+        engine=engine,
     )
 
 
@@ -246,24 +569,71 @@ def generate_predictions_json(
     outputs,
     number_of_jobs,
 ):
-    predictions = []
-    for _ in range(0, number_of_jobs):
-        predictions.append(
-            {
-                "pk": str(uuid.uuid4()),
-                "inputs": [
-                    socket_to_socket_value(socket) for socket in inputs
-                ],
-                "outputs": [
-                    socket_to_socket_value(socket) for socket in outputs
-                ],
-                "status": "Succeeded",
-            }
+    return list(
+        iter_predictions(
+            inputs=inputs,
+            outputs=outputs,
+            pks=(
+                str(
+                    reproducibility.new_uuid(
+                        "prediction",
+                        *(socket["slug"] for socket in [*inputs, *outputs]),
+                        job,
+                    )
+                )
+                for job in range(number_of_jobs)
+            ),
         )
-    return predictions
+    )
+
 
+def iter_predictions(*, inputs, outputs, pks):
+    """Yields a prediction, as listed in predictions.json, for each key"""
+    for pk in pks:
+        yield {
+            "pk": pk,
+            "inputs": [socket_to_socket_value(socket) for socket in inputs],
+            "outputs": [socket_to_socket_value(socket) for socket in outputs],
+            "status": "Succeeded",
+        }
 
-def generate_prediction_files(*, output_zip_file, target_zpath, predictions):
+
+def iter_predictions_json(*, interfaces, pks_per_interface, indent=4):
+    """
+    Yields the chunks of predictions.json, identical to serializing the list
+    of all predictions with json.dumps.
+
+    The predictions of an interface only differ in their key, so only one
+    prediction per interface is serialized.
+    """
+    prefix = " " * indent
+    separator = "[\n"
+    batch = []
+
+    for interface, pks in zip(interfaces, pks_per_interface, strict=True):
+        (prediction,) = iter_predictions(
+            inputs=interface["inputs"], outputs=interface["outputs"], pks=[""]
+        )
+        encoded = textwrap.indent(
+            json.dumps(prediction, indent=indent), prefix
+        )
+        # The key is the first entry, before any of the values
+        head, tail = encoded.split('"pk": ""', 1)
+
+        for pk in pks:
+            batch.append(f'{separator}{head}"pk": {json.dumps(pk)}{tail}')
+            separator = ",\n"
+            if len(batch) >= 256:
+                yield "".join(batch)
+                batch.clear()
+
+    batch.append("[]" if separator == "[\n" else "\n]")
+    yield "".join(batch)
+
+
+def generate_prediction_files(
+    *, output_zip_file, target_zpath, predictions, image_stub=None
+):
     for prediction in predictions:
         prediction_zpath = target_zpath / prediction["pk"]
         for socket_value in prediction["outputs"]:
@@ -273,6 +643,7 @@ def generate_prediction_files(*, output_zip_file, target_zpath, predictions):
                 / "output"
                 / socket_value["interface"]["relative_path"],
                 socket=socket_value["interface"],
+                image_stub=image_stub,
             )
 
 
@@ -281,22 +652,60 @@ def generate_algorithm_template(
     context,
     output_zip_file,
     target_zpath,
+    validate=True,
+    engine=None,
+    image_stub=None,
+    reproducible=None,
+    python_format=None,
+    profile=None,
+    on_profile=None,
 ):
-    validate_algorithm_template_context(context)
+    """
+    Generates an algorithm template into the output zip file.
+
+    See `generate_challenge_pack` for a description of the validate, image
+    stub, reproducibility, Python format and profiling arguments and the
+    return value.
+    """
+    with (
+        reproducibility.reproducible(as_reproducible(reproducible)),
+        formatting(python_format),
+        memoizing_example_values(),
+        _profiled(
+            output_zip_file=output_zip_file,
+            engine=engine,
+            profile=profile,
+            on_profile=on_profile,
+        ) as (output_zip_file, profile),
+    ):
+        if validate:
+            with stage("validate"):
+                validate_algorithm_template_context(context)
+
+        context = layer_context(
+            context,
+            grand_challenge_forge_version=get_forge_version(),
+        )
 
-    context["grand_challenge_forge_version"] = metadata.version(
-        "grand-challenge-forge"
-    )
+        if image_stub is None and context["algorithm"].get("image_stub"):
+            image_stub = ImageStub.from_context(
+                context["algorithm"]["image_stub"]
+            )
 
-    generate_example_algorithm(
-        context={"phase": context["algorithm"]},
-        output_zip_file=output_zip_file,
-        target_zpath=target_zpath,
-    )
+        generate_example_algorithm(
+            context={"phase": context["algorithm"]},
+            output_zip_file=output_zip_file,
+            target_zpath=target_zpath,
+            engine=engine,
+            image_stub=image_stub,
+        )
 
-    copy_and_render(
-        templates_dir_name="algorithm-template-readme",
-        output_zip_file=output_zip_file,
-        target_zpath=target_zpath,
-        context=context,
-    )
+        copy_and_render(
+            templates_dir_name="algorithm-template-readme",
+            output_zip_file=output_zip_file,
+            target_zpath=target_zpath,
+            context=context,
+            engine=engine,
+        )
+
+    return profile
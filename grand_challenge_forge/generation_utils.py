@@ -1,21 +1,19 @@
+import functools
 import json
 import logging
 import os
-import subprocess
-import tempfile
-import time
-import uuid
-import zipfile
+import stat
+import threading
 from contextlib import contextmanager
-from datetime import datetime, timezone
-from io import BytesIO
+from contextvars import ContextVar
 from pathlib import Path
+from typing import NamedTuple
 
-import black
-from jinja2 import FileSystemLoader, StrictUndefined, TemplateNotFound
-from jinja2.sandbox import ImmutableSandboxedEnvironment
-
-from grand_challenge_forge import PARTIALS_PATH
+from grand_challenge_forge import PARTIALS_PATH, profiling, reproducibility
+from grand_challenge_forge.cache import hash_key
+from grand_challenge_forge.exceptions import QualityFailureError
+from grand_challenge_forge.images import iter_mha_chunks
+from grand_challenge_forge.sinks import DirectorySink, as_sink
 
 DEBUG = os.getenv("GRAND_CHALLENGE_FORGE_DEBUG", "false").lower() == "true"
 
@@ -25,6 +23,49 @@ RESOURCES_PATH = SCRIPT_PATH / "resources"
 
 logger = logging.getLogger(__name__)
 
+# Serializes lazy imports of black, threads importing it concurrently can see
+# a partially initialized module
+_black_import_lock = threading.Lock()
+
+# How rendered Python code is formatted: always by black, only verified to
+# be formatted as black would, or never, trusting the templates
+FORMAT_ALWAYS = "always"
+FORMAT_VERIFY = "verify"
+FORMAT_NEVER = "never"
+PYTHON_FORMATS = (FORMAT_NEVER, FORMAT_VERIFY, FORMAT_ALWAYS)
+
+_active_python_format = ContextVar(
+    "grand_challenge_forge_python_format", default=FORMAT_ALWAYS
+)
+
+
+def get_python_format():
+    return _active_python_format.get()
+
+
+@contextmanager
+def formatting(python_format):
+    """
+    Context manager that makes generation in the current context format
+    rendered Python code as set by python_format (one of PYTHON_FORMATS),
+    None keeps the current one
+    """
+    if python_format is None:
+        yield _active_python_format.get()
+        return
+
+    if python_format not in PYTHON_FORMATS:
+        raise ValueError(
+            f"Unknown Python format {python_format!r}, use one of: "
+            f"{', '.join(PYTHON_FORMATS)}"
+        )
+
+    token = _active_python_format.set(python_format)
+    try:
+        yield python_format
+    finally:
+        _active_python_format.reset(token)
+
 
 def is_json(socket):
     return socket["relative_path"].endswith(".json")
@@ -44,37 +85,134 @@ def has_example_value(socket):
     return "example_value" in socket and socket["example_value"] is not None
 
 
-def generate_socket_value_stub_file(*, output_zip_file, target_zpath, socket):
-    """Creates a stub based on a component interface"""
+def generate_socket_value_stub_file(
+    *, output_zip_file, target_zpath, socket, image_stub=None
+):
+    """
+    Creates a stub based on a component interface.
+
+    Image sockets get a copy of a tiny example image or, if an ImageStub is
+    provided, a synthetic image that is streamed into the output.
+    """
+    output_zip_file = as_sink(output_zip_file)
+
+    with profiling.stage("stubs"):
+        return _generate_socket_value_stub_file(
+            output_zip_file=output_zip_file,
+            target_zpath=target_zpath,
+            socket=socket,
+            image_stub=image_stub,
+        )
+
+
+def _generate_socket_value_stub_file(
+    *, output_zip_file, target_zpath, socket, image_stub
+):
     if has_example_value(socket):
-        zinfo = zipfile.ZipInfo(str(target_zpath))
-        output_zip_file.writestr(
-            zinfo,
-            json.dumps(
-                socket["example_value"],
-                indent=4,
-            ),
+        output_zip_file.add(
+            target_zpath,
+            serialize_example_value(socket["example_value"]),
         )
         return target_zpath
 
     # Copy over an example
 
     if is_json(socket):
-        source = RESOURCES_PATH / "example.json"
+        resource_name = "example.json"
     elif is_image(socket):
-        source = RESOURCES_PATH / "example.mha"
-        target_zpath = target_zpath / f"{str(uuid.uuid4())}.mha"
+        resource_name = "example.mha"
+        target_zpath = (
+            target_zpath
+            / f"{reproducibility.new_uuid('stub', target_zpath)}.mha"
+        )
+        if image_stub is not None:
+            _, mode = load_resource(resource_name)
+            output_zip_file.add_chunks(
+                target_zpath, iter_mha_chunks(image_stub), mode=mode
+            )
+            return target_zpath
     else:
-        source = RESOURCES_PATH / "example.txt"
+        resource_name = "example.txt"
 
-    output_zip_file.write(
-        source,
-        arcname=str(target_zpath),
-    )
+    content, mode = load_resource(resource_name)
+    output_zip_file.add(target_zpath, content, mode=mode)
 
     return target_zpath
 
 
+@functools.cache
+def load_resource(name):
+    """Returns the content and file mode of a resource, read only once"""
+    path = RESOURCES_PATH / name
+    return path.read_bytes(), stat.S_IMODE(path.stat().st_mode)
+
+
+# Maximum total size of the serialized example values kept per generation
+MAX_EXAMPLE_VALUES_SIZE = 64 * 1024 * 1024  # 64 MiB
+
+_active_example_values = ContextVar(
+    "grand_challenge_forge_example_values", default=None
+)
+
+
+class _ExampleValues:
+    """Serialized example values by the identity of the value"""
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._values = {}
+
+    def serialize(self, value):
+        entry = self._values.get(id(value))
+        if entry is not None:
+            self.hits += 1
+            return entry[1]
+
+        self.misses += 1
+        result = _serialize(value)
+        if self.size + len(result) <= self.max_size:
+            # Keep the value, so its identity is not reused
+            self._values[id(value)] = (value, result)
+            self.size += len(result)
+        return result
+
+
+@contextmanager
+def memoizing_example_values(max_size=MAX_EXAMPLE_VALUES_SIZE):
+    """
+    Context manager that memoizes the serialized example values of the
+    generation in the current context, by the identity of the value, up to
+    max_size bytes. The context must not be modified meanwhile.
+    """
+    if _active_example_values.get() is not None:
+        yield
+        return
+
+    token = _active_example_values.set(_ExampleValues(max_size))
+    try:
+        yield
+    finally:
+        _active_example_values.reset(token)
+
+
+def _serialize(value):
+    return json.dumps(value, indent=4).encode("utf-8")
+
+
+def serialize_example_value(value):
+    """
+    Returns the JSON serialized example value of a socket, memoized within
+    `memoizing_example_values`
+    """
+    example_values = _active_example_values.get()
+    if example_values is None:
+        return _serialize(value)
+    return example_values.serialize(value)
+
+
 def socket_to_socket_value(socket):
     """Creates a stub dict repr of a socket valuee"""
     sv = {
@@ -99,25 +237,41 @@ def socket_to_socket_value(socket):
     }
 
 
-def get_jinja2_environment(searchpath=None):
+def get_jinja2_environment(searchpath=None, cache_size=400, precompiled=True):
+    """
+    Returns a sandboxed Jinja2 environment for a partials directory.
+
+    With precompiled, templates of the partials directories of the package
+    are loaded from the modules they were compiled to when packaging, see
+    `grand_challenge_forge.precompiled`, if they are still up to date.
+    """
+    # Imported lazily, jinja2 is only needed when rendering
+    from jinja2 import FileSystemLoader, StrictUndefined
+    from jinja2.sandbox import ImmutableSandboxedEnvironment
+
     from grand_challenge_forge.partials.filters import custom_filters
+    from grand_challenge_forge.precompiled import get_precompiled_loader
+
+    loader = get_precompiled_loader(searchpath) if precompiled else None
 
     if searchpath:
         searchpath = [searchpath, PARTIALS_PATH]
     else:
         searchpath = PARTIALS_PATH
 
+    if loader is None:
+        loader = FileSystemLoader(searchpath=searchpath, followlinks=True)
+
     env = ImmutableSandboxedEnvironment(
-        loader=FileSystemLoader(
-            searchpath=searchpath,
-            followlinks=True,
-        ),
+        loader=loader,
         undefined=StrictUndefined,
         keep_trailing_newline=True,
+        cache_size=cache_size,
+        auto_reload=True,
     )
     env.filters = custom_filters
     env.filters["zip"] = zip
-    env.globals["now"] = datetime.now(timezone.utc)
+    env.globals["now"] = reproducibility.now()
 
     return env
 
@@ -128,123 +282,215 @@ def copy_and_render(
     output_zip_file,
     target_zpath,
     context,
+    engine=None,
 ):
+    from jinja2 import TemplateNotFound
+
+    from grand_challenge_forge.engine import get_default_forge
+
+    engine = engine or get_default_forge()
+    output_zip_file = as_sink(output_zip_file)
+
     source_path = PARTIALS_PATH / templates_dir_name
 
     if not source_path.exists():
         raise TemplateNotFound(source_path)
 
-    env = get_jinja2_environment(searchpath=source_path)
+    manifest = get_partials_manifest(
+        source_path=source_path, partials_path=PARTIALS_PATH
+    )
 
-    for root, _, files in os.walk(source_path, followlinks=True):
-        root = Path(root)
+    for entry in manifest:
+        if not entry.allowed:
+            raise PermissionError(
+                f"Only files under {PARTIALS_PATH} are allowed "
+                "to be copied or rendered"
+            )
+
+    # Rendering can be deferred until after generation: fix 'now' and the
+    # format up front
+    now = reproducibility.now()
+    format = get_python_format()
+
+    for entry in manifest:
+        if entry.is_dir:
+            continue
+
+        output_file = target_zpath / entry.relative_path
+        name = f"{templates_dir_name}/{entry.relative_path}"
+
+        if entry.is_template:
+            # Rendering is deferred: it is only done once the content is needed
+            output_zip_file.add_deferred(
+                output_file.with_suffix(""),
+                functools.partial(
+                    _render_template,
+                    engine=engine,
+                    source_path=source_path,
+                    name=name,
+                    entry=entry,
+                    context=context,
+                    now=now,
+                    format=format,
+                ),
+                mode=entry.mode,
+            )
+        else:
+            with profiling.template(name):
+                output_zip_file.add_file(
+                    source_path / entry.relative_path,
+                    output_file,
+                    mode=entry.mode,
+                )
 
-        check_allowed_source(path=root)
 
-        # Create relative path
-        rel_path = root.relative_to(source_path)
-        current_zdir = target_zpath / rel_path
+def _render_template(
+    *, engine, source_path, name, entry, context, now, format=FORMAT_ALWAYS
+):
+    with profiling.template(name):
+        template = engine.get_template(
+            source_path=source_path,
+            name=str(entry.relative_path),
+        )
 
-        for file in sorted(files):
-            source_file = root / file
-            output_file = current_zdir / file
+        # Environments are long-lived: provide a fresh 'now'
+        render_context = {
+            **context,
+            "now": now,
+            "_no_gpus": DEBUG,
+        }
 
-            check_allowed_source(path=source_file)
+        is_python = entry.relative_path.with_suffix("").suffix == ".py"
 
-            if file.endswith(".j2"):  # Jinja2 template
-                template = env.get_template(
-                    name=str(source_file.relative_to(source_path))
+        if engine.render_cache is not None:
+            key = engine.render_key(template, render_context)
+            if is_python:
+                key = hash_key(key, format)
+            rendered_content = engine.render_cache.get(key)
+            if rendered_content is not None:
+                return rendered_content
+
+        with profiling.stage("render"):
+            rendered_content = template.render(render_context)
+
+        if is_python and format != FORMAT_NEVER:
+            with profiling.stage("format"):
+                formatted_content = apply_black(
+                    rendered_content, cache=engine.format_cache
                 )
-                rendered_content = template.render(
-                    **context,
-                    _no_gpus=DEBUG,
+            if (
+                format == FORMAT_VERIFY
+                and formatted_content != rendered_content
+            ):
+                raise QualityFailureError(
+                    f"Rendered {name} is not formatted as black would, "
+                    "its template should emit black-stable code"
                 )
+            rendered_content = formatted_content
 
-                targetfile_zpath = output_file.with_suffix("")
+        if engine.render_cache is not None:
+            engine.render_cache.set(key, rendered_content)
 
-                if targetfile_zpath.suffix == ".py":
-                    rendered_content = apply_black(rendered_content)
+        return rendered_content
 
-                # Collect information about the file to be written to the zip file
-                # (permissions, et cetera)
-                zinfo = zipfile.ZipInfo.from_file(
-                    source_file,
-                    arcname=str(targetfile_zpath),
-                )
 
-                # Update the date time of creation, since we are technically
-                # creating a new file
-                # Also (partially) addresses a problem where docker build injects
-                # incorrect files:
-                # https://github.com/moby/buildkit/issues/4817#issuecomment-2032551066
-                zinfo.date_time = time.localtime()[0:6]
-
-                output_zip_file.writestr(zinfo, rendered_content)
-            else:
-                output_zip_file.write(
-                    str(source_file), arcname=str(output_file)
-                )
+class PartialsEntry(NamedTuple):
+    relative_path: Path
+    is_dir: bool
+    is_template: bool
+    mode: int | None
+    allowed: bool
+
 
+@functools.lru_cache(maxsize=None)
+def get_partials_manifest(*, source_path, partials_path):
+    """
+    Returns the entries of a partials directory, in the order they are to be
+    rendered or copied.
 
-def check_allowed_source(path):
-    if PARTIALS_PATH.resolve() not in path.resolve().parents:
-        raise PermissionError(
-            f"Only files under {PARTIALS_PATH} are allowed "
-            "to be copied or rendered"
+    The partials are static package data, so the directory is only walked,
+    and its symlinks resolved, once per process.
+    """
+    resolved_partials_path = partials_path.resolve()
+
+    def is_allowed(path):
+        return resolved_partials_path in path.resolve().parents
+
+    manifest = []
+    for root, _, files in os.walk(source_path, followlinks=True):
+        root = Path(root)
+        rel_path = root.relative_to(source_path)
+
+        manifest.append(
+            PartialsEntry(
+                relative_path=rel_path,
+                is_dir=True,
+                is_template=False,
+                mode=None,
+                allowed=is_allowed(root),
+            )
         )
 
+        for file in sorted(files):
+            source_file = root / file
+            allowed = is_allowed(source_file)
+            manifest.append(
+                PartialsEntry(
+                    relative_path=rel_path / file,
+                    is_dir=False,
+                    is_template=file.endswith(".j2"),  # Jinja2 template
+                    # Do not stat files that could be missing or outside
+                    mode=(
+                        stat.S_IMODE(source_file.stat().st_mode)
+                        if allowed
+                        else 0
+                    ),
+                    allowed=allowed,
+                )
+            )
+
+    return tuple(manifest)
 
-def apply_black(content):
-    # Format rendered Python code string using black
-    result = black.format_str(
-        content,
-        mode=black.Mode(),
-    )
-    return result
+
+def apply_black(content, cache=None):
+    # Format rendered Python code string using black, which is slow to
+    # import and hence only imported when needed
+    with _black_import_lock:
+        import black
+
+    mode = black.Mode()
+
+    if cache is None:
+        return black.format_str(content, mode=mode)
+
+    key = hash_key(black.__version__, mode.get_cache_key(), content)
+    result = cache.get(key)
+    if result is None:
+        result = black.format_str(content, mode=mode).encode("utf-8")
+        cache.set(key, result)
+
+    return result.decode("utf-8")
 
 
 @contextmanager
 def zipfile_to_filesystem(output_path):
     """
-    Context manager that provides an in-memory zip file handle and optionally
-    extracts its contents.
+    Context manager that provides a sink that writes its members directly
+    to a directory, preserving their permissions.
+
+    Members are streamed to disk as they are added, so memory use does not
+    depend on the size of the output. If an exception occurs, the files
+    written so far are removed again.
 
     Args
     ----
-        output_dir (str, Path): Directory to extract the zip contents to
-        after completion.
+        output_path (str, Path): Directory to write the contents to.
 
     Yields
     ------
-        ZipFile: A ZipFile object that can be written to.
+        DirectorySink: A sink that can be written to.
     """
-    zip_handle = BytesIO()
-
-    with zipfile.ZipFile(zip_handle, "w") as zip_file:
-        yield zip_file
-
-    # Extract contents to disk if output_dir is specified
-    # Use a subprocess because the ZipFile.extractall does
-    # not keep permissions: https://github.com/python/cpython/issues/59999
-
-    zip_handle.seek(0)
     os.makedirs(output_path, exist_ok=True)
 
-    temp_zip = tempfile.NamedTemporaryFile(suffix=".zip", delete=False)
-    try:
-        temp_zip.write(zip_handle.getvalue())
-        temp_zip.close()
-
-        subprocess.run(
-            [
-                "unzip",
-                "-o",
-                temp_zip.name,
-                "-d",
-                str(output_path),
-            ],
-            check=True,
-            capture_output=True,
-        )
-    finally:
-        os.remove(temp_zip.name)
+    with DirectorySink(output_path=output_path) as sink:
+        yield sink
@@ -0,0 +1,181 @@
+import array
+import functools
+import math
+import sys
+import zlib
+from typing import NamedTuple
+
+# Pixel types, by their NumPy name, and their MetaImage type and array code
+PIXEL_TYPES = {
+    "int8": ("MET_CHAR", "b"),
+    "uint8": ("MET_UCHAR", "B"),
+    "int16": ("MET_SHORT", "h"),
+    "uint16": ("MET_USHORT", "H"),
+    "int32": ("MET_INT", "i"),
+    "uint32": ("MET_UINT", "I"),
+    "float32": ("MET_FLOAT", "f"),
+    "float64": ("MET_DOUBLE", "d"),
+}
+
+# Largest value in the pattern of the pixels, that of CT-like 12-bit data
+PATTERN_SPAN = 4096
+
+
+class ImageStub(NamedTuple):
+    """
+    Synthetic image to generate as stub for image sockets.
+
+    Args
+    ----
+        shape (tuple of int): Size of each of the 2 to 5 dimensions, as the
+        DimSize of a MetaImage: x first.
+        pixel_type (str): NumPy name of the pixel type, such as int16.
+        compressed (bool): Compress the pixel data with zlib.
+    """
+
+    shape: tuple
+    pixel_type: str = "int16"
+    compressed: bool = False
+
+    @classmethod
+    def from_context(cls, value):
+        """Returns the stub for an image_stub context value"""
+        return cls(
+            # Integral numbers such as 4.0 are valid sizes in the context
+            shape=tuple(int(size) for size in value["shape"]),
+            pixel_type=value.get("pixel_type", "int16"),
+            compressed=value.get("compressed", False),
+        )
+
+    @classmethod
+    def parse(cls, value):
+        """
+        Returns the stub for a 'SHAPE[:PIXEL_TYPE][:compressed]' string,
+        for instance 512x512x300:int16:compressed
+        """
+        shape, *options = value.split(":")
+
+        try:
+            kwargs = {"shape": tuple(int(size) for size in shape.split("x"))}
+        except ValueError:
+            raise ValueError(f"Invalid image shape {shape!r}") from None
+        for option in options:
+            if option == "compressed":
+                kwargs["compressed"] = True
+            else:
+                kwargs["pixel_type"] = option
+
+        stub = cls(**kwargs)
+        stub.validate()
+        return stub
+
+    def validate(self):
+        if self.pixel_type not in PIXEL_TYPES:
+            raise ValueError(
+                f"Unsupported pixel type {self.pixel_type!r}, use one of: "
+                f"{', '.join(PIXEL_TYPES)}"
+            )
+        if not 2 <= len(self.shape) <= 5 or any(
+            size < 1 for size in self.shape
+        ):
+            raise ValueError(f"Invalid image shape {self.shape!r}")
+
+    @property
+    def itemsize(self):
+        return array.array(PIXEL_TYPES[self.pixel_type][1]).itemsize
+
+
+def mha_header(stub, *, compressed_data_size=None):
+    """Returns the header of a MetaImage (.mha) file holding the stub"""
+    ndims = len(stub.shape)
+    identity = " ".join(
+        "1" if row == column else "0"
+        for row in range(ndims)
+        for column in range(ndims)
+    )
+    zeros = " ".join("0" * ndims)
+
+    lines = [
+        "ObjectType = Image",
+        f"NDims = {ndims}",
+        "BinaryData = True",
+        "BinaryDataByteOrderMSB = False",
+        f"CompressedData = {stub.compressed}",
+        *(
+            [f"CompressedDataSize = {compressed_data_size}"]
+            if stub.compressed
+            else []
+        ),
+        f"TransformMatrix = {identity}",
+        f"Offset = {zeros}",
+        f"CenterOfRotation = {zeros}",
+        f"ElementSpacing = {' '.join('1' * ndims)}",
+        f"DimSize = {' '.join(str(size) for size in stub.shape)}",
+        f"ElementType = {PIXEL_TYPES[stub.pixel_type][0]}",
+        "ElementDataFile = LOCAL",
+    ]
+    return ("\n".join(lines) + "\n").encode("ascii")
+
+
+@functools.lru_cache(maxsize=8)
+def _slice_pattern(stub):
+    # A ramp over the first two dimensions: cheap to build once, and not
+    # trivially compressible as an all-zero volume would be
+    typecode = PIXEL_TYPES[stub.pixel_type][1]
+    span = min(PATTERN_SPAN, 1 << (8 * stub.itemsize - 1))
+
+    width, height = stub.shape[:2]
+    row = array.array(typecode, [x % span for x in range(width)])
+
+    pattern = array.array(typecode)
+    for y in range(height):
+        offset = y % width
+        pattern.extend(row[offset:])
+        pattern.extend(row[:offset])
+
+    if sys.byteorder == "big":
+        pattern.byteswap()
+    return pattern.tobytes()
+
+
+def iter_pixel_chunks(stub):
+    """
+    Yields the uncompressed pixel data of the stub, a slice at a time, so
+    the volume is never held in memory as a whole
+    """
+    pattern = _slice_pattern(stub)
+    number_of_slices = math.prod(stub.shape[2:])
+
+    for z in range(number_of_slices):
+        # Shift each slice by a row so slices differ
+        offset = (z * stub.shape[0] * stub.itemsize) % len(pattern)
+        yield pattern[offset:] + pattern[:offset]
+
+
+def iter_mha_chunks(stub):
+    """Yields the chunks of a MetaImage (.mha) file holding the stub"""
+    stub.validate()
+
+    if not stub.compressed:
+        yield mha_header(stub)
+        yield from iter_pixel_chunks(stub)
+        return
+
+    # The header holds the compressed size: compress twice, once per stub,
+    # rather than keeping the compressed volume in memory
+    yield mha_header(stub, compressed_data_size=_compressed_data_size(stub))
+    yield from _compress(stub)
+
+
+@functools.lru_cache(maxsize=64)
+def _compressed_data_size(stub):
+    return sum(len(chunk) for chunk in _compress(stub))
+
+
+def _compress(stub):
+    compressor = zlib.compressobj()
+    for chunk in iter_pixel_chunks(stub):
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
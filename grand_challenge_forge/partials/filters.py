@@ -41,3 +41,102 @@ def has_file(arg):
 @register_simple_filter
 def has_example_value(arg):
     return generation_utils.has_example_value(arg)
+
+
+# Line length that black formats rendered Python code to
+BLACK_LINE_LENGTH = 88
+
+
+@register_simple_filter
+def python_literal(value, indent=0, reserved=0):
+    """
+    Returns a JSON-like value as a Python literal formatted as black would,
+    starting on a line that is indented by indent spaces and that holds
+    reserved other characters.
+
+    Containers are kept on one line if they fit. Otherwise they are split
+    over lines, one item per line with a trailing comma, as black does.
+    """
+    if isinstance(value, tuple) and len(value) == 1:
+        # Black does not split single-element tuples
+        return f"({python_literal(value[0], indent, reserved + 3)},)"
+
+    if not isinstance(value, (dict, list, tuple)):
+        return _python_scalar(value)
+
+    flat = _flat_python_literal(value)
+    if indent + reserved + len(flat) <= BLACK_LINE_LENGTH:
+        return flat
+
+    if isinstance(value, dict):
+        items = []
+        for key, item in value.items():
+            key = python_literal(key, indent + 4)
+            item = python_literal(item, indent + 4, len(key) + 3)
+            items.append(f"{key}: {item}")
+        return _split_over_lines("{", items, "}", indent)
+
+    items = [python_literal(item, indent + 4, 1) for item in value]
+    if isinstance(value, tuple):
+        return _split_over_lines("(", items, ")", indent)
+    return _split_over_lines("[", items, "]", indent)
+
+
+@register_simple_filter
+def python_assignment(value, name, indent=4):
+    """
+    Returns the statement assigning a JSON-like value to name, formatted as
+    black would on a line that is indented by indent spaces
+    """
+    literal = python_literal(value, indent, len(name) + 3)
+    statement = f"{name} = {literal}"
+
+    if "\n" in literal or indent + len(statement) <= BLACK_LINE_LENGTH:
+        return statement
+
+    # Black wraps values that are too long in parentheses, if that helps
+    if indent + 4 + len(literal) <= BLACK_LINE_LENGTH:
+        return f"{name} = (\n{' ' * (indent + 4)}{literal}\n{' ' * indent})"
+
+    return statement
+
+
+def _python_scalar(value):
+    if isinstance(value, str):
+        return _python_string(value)
+    if isinstance(value, float):
+        # Black drops the plus sign of exponents
+        return repr(value).replace("e+", "e")
+    return repr(value)
+
+
+def _flat_python_literal(value):
+    if isinstance(value, dict):
+        items = ", ".join(
+            f"{_flat_python_literal(key)}: {_flat_python_literal(item)}"
+            for key, item in value.items()
+        )
+        return f"{{{items}}}"
+    if isinstance(value, tuple) and len(value) == 1:
+        return f"({_flat_python_literal(value[0])},)"
+    if isinstance(value, (list, tuple)):
+        items = ", ".join(_flat_python_literal(item) for item in value)
+        if isinstance(value, tuple):
+            return f"({items})"
+        return f"[{items}]"
+    return _python_scalar(value)
+
+
+def _python_string(value):
+    literal = repr(value)
+    if literal.startswith("'") and '"' not in value:
+        # Black prefers double quotes
+        literal = '"' + literal[1:-1] + '"'
+    return literal
+
+
+def _split_over_lines(opening, items, closing, indent):
+    if not items:
+        return f"{opening}{closing}"
+    lines = [f"{' ' * (indent + 4)}{item}," for item in items]
+    return "\n".join([opening, *lines, f"{' ' * indent}{closing}"])
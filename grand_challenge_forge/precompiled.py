@@ -0,0 +1,262 @@
+import functools
+import hashlib
+import json
+import logging
+import shutil
+import sys
+from pathlib import Path
+
+import jinja2
+from jinja2 import BaseLoader, FileSystemLoader, ModuleLoader, TemplateNotFound
+from jinja2.utils import internalcode
+
+from grand_challenge_forge import PARTIALS_PATH, SCRIPT_PATH
+
+logger = logging.getLogger(__name__)
+
+COMPILED_PARTIALS_PATH = SCRIPT_PATH / "compiled_partials"
+
+MANIFEST_NAME = "manifest.json"
+
+
+def source_digest(source):
+    return hashlib.sha256(source.encode("utf-8")).hexdigest()
+
+
+def environment_name(searchpath):
+    """
+    Returns the name of the precompiled templates for the environment of a
+    partials directory, or None if it is not a directory of the package
+    """
+    if searchpath is None:
+        return None
+    searchpath = Path(searchpath)
+    if (
+        searchpath.parent == PARTIALS_PATH
+        and searchpath.is_dir()
+        and not searchpath.name.startswith(("_", "."))
+    ):
+        return searchpath.name
+    return None
+
+
+def jinja2_compatibility():
+    """
+    Returns what precompiled templates rely on of Jinja2: its major and
+    minor version, as the compiled modules call into the Environment and
+    Context, and the names that they import from its runtime
+    """
+    from jinja2 import runtime
+
+    major, minor = jinja2.__version__.split(".")[:2]
+    return {
+        "version": [int(major), int(minor)],
+        "runtime": sorted({*runtime.exported, *runtime.async_exported}),
+    }
+
+
+def is_compatible(compatibility):
+    """
+    Returns if templates precompiled with the compatibility of another
+    Jinja2 version can be loaded with the installed one
+    """
+    installed = jinja2_compatibility()
+    return compatibility.get("version") == installed["version"] and set(
+        compatibility["runtime"]
+    ) <= set(installed["runtime"])
+
+
+@functools.cache
+def read_manifest(compiled_path):
+    """
+    Returns the manifest of the precompiled templates, or None if there are
+    none or they were compiled with an incompatible version of Jinja2
+    """
+    try:
+        manifest = json.loads((compiled_path / MANIFEST_NAME).read_text())
+    except FileNotFoundError:
+        return None
+
+    compatibility = manifest.get("compatibility")
+    if compatibility is None or not is_compatible(compatibility):
+        logger.warning(
+            f"Ignoring templates precompiled with Jinja2 "
+            f"{manifest['jinja2']}, which are incompatible with Jinja2 "
+            f"{jinja2.__version__}: templates are compiled from source"
+        )
+        return None
+    return manifest
+
+
+def _reads_to_json(reads):
+    return sorted(
+        ([name, *map(list, path)] for name, *path in reads), key=json.dumps
+    )
+
+
+def _reads_from_json(reads):
+    return frozenset((name, *map(tuple, path)) for name, *path in reads)
+
+
+class PrecompiledLoader(BaseLoader):
+    """
+    Loader of the templates in a partials directory that uses templates
+    precompiled to Python modules.
+
+    A precompiled template is only used if the digest of its source still
+    matches, otherwise it is compiled from source as FileSystemLoader does.
+    Sources are still read, to check them and for analysis, but they are not
+    lexed, parsed or compiled.
+
+    Args
+    ----
+        searchpath (list of Path): Directories to find the template sources
+        in, as for FileSystemLoader.
+        compiled_path (Path): Directory with the precompiled templates of
+        this environment.
+        templates (dict): Digest and context reads of the precompiled
+        templates, by name.
+    """
+
+    def __init__(self, *, searchpath, compiled_path, templates):
+        self.source_loader = FileSystemLoader(
+            searchpath=searchpath, followlinks=True
+        )
+        self.module_loader = ModuleLoader(compiled_path)
+        self.templates = templates
+
+    def get_source(self, environment, template):
+        return self.source_loader.get_source(environment, template)
+
+    def list_templates(self):
+        return self.source_loader.list_templates()
+
+    def _precompiled(self, name, source):
+        entry = self.templates.get(name)
+        if entry is not None and entry["digest"] == source_digest(source):
+            return entry
+        return None
+
+    @internalcode
+    def load(self, environment, name, globals=None):
+        source, filename, uptodate = self.get_source(environment, name)
+
+        if self._precompiled(name, source) is not None:
+            try:
+                template = self.module_loader.load(environment, name, globals)
+            except TemplateNotFound as e:
+                # Raised for missing modules, and modules that cannot be
+                # imported with the installed Jinja2
+                logger.warning(
+                    f"Compiling {name} from source, its precompiled module "
+                    f"cannot be loaded: {e.__cause__ or 'missing'}"
+                )
+            else:
+                # Keep reloading on changes as FileSystemLoader templates do
+                template._uptodate = uptodate
+                return template
+        elif name in self.templates:
+            logger.warning(
+                f"Compiling {name} from source, its precompiled module is "
+                "out of date"
+            )
+        else:
+            # Templates of the fallback search path are not precompiled
+            logger.debug(f"Compiling {name} from source")
+
+        return self.source_loader.load(environment, name, globals)
+
+    def get_context_reads(self, environment, name):
+        """
+        Returns the context reads of the template found at compile time, or
+        None if the template is not precompiled
+        """
+        source, _, _ = self.get_source(environment, name)
+        entry = self._precompiled(name, source)
+        if entry is None:
+            return None
+        return _reads_from_json(entry["reads"])
+
+
+def get_precompiled_loader(searchpath, *, compiled_path=None):
+    """
+    Returns the loader of precompiled templates for the environment of the
+    search path, or None if there are no usable precompiled templates
+    """
+    compiled_path = Path(compiled_path or COMPILED_PARTIALS_PATH)
+    name = environment_name(searchpath)
+    manifest = read_manifest(compiled_path)
+    if name is None or manifest is None:
+        return None
+
+    templates = manifest["environments"].get(name)
+    if templates is None:
+        return None
+
+    return PrecompiledLoader(
+        searchpath=[searchpath, PARTIALS_PATH],
+        compiled_path=compiled_path / name,
+        templates=templates,
+    )
+
+
+def compile_partials(target=None):
+    """
+    Compiles the templates of all partials directories to Python modules in
+    the target directory, with a manifest of their source digests.
+
+    Each partials directory gets its own environment, with its own template
+    names, so each gets its own set of modules. Templates that are only
+    found in the fallback search path are loaded from source.
+    """
+    from grand_challenge_forge.generation_utils import get_jinja2_environment
+    from grand_challenge_forge.template_analysis import find_context_reads
+
+    target = Path(target or COMPILED_PARTIALS_PATH)
+    shutil.rmtree(target, ignore_errors=True)
+
+    environments = {}
+    for searchpath in sorted(PARTIALS_PATH.iterdir()):
+        name = environment_name(searchpath)
+        if name is None:
+            continue
+        env = get_jinja2_environment(searchpath=searchpath, precompiled=False)
+
+        directory = target / name
+        directory.mkdir(parents=True)
+
+        templates = environments[name] = {}
+        own_templates = FileSystemLoader(searchpath, followlinks=True)
+        for template in own_templates.list_templates():
+            if not template.endswith(".j2"):
+                continue
+            source, filename, _ = env.loader.get_source(env, template)
+            code = env.compile(
+                source, template, filename, raw=True, defer_init=True
+            )
+            module = directory / ModuleLoader.get_module_filename(template)
+            module.write_text(code, encoding="utf-8")
+
+            templates[template] = {
+                "digest": source_digest(source),
+                "reads": _reads_to_json(find_context_reads(env.parse(source))),
+            }
+        logger.info(f"Compiled {len(templates)} templates of {name}")
+
+    (target / MANIFEST_NAME).write_text(
+        json.dumps(
+            {
+                "jinja2": jinja2.__version__,
+                "compatibility": jinja2_compatibility(),
+                "environments": environments,
+            },
+            sort_keys=True,
+        )
+    )
+    read_manifest.cache_clear()
+    return target
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    print(compile_partials(*sys.argv[1:2]))
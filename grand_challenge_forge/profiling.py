@@ -0,0 +1,265 @@
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+
+from grand_challenge_forge.sinks import Sink, _to_bytes
+
+_active_profile = ContextVar("grand_challenge_forge_profile", default=None)
+
+
+class Timing:
+    """Accumulated wall and CPU time, in seconds, of a number of calls"""
+
+    def __init__(self):
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.calls = 0
+
+    def add(self, *, wall, cpu, calls=1):
+        self.wall += wall
+        self.cpu += cpu
+        self.calls += calls
+
+    def as_dict(self):
+        return {"wall": self.wall, "cpu": self.cpu, "calls": self.calls}
+
+
+class Profile:
+    """
+    Report of where the time goes while generating.
+
+    Collects wall and CPU time per stage and per template file, the number of
+    members and bytes written, and the hits and misses of the caches.
+
+    Stages are not exclusive: the 'generate' stage covers everything, and
+    the stages of rendering and formatting a template are also part of the
+    time of that template. CPU time is that of the whole process.
+    """
+
+    def __init__(self):
+        self.stages = defaultdict(Timing)
+        self.templates = defaultdict(Timing)
+        self.members = 0
+        self.bytes = 0
+        self.caches = {}
+
+    @contextmanager
+    def _timed(self, timing):
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        try:
+            yield
+        finally:
+            timing.add(
+                wall=time.perf_counter() - wall,
+                cpu=time.process_time() - cpu,
+            )
+
+    def stage(self, name):
+        """Context manager that adds the time spent to the named stage"""
+        return self._timed(self.stages[name])
+
+    def template(self, name):
+        """Context manager that adds the time spent to the named template"""
+        return self._timed(self.templates[name])
+
+    def add_member(self, size):
+        self.members += 1
+        self.bytes += size
+
+    def add_cache_counters(self, name, *, hits, misses):
+        counters = self.caches.setdefault(name, {"hits": 0, "misses": 0})
+        counters["hits"] += hits
+        counters["misses"] += misses
+
+    def merge(self, other):
+        """Adds the timings and counters of another profile to this one"""
+        for name, timing in other.stages.items():
+            self.stages[name].add(**timing.as_dict())
+        for name, timing in other.templates.items():
+            self.templates[name].add(**timing.as_dict())
+        self.members += other.members
+        self.bytes += other.bytes
+        for name, counters in other.caches.items():
+            self.add_cache_counters(name, **counters)
+
+    def as_dict(self):
+        return {
+            "stages": {
+                name: timing.as_dict() for name, timing in self.stages.items()
+            },
+            "templates": {
+                name: timing.as_dict()
+                for name, timing in sorted(self.templates.items())
+            },
+            "members": self.members,
+            "bytes": self.bytes,
+            "caches": {
+                name: {
+                    **counters,
+                    "hit_rate": _hit_rate(**counters),
+                }
+                for name, counters in sorted(self.caches.items())
+            },
+        }
+
+    def format(self, *, max_templates=10):
+        """Returns the report as human-readable text"""
+        lines = [f"{'Stage':<48} {'Wall':>10} {'CPU':>10} {'Calls':>7}"]
+        for name, timing in self.stages.items():
+            lines.append(_format_timing(name, timing))
+
+        slowest = sorted(
+            self.templates.items(), key=lambda t: t[1].wall, reverse=True
+        )[:max_templates]
+        if slowest:
+            lines.append("")
+            lines.append(f"Slowest templates (of {len(self.templates)})")
+            for name, timing in slowest:
+                lines.append(_format_timing(name, timing))
+
+        lines.append("")
+        lines.append(f"Members: {self.members}, bytes: {self.bytes}")
+
+        for name, counters in sorted(self.caches.items()):
+            hit_rate = _hit_rate(**counters)
+            lines.append(
+                f"Cache {name}: {counters['hits']} hits, "
+                f"{counters['misses']} misses"
+                + ("" if hit_rate is None else f" ({hit_rate:.0%})")
+            )
+
+        return "\n".join(lines)
+
+
+def _hit_rate(*, hits, misses):
+    total = hits + misses
+    return hits / total if total else None
+
+
+def _format_timing(name, timing):
+    return (
+        f"{name:<48} {timing.wall * 1000:>8.2f}ms "
+        f"{timing.cpu * 1000:>8.2f}ms {timing.calls:>7}"
+    )
+
+
+def get_active_profile():
+    """Returns the profile collecting in the current context, if any"""
+    return _active_profile.get()
+
+
+@contextmanager
+def profiling(profile):
+    """Context manager that makes the profile collect in the current context"""
+    token = _active_profile.set(profile)
+    try:
+        yield profile
+    finally:
+        _active_profile.reset(token)
+
+
+@contextmanager
+def stage(name):
+    """Times the named stage if a profile is collecting, else does nothing"""
+    profile = _active_profile.get()
+    if profile is None:
+        yield
+    else:
+        with profile.stage(name):
+            yield
+
+
+@contextmanager
+def template(name):
+    """Times the named template if a profile is collecting"""
+    profile = _active_profile.get()
+    if profile is None:
+        yield
+    else:
+        with profile.template(name):
+            yield
+
+
+class ProfiledSink(Sink):
+    """Sink that counts and times the members added to another sink"""
+
+    def __init__(self, sink, *, profile):
+        self.sink = sink
+        self.profile = profile
+
+    def add(self, zpath, content, *, mode=None):
+        content = _to_bytes(content)
+        with self.profile.stage("write"):
+            self.sink.add(zpath, content, mode=mode)
+        self.profile.add_member(len(content))
+
+    def add_file(self, source, zpath, *, mode=None):
+        with self.profile.stage("write"):
+            self.sink.add_file(source, zpath, mode=mode)
+        self.profile.add_member(Path(source).stat().st_size)
+
+    def add_chunks(self, zpath, chunks, *, mode=None):
+        def counted():
+            size = 0
+            for chunk in chunks:
+                chunk = _to_bytes(chunk)
+                size += len(chunk)
+                yield chunk
+            self.profile.add_member(size)
+
+        with self.profile.stage("write"):
+            self.sink.add_chunks(zpath, counted(), mode=mode)
+
+    def flush(self):
+        """Waits for pending writes of the wrapped sink, if it has any"""
+        flush = getattr(self.sink, "flush", None)
+        if flush is not None:
+            with self.profile.stage("write"):
+                flush()
+
+
+class CacheCounters:
+    """Snapshot of the hits and misses of the caches used while generating"""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.start = self._read()
+
+    def _read(self):
+        from grand_challenge_forge.generation_utils import (
+            _active_example_values,
+            get_partials_manifest,
+            load_resource,
+        )
+
+        counters = {"format (memory)": self.engine.format_cache.memory}
+        if _active_example_values.get() is not None:
+            counters["example values"] = _active_example_values.get()
+        if self.engine.format_cache.disk is not None:
+            counters["format (disk)"] = self.engine.format_cache.disk
+        if self.engine.render_cache is not None:
+            counters["render"] = self.engine.render_cache
+
+        result = {
+            name: (cache.hits, cache.misses)
+            for name, cache in counters.items()
+        }
+        for name, fn in (
+            ("resources", load_resource),
+            ("partials manifest", get_partials_manifest),
+        ):
+            info = fn.cache_info()
+            result[name] = (info.hits, info.misses)
+
+        return result
+
+    def add_to(self, profile):
+        """Adds the hits and misses since the snapshot to the profile"""
+        for name, (hits, misses) in self._read().items():
+            start_hits, start_misses = self.start.get(name, (0, 0))
+            profile.add_cache_counters(
+                name, hits=hits - start_hits, misses=misses - start_misses
+            )
@@ -0,0 +1,110 @@
+import hashlib
+import json
+import os
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import NamedTuple
+
+# Zip files cannot hold timestamps before 1980-01-01
+ZIP_EPOCH = 315532800
+
+_active_settings = ContextVar(
+    "grand_challenge_forge_reproducible", default=None
+)
+
+
+class Reproducible(NamedTuple):
+    """
+    Settings that make generated output identical for identical contexts.
+
+    Random identifiers are derived from the seed and the place they are used
+    at, and the current time is replaced by a fixed timestamp.
+
+    Args
+    ----
+        seed (int): Seed of the generated identifiers.
+        timestamp (int): Seconds since the epoch to use as the current time,
+        as with SOURCE_DATE_EPOCH.
+    """
+
+    seed: int = 0
+    timestamp: int = ZIP_EPOCH
+
+    @classmethod
+    def from_environment(cls, *, seed=0):
+        """Uses SOURCE_DATE_EPOCH, if set, as the timestamp"""
+        timestamp = os.getenv("SOURCE_DATE_EPOCH")
+        if timestamp is None:
+            return cls(seed=seed)
+        return cls(seed=seed, timestamp=int(timestamp))
+
+    def now(self):
+        return datetime.fromtimestamp(self.timestamp, timezone.utc)
+
+    def zip_date_time(self):
+        return time.gmtime(max(self.timestamp, ZIP_EPOCH))[0:6]
+
+    def uuid(self, *names):
+        digest = hashlib.sha256(
+            json.dumps([self.seed, *map(str, names)]).encode("utf-8")
+        ).digest()
+        return uuid.UUID(bytes=digest[:16], version=4)
+
+
+def as_reproducible(reproducible):
+    """Returns the settings for a Reproducible, True, or None argument"""
+    if reproducible is True:
+        return Reproducible.from_environment()
+    return reproducible or None
+
+
+def get_active_settings():
+    """Returns the reproducibility settings of the current context, if any"""
+    return _active_settings.get()
+
+
+@contextmanager
+def reproducible(settings):
+    """
+    Context manager that makes generation in the current context use the
+    settings, None keeps the current settings
+    """
+    if settings is None:
+        yield _active_settings.get()
+        return
+
+    token = _active_settings.set(settings)
+    try:
+        yield settings
+    finally:
+        _active_settings.reset(token)
+
+
+def now():
+    """Returns the current, or fixed, time in UTC"""
+    settings = _active_settings.get()
+    if settings is None:
+        return datetime.now(timezone.utc)
+    return settings.now()
+
+
+def zip_date_time():
+    """Returns the date_time of new zip members"""
+    settings = _active_settings.get()
+    if settings is None:
+        return time.localtime()[0:6]
+    return settings.zip_date_time()
+
+
+def new_uuid(*names):
+    """
+    Returns a random UUID or, if reproducible, one that is derived from the
+    seed and the names, which identify where it is used
+    """
+    settings = _active_settings.get()
+    if settings is None:
+        return uuid.uuid4()
+    return settings.uuid(*names)
@@ -0,0 +1,301 @@
+import functools
+import json
+import logging
+import os
+import stat
+import tempfile
+import zipfile
+from pathlib import Path
+
+from grand_challenge_forge import (
+    PARTIALS_PATH,
+    RESOURCES_PATH,
+    reproducibility,
+)
+from grand_challenge_forge.cache import DiskCache, hash_key
+from grand_challenge_forge.reproducibility import as_reproducible
+from grand_challenge_forge.sinks import (
+    Sink,
+    _set_compresslevel,
+    _to_bytes,
+    as_sink,
+)
+from grand_challenge_forge.utils import get_forge_version
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RESULT_CACHE_SIZE = 1024 * 1024 * 1024  # 1 GiB
+
+CHUNK_SIZE = 64 * 1024
+
+# Arguments of the generators that do not change what is generated
+_OUTPUT_INDEPENDENT_ARGUMENTS = {
+    "validate",
+    "engine",
+    "max_workers",
+    "profile",
+    "on_profile",
+}
+
+
+@functools.cache
+def get_partials_digest():
+    """
+    Returns a digest of the templates and resources that are generated from,
+    computed once per process
+    """
+    parts = []
+    for root_path in (PARTIALS_PATH, RESOURCES_PATH):
+        for root, dirs, files in os.walk(root_path, followlinks=True):
+            # Bytecode differs per interpreter and only appears once the
+            # filters are imported, it must not change the digest
+            dirs[:] = sorted(d for d in dirs if d != "__pycache__")
+            for file in sorted(files):
+                if file.endswith(".pyc"):
+                    continue
+                path = Path(root) / file
+                parts.append(str(path.relative_to(root_path.parent)))
+                parts.append(oct(stat.S_IMODE(path.stat().st_mode)))
+                parts.append(path.read_bytes())
+    return hash_key(*parts)
+
+
+def canonical_json(value):
+    """Returns the JSON of a value with sorted keys and no whitespace"""
+    return json.dumps(
+        value,
+        sort_keys=True,
+        separators=(",", ":"),
+        ensure_ascii=False,
+        default=_to_jsonable,
+    )
+
+
+def _to_jsonable(value):
+    if isinstance(value, Path):
+        return value.as_posix()
+    if hasattr(value, "items"):  # For instance, a layered context
+        return dict(value.items())
+    raise TypeError(f"Cannot hash {value!r}")
+
+
+class ResultCache:
+    """
+    Cache of generated packs and algorithm templates.
+
+    Results are keyed by the canonical JSON of the context and the other
+    arguments that change the output, the forge version and a digest of
+    the templates. They are stored as zip archives in a directory, the
+    least-recently-used archives are evicted when the total size exceeds
+    `max_size`.
+
+    Hits are replayed into the output without validating or rendering
+    anything. Note that without a reproducible mode a hit repeats the
+    identifiers and timestamps of the generation that was cached.
+
+    Args
+    ----
+        directory (str, Path): Directory to store the archives in.
+        max_size (int): Maximum total size, in bytes, of all archives.
+        compression (int): zipfile compression method of the archives.
+        compresslevel (int, optional): Level of compression, see zipfile.
+    """
+
+    def __init__(
+        self,
+        directory,
+        *,
+        max_size=DEFAULT_RESULT_CACHE_SIZE,
+        compression=zipfile.ZIP_DEFLATED,
+        compresslevel=None,
+    ):
+        self.disk = DiskCache(directory, max_size=max_size)
+        self.compression = compression
+        self.compresslevel = compresslevel
+
+    @property
+    def hits(self):
+        return self.disk.hits
+
+    @property
+    def misses(self):
+        return self.disk.misses
+
+    def key(self, kind, *, context, **kwargs):
+        """Returns the key of a result of the kind ('pack' or 'algorithm')"""
+        if "reproducible" in kwargs:
+            kwargs["reproducible"] = as_reproducible(kwargs["reproducible"])
+
+        return hash_key(
+            kind,
+            get_forge_version(),
+            get_partials_digest(),
+            canonical_json(context),
+            canonical_json(
+                {
+                    name: value
+                    for name, value in kwargs.items()
+                    if name not in _OUTPUT_INDEPENDENT_ARGUMENTS
+                }
+            ),
+        )
+
+    def generate_challenge_pack(self, *, output_zip_file, **kwargs):
+        """
+        Generates a challenge pack, or replays it from the cache, into the
+        output. See `forge.generate_challenge_pack` for the arguments.
+        """
+        from grand_challenge_forge.forge import generate_challenge_pack
+
+        return self._generate(
+            "pack",
+            generate_challenge_pack,
+            output_zip_file=output_zip_file,
+            **kwargs,
+        )
+
+    def generate_algorithm_template(self, *, output_zip_file, **kwargs):
+        """
+        Generates an algorithm template, or replays it from the cache, into
+        the output. See `forge.generate_algorithm_template` for the arguments.
+        """
+        from grand_challenge_forge.forge import generate_algorithm_template
+
+        return self._generate(
+            "algorithm",
+            generate_algorithm_template,
+            output_zip_file=output_zip_file,
+            **kwargs,
+        )
+
+    def _generate(self, kind, generate, *, output_zip_file, **kwargs):
+        output_zip_file = as_sink(output_zip_file)
+        key = self.key(kind, **kwargs)
+
+        archive = self.disk.open(key)
+        if archive is not None:
+            logger.debug(f"Replaying {kind} {key} from the result cache")
+            with archive:
+                return self._replay(
+                    archive, output_zip_file=output_zip_file, **kwargs
+                )
+
+        self.disk.directory.mkdir(parents=True, exist_ok=True)
+        fd, temp_name = tempfile.mkstemp(
+            dir=self.disk.directory, suffix=".tmp"
+        )
+        try:
+            with (
+                os.fdopen(fd, "wb") as f,
+                zipfile.ZipFile(
+                    f,
+                    "w",
+                    compression=self.compression,
+                    compresslevel=self.compresslevel,
+                ) as zip_file,
+            ):
+                result = generate(
+                    output_zip_file=_ArchivingSink(
+                        output_zip_file, zip_file=zip_file
+                    ),
+                    **kwargs,
+                )
+            self.disk.set_file(key, temp_name)
+        except BaseException:
+            os.remove(temp_name)
+            raise
+
+        return result
+
+    @staticmethod
+    def _replay(
+        archive,
+        *,
+        output_zip_file,
+        engine=None,
+        reproducible=None,
+        profile=None,
+        on_profile=None,
+        **_,
+    ):
+        from grand_challenge_forge.forge import _profiled
+
+        with (
+            reproducibility.reproducible(as_reproducible(reproducible)),
+            _profiled(
+                output_zip_file=output_zip_file,
+                engine=engine,
+                profile=profile,
+                on_profile=on_profile,
+            ) as (output_zip_file, profile),
+            zipfile.ZipFile(archive) as zip_file,
+        ):
+            for info in zip_file.infolist():
+                mode = stat.S_IMODE(info.external_attr >> 16) or None
+                if info.file_size <= CHUNK_SIZE:
+                    output_zip_file.add(
+                        info.filename, zip_file.read(info), mode=mode
+                    )
+                    continue
+                with zip_file.open(info) as src:
+                    output_zip_file.add_chunks(
+                        info.filename,
+                        iter(lambda src=src: src.read(CHUNK_SIZE), b""),
+                        mode=mode,
+                    )
+
+        return profile
+
+
+class _ArchivingSink(Sink):
+    """
+    Sink that adds members to another sink and archives them in a zip file.
+
+    The other sink must consume the members as they are added. Modes of
+    None are archived as no permissions, so they are replayed as None.
+    """
+
+    def __init__(self, sink, *, zip_file):
+        self.sink = sink
+        self.zip_file = zip_file
+
+    def _open(self, zpath, mode):
+        zinfo = zipfile.ZipInfo(
+            Path(zpath).as_posix(),
+            date_time=reproducibility.zip_date_time(),
+        )
+        zinfo.compress_type = self.zip_file.compression
+        _set_compresslevel(zinfo, self.zip_file.compresslevel)
+        # Without permission bits, zipfile would default to 0o600
+        zinfo.external_attr = (stat.S_IFREG | (mode or 0)) << 16
+        return self.zip_file.open(zinfo, "w")
+
+    def add(self, zpath, content, *, mode=None):
+        content = _to_bytes(content)
+        self.sink.add(zpath, content, mode=mode)
+        with self._open(zpath, mode) as dst:
+            dst.write(content)
+
+    def add_file(self, source, zpath, *, mode=None):
+        self.sink.add_file(source, zpath, mode=mode)
+        if mode is None:
+            mode = stat.S_IMODE(os.stat(source).st_mode)
+        with open(source, "rb") as src, self._open(zpath, mode) as dst:
+            while chunk := src.read(CHUNK_SIZE):
+                dst.write(chunk)
+
+    def add_chunks(self, zpath, chunks, *, mode=None):
+        with self._open(zpath, mode) as dst:
+
+            def archived():
+                for chunk in chunks:
+                    chunk = _to_bytes(chunk)
+                    dst.write(chunk)
+                    yield chunk
+
+            self.sink.add_chunks(zpath, archived(), mode=mode)
+
+    def flush(self):
+        flush = getattr(self.sink, "flush", None)
+        if flush is not None:
+            flush()
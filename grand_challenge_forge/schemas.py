@@ -3,6 +3,7 @@ import logging
 import jsonschema
 
 from grand_challenge_forge.exceptions import InvalidContextError
+from grand_challenge_forge.images import PIXEL_TYPES
 from grand_challenge_forge.utils import truncate_with_epsilons
 
 logger = logging.getLogger(__name__)
@@ -33,6 +34,22 @@ SOCKET_SCHEMA = {
 }
 
 
+IMAGE_STUB_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "shape": {
+            "type": "array",
+            "items": {"type": "integer", "minimum": 1},
+            "minItems": 2,
+            "maxItems": 5,
+        },
+        "pixel_type": {"enum": list(PIXEL_TYPES)},
+        "compressed": {"type": "boolean"},
+    },
+    "required": ["shape"],
+}
+
+
 INTERFACE_SCHEMA = {
     "type": "object",
     "properties": {
@@ -74,6 +91,15 @@ PACK_CONTEXT_SCHEMA = {
                                 "type": "array",
                                 "items": SOCKET_SCHEMA,
                             },
+                            "number_of_cases": {
+                                "type": "integer",
+                                "minimum": 0,
+                            },
+                            "number_of_jobs": {
+                                "type": "integer",
+                                "minimum": 0,
+                            },
+                            "image_stub": IMAGE_STUB_SCHEMA,
                         },
                         "required": [
                             "slug",
@@ -94,14 +120,251 @@ PACK_CONTEXT_SCHEMA = {
 }
 
 
-def validate_pack_context(context):
+class UnsupportedSchemaError(Exception):
+    pass
+
+
+def _is_object(instance):
+    return isinstance(instance, dict)
+
+
+def _is_array(instance):
+    return isinstance(instance, list)
+
+
+def _is_string(instance):
+    return isinstance(instance, str)
+
+
+def _is_boolean(instance):
+    return isinstance(instance, bool)
+
+
+def _is_integer(instance):
+    if isinstance(instance, bool):
+        return False
+    if isinstance(instance, float):
+        return instance.is_integer()
+    return isinstance(instance, int)
+
+
+_TYPE_CHECKS = {
+    "object": _is_object,
+    "array": _is_array,
+    "string": _is_string,
+    "integer": _is_integer,
+    "boolean": _is_boolean,
+}
+
+
+def compile_schema(schema):
+    """
+    Compiles a schema into a specialized predicate that returns whether an
+    instance is valid.
+
+    Only the keywords used by the context schemas are supported, others
+    raise an UnsupportedSchemaError. The predicate does not report errors:
+    use a full validator to find out what is wrong with an instance.
+    """
+    checks = []
+
+    for keyword, value in schema.items():
+        if keyword == "additionalProperties" and value is True:
+            continue
+        try:
+            compiler = _KEYWORD_COMPILERS[keyword]
+        except KeyError as e:
+            raise UnsupportedSchemaError(f"{keyword}: {value!r}") from e
+        checks.append(compiler(value))
+
+    if len(checks) == 1:
+        return checks[0]
+
+    def check(instance):
+        for c in checks:
+            if not c(instance):
+                return False
+        return True
+
+    return check
+
+
+def _compile_type(value):
     try:
-        jsonschema.validate(instance=context, schema=PACK_CONTEXT_SCHEMA)
+        return _TYPE_CHECKS[value]
+    except (KeyError, TypeError) as e:
+        raise UnsupportedSchemaError(f"type: {value!r}") from e
+
+
+def _compile_properties(properties):
+    property_checks = tuple(
+        (name, compile_schema(subschema))
+        for name, subschema in properties.items()
+    )
+
+    def check(instance):
+        if not isinstance(instance, dict):
+            return True
+        for name, c in property_checks:
+            if name in instance and not c(instance[name]):
+                return False
+        return True
+
+    return check
+
+
+def _compile_required(required):
+    required = tuple(required)
+
+    def check(instance):
+        if not isinstance(instance, dict):
+            return True
+        for name in required:
+            if name not in instance:
+                return False
+        return True
+
+    return check
+
+
+def _compile_items(items):
+    item_check = compile_schema(items)
+
+    def check(instance):
+        if not isinstance(instance, list):
+            return True
+        for item in instance:
+            if not item_check(item):
+                return False
+        return True
+
+    return check
+
+
+def _compile_minimum(minimum):
+    def check(instance):
+        if isinstance(instance, bool) or not isinstance(instance, int | float):
+            return True
+        return instance >= minimum
+
+    return check
+
+
+def _compile_enum(values):
+    values = tuple(values)
+
+    def check(instance):
+        # Compare types too: in JSON Schema True is not an enum value of 1
+        return any(
+            type(instance) is type(value) and instance == value
+            for value in values
+        )
+
+    return check
+
+
+def _compile_min_items(min_items):
+    def check(instance):
+        return not isinstance(instance, list) or len(instance) >= min_items
+
+    return check
+
+
+def _compile_max_items(max_items):
+    def check(instance):
+        return not isinstance(instance, list) or len(instance) <= max_items
+
+    return check
+
+
+_KEYWORD_COMPILERS = {
+    "type": _compile_type,
+    "properties": _compile_properties,
+    "required": _compile_required,
+    "items": _compile_items,
+    "minimum": _compile_minimum,
+    "enum": _compile_enum,
+    "minItems": _compile_min_items,
+    "maxItems": _compile_max_items,
+}
+
+
+class SchemaValidator:
+    """
+    Validator for a schema that is checked, and compiled, only once.
+
+    Valid instances are recognized by a compiled predicate; only invalid
+    instances are passed through jsonschema to find the errors.
+    """
+
+    def __init__(self, schema):
+        cls = jsonschema.validators.validator_for(schema)
+        cls.check_schema(schema)
+        self.validator = cls(schema)
+
+        try:
+            self._is_valid = compile_schema(schema)
+        except UnsupportedSchemaError as e:
+            logger.debug(f"Not compiling schema, unsupported keyword {e}")
+            self._is_valid = self.validator.is_valid
+
+    def is_valid(self, instance):
+        return self._is_valid(instance)
+
+    def iter_errors(self, instance):
+        return self.validator.iter_errors(instance)
+
+
+def _validate(*, validator, context, all_errors, description):
+    if validator.is_valid(context):
         logging.debug("Context valid")
-    except jsonschema.exceptions.ValidationError as e:
-        raise InvalidContextError(
-            f"Invalid pack context provided:\n'{truncate_with_epsilons(context)!r}'"
-        ) from e
+        return
+
+    if all_errors:
+        errors = sorted(
+            validator.iter_errors(context),
+            key=lambda e: [str(p) for p in e.absolute_path],
+        )
+        if errors:
+            details = "\n".join(
+                f" - {e.json_path}: {truncate_with_epsilons(e.message, 128)}"
+                for e in errors
+            )
+            raise InvalidContextError(
+                f"Invalid {description} context provided, "
+                f"{len(errors)} error(s):\n{details}",
+                errors=errors,
+            )
+    else:
+        error = jsonschema.exceptions.best_match(
+            validator.iter_errors(context)
+        )
+        if error is not None:
+            raise InvalidContextError(
+                f"Invalid {description} context provided:\n"
+                f"'{truncate_with_epsilons(context)!r}'",
+                errors=[error],
+            ) from error
+
+    logging.debug("Context valid")
+
+
+PACK_CONTEXT_VALIDATOR = SchemaValidator(PACK_CONTEXT_SCHEMA)
+
+
+def validate_pack_context(context, *, all_errors=False):
+    """
+    Validates a pack context, raising an InvalidContextError if it is not.
+
+    With all_errors, every validation error is collected in a single pass
+    and reported in the message and the errors attribute of the exception.
+    """
+    _validate(
+        validator=PACK_CONTEXT_VALIDATOR,
+        context=context,
+        all_errors=all_errors,
+        description="pack",
+    )
 
 
 ALGORITHM_TEMPLATE_CONTEXT_SCHEMA = {
@@ -117,6 +380,7 @@ ALGORITHM_TEMPLATE_CONTEXT_SCHEMA = {
                     "type": "array",
                     "items": INTERFACE_SCHEMA,
                 },
+                "image_stub": IMAGE_STUB_SCHEMA,
             },
             "required": ["title", "url", "slug", "algorithm_interfaces"],
         },
@@ -126,14 +390,22 @@ ALGORITHM_TEMPLATE_CONTEXT_SCHEMA = {
 }
 
 
-def validate_algorithm_template_context(context):
-    try:
-        jsonschema.validate(
-            instance=context, schema=ALGORITHM_TEMPLATE_CONTEXT_SCHEMA
-        )
-        logging.debug("Context valid")
-    except jsonschema.exceptions.ValidationError as e:
-        raise InvalidContextError(
-            "Invalid algorithm template context provided:\n"
-            f"'{truncate_with_epsilons(context)!r}'"
-        ) from e
+ALGORITHM_TEMPLATE_CONTEXT_VALIDATOR = SchemaValidator(
+    ALGORITHM_TEMPLATE_CONTEXT_SCHEMA
+)
+
+
+def validate_algorithm_template_context(context, *, all_errors=False):
+    """
+    Validates an algorithm template context, raising an InvalidContextError
+    if it is not.
+
+    With all_errors, every validation error is collected in a single pass
+    and reported in the message and the errors attribute of the exception.
+    """
+    _validate(
+        validator=ALGORITHM_TEMPLATE_CONTEXT_VALIDATOR,
+        context=context,
+        all_errors=all_errors,
+        description="algorithm template",
+    )
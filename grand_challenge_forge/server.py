@@ -0,0 +1,454 @@
+import base64
+import json
+import logging
+import re
+import sys
+import threading
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+from pathlib import Path
+from urllib.parse import quote
+
+from grand_challenge_forge.exceptions import (
+    ChallengeForgeError,
+    InvalidContextError,
+    ServiceBusyError,
+)
+from grand_challenge_forge.sinks import ZipSink
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_CONCURRENCY = 4
+DEFAULT_MAX_REQUEST_SIZE = 16 * 1024 * 1024  # 16 MiB
+
+
+def render_pack(context, *, engine=None, validated=False, **zip_options):
+    """
+    Returns the file name and zip bytes of the pack for the context.
+
+    The context is validated, reporting all errors, unless it was validated
+    before. The zip options (compression, compresslevel and
+    compression_workers) configure how the members are compressed.
+    """
+    from grand_challenge_forge.forge import generate_challenge_pack
+
+    if not validated:
+        _validate("pack", context)
+    target_zpath = Path(f"{context['challenge']['slug']}-challenge-pack")
+
+    return f"{target_zpath}.zip", _render_zip(
+        generate_challenge_pack,
+        context=context,
+        validate=False,
+        target_zpath=target_zpath,
+        engine=engine,
+        **zip_options,
+    )
+
+
+def render_algorithm_template(
+    context, *, engine=None, validated=False, **zip_options
+):
+    """
+    Returns the file name and zip bytes of the template for the context.
+
+    See `render_pack` for the validation and zip options.
+    """
+    from grand_challenge_forge.forge import generate_algorithm_template
+
+    if not validated:
+        _validate("algorithm", context)
+    target_zpath = Path(f"{context['algorithm']['slug']}-template")
+
+    return f"{target_zpath}.zip", _render_zip(
+        generate_algorithm_template,
+        context=context,
+        validate=False,
+        target_zpath=target_zpath,
+        engine=engine,
+        **zip_options,
+    )
+
+
+def _zip_file_name(kind, context):
+    if kind == "pack":
+        return f"{context['challenge']['slug']}-challenge-pack.zip"
+    return f"{context['algorithm']['slug']}-template.zip"
+
+
+def _validate(kind, context):
+    from grand_challenge_forge.schemas import (
+        validate_algorithm_template_context,
+        validate_pack_context,
+    )
+
+    validate = {
+        "pack": validate_pack_context,
+        "algorithm": validate_algorithm_template_context,
+    }[kind]
+    validate(context, all_errors=True)
+
+
+def _render_zip(
+    generate,
+    *,
+    compression=zipfile.ZIP_DEFLATED,
+    compresslevel=None,
+    compression_workers=None,
+    **kwargs,
+):
+    buffer = BytesIO()
+    with zipfile.ZipFile(buffer, "w") as zip_file:
+        with ZipSink(
+            zip_file,
+            compression=compression,
+            compresslevel=compresslevel,
+            max_workers=compression_workers,
+        ) as sink:
+            generate(output_zip_file=sink, **kwargs)
+    return buffer.getvalue()
+
+
+RENDERERS = {
+    "pack": render_pack,
+    "algorithm": render_algorithm_template,
+}
+
+
+_worker_engine = None
+
+
+def _init_worker(engine):
+    global _worker_engine
+    _worker_engine = engine
+    _warm_up(engine)
+
+
+def _render_in_worker(kind, context, zip_options):
+    return RENDERERS[kind](
+        context, engine=_worker_engine, validated=True, **zip_options
+    )
+
+
+def _warm_up(engine):
+    from grand_challenge_forge import PARTIALS_PATH
+    from grand_challenge_forge.engine import get_default_forge
+    from grand_challenge_forge.generation_utils import apply_black
+
+    engine = engine or get_default_forge()
+
+    # Import black and build the environments before the first request
+    apply_black("")
+    for path in PARTIALS_PATH.iterdir():
+        if path.is_dir():
+            engine.get_environment(path)
+
+
+class ForgeService:
+    """
+    Renders packs and algorithm templates to zip bytes with a warm engine.
+
+    Args
+    ----
+        engine (Forge, optional): Engine to render with, kept warm across
+        requests.
+        workers (int): Number of worker processes to render in. With 0,
+        rendering is done in the threads of the requests.
+        max_concurrency (int): Maximum number of requests that are rendered,
+        or waiting for a worker, at the same time.
+        compression (int): zipfile compression method of the zip files.
+        compresslevel (int, optional): Level of compression, see zipfile.
+        compression_workers (int, optional): Number of threads compressing
+        the members of a zip file.
+        result_cache (ResultCache, optional): Cache to serve zip files of
+        contexts that were rendered before from, without using a slot.
+    """
+
+    def __init__(
+        self,
+        *,
+        engine=None,
+        workers=0,
+        max_concurrency=DEFAULT_MAX_CONCURRENCY,
+        compression=zipfile.ZIP_DEFLATED,
+        compresslevel=None,
+        compression_workers=None,
+        result_cache=None,
+    ):
+        from grand_challenge_forge.engine import get_default_forge
+
+        self.engine = engine or get_default_forge()
+        self.max_concurrency = max_concurrency
+        self.zip_options = {
+            "compression": compression,
+            "compresslevel": compresslevel,
+            "compression_workers": compression_workers,
+        }
+        self.result_cache = result_cache
+
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+
+        if workers:
+            self._executor = ProcessPoolExecutor(
+                max_workers=workers,
+                initializer=_init_worker,
+                initargs=(self.engine,),
+            )
+        else:
+            self._executor = None
+            _warm_up(self.engine)
+
+    def render(self, kind, context, *, block=False):
+        """
+        Returns the file name and zip bytes for a context of the kind.
+
+        Raises a ServiceBusyError if the concurrency limit is reached,
+        unless blocking until a slot is free.
+        """
+        if kind not in RENDERERS:
+            raise ChallengeForgeError(f"Unknown kind {kind!r}")
+
+        if self.result_cache is None:
+            return self._render(kind, context, block=block)
+
+        # The zip file itself is cached, so its options are part of the key.
+        # Only valid contexts are ever cached.
+        key = self.result_cache.key(
+            f"{kind}.zip",
+            context=context,
+            compression=self.zip_options["compression"],
+            compresslevel=self.zip_options["compresslevel"],
+        )
+        content = self.result_cache.disk.get(key)
+        if content is not None:
+            return _zip_file_name(kind, context), content
+
+        filename, content = self._render(kind, context, block=block)
+        self.result_cache.disk.set(key, content)
+        return filename, content
+
+    def _render(self, kind, context, *, block):
+        if not self._slots.acquire(blocking=block):
+            raise ServiceBusyError(
+                f"Already rendering {self.max_concurrency} requests"
+            )
+
+        try:
+            # Validated once, also to report invalid contexts without a
+            # round trip to a worker
+            _validate(kind, context)
+
+            if self._executor is None:
+                return RENDERERS[kind](
+                    context,
+                    engine=self.engine,
+                    validated=True,
+                    **self.zip_options,
+                )
+
+            return self._executor.submit(
+                _render_in_worker, kind, context, self.zip_options
+            ).result()
+        finally:
+            self._slots.release()
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def error_response(error):
+    """Returns the JSON-serializable description of an error"""
+    response = {"error": str(error)}
+    if isinstance(error, InvalidContextError):
+        response["errors"] = [
+            {"path": e.json_path, "message": e.message} for e in error.errors
+        ]
+    return response
+
+
+def content_disposition(filename):
+    """
+    Returns the Content-Disposition header of an attachment.
+
+    The file name comes from the context, so it is percent-encoded as of
+    RFC 6266, with a fallback for clients that do not support that which
+    only keeps token characters and needs no quoting.
+    """
+    fallback = re.sub(r"[^A-Za-z0-9._-]", "_", filename)
+    encoded = quote(filename, safe="")
+    return f"attachment; filename={fallback}; filename*=UTF-8''{encoded}"
+
+
+class ForgeRequestHandler(BaseHTTPRequestHandler):
+    """
+    Handles POST /pack and POST /algorithm with a JSON context as body,
+    responding with the zip file. GET /health reports readiness.
+    """
+
+    server_version = "grand-challenge-forge"
+
+    def do_GET(self):  # noqa: N802
+        if self.path == "/health":
+            self._send_json(HTTPStatus.OK, {"status": "ok"})
+        else:
+            self._send_json(HTTPStatus.NOT_FOUND, {"error": "Not found"})
+
+    def do_POST(self):  # noqa: N802
+        kind = self.path.strip("/")
+        if kind not in RENDERERS:
+            self._send_json(HTTPStatus.NOT_FOUND, {"error": "Not found"})
+            return
+
+        body = self._read_body()
+        if body is None:
+            return
+
+        try:
+            context = json.loads(body)
+            filename, content = self.server.service.render(kind, context)
+        except json.JSONDecodeError as e:
+            self._send_json(
+                HTTPStatus.BAD_REQUEST, {"error": f"Invalid JSON: {e}"}
+            )
+        except ServiceBusyError as e:
+            self._send_json(
+                HTTPStatus.SERVICE_UNAVAILABLE,
+                error_response(e),
+                headers={"Retry-After": "1"},
+            )
+        except InvalidContextError as e:
+            self._send_json(HTTPStatus.BAD_REQUEST, error_response(e))
+        except ChallengeForgeError as e:
+            self._send_json(HTTPStatus.UNPROCESSABLE_ENTITY, error_response(e))
+        except Exception:
+            logger.exception(f"Failed to render {kind}")
+            self._send_json(
+                HTTPStatus.INTERNAL_SERVER_ERROR, {"error": "Internal error"}
+            )
+        else:
+            self._send(
+                HTTPStatus.OK,
+                content,
+                content_type="application/zip",
+                headers={"Content-Disposition": content_disposition(filename)},
+            )
+
+    def _read_body(self):
+        """Returns the request body, or None once an error is sent"""
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+        except ValueError:
+            length = -1
+
+        if length < 0:
+            self._send_json(
+                HTTPStatus.BAD_REQUEST, {"error": "Invalid Content-Length"}
+            )
+            return None
+        if length > self.server.max_request_size:
+            self._send_json(
+                HTTPStatus.REQUEST_ENTITY_TOO_LARGE,
+                {"error": "Context is too large"},
+            )
+            return None
+
+        return self.rfile.read(length)
+
+    def _send_json(self, status, content, *, headers=None):
+        self._send(
+            status,
+            json.dumps(content).encode("utf-8"),
+            content_type="application/json",
+            headers=headers,
+        )
+
+    def _send(self, status, content, *, content_type, headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(content)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):
+        logger.info(f"{self.address_string()} {format % args}")
+
+
+def make_http_server(
+    service,
+    *,
+    host="127.0.0.1",
+    port=0,
+    max_request_size=DEFAULT_MAX_REQUEST_SIZE,
+):
+    """
+    Returns an HTTP server, handling each request in a thread, that renders
+    with the service. A port of 0 binds to a free port.
+    """
+    server = ThreadingHTTPServer((host, port), ForgeRequestHandler)
+    server.daemon_threads = True
+    server.service = service
+    server.max_request_size = max_request_size
+    return server
+
+
+def serve_stdio(service, *, stdin=None, stdout=None):
+    """
+    Answers line-delimited JSON requests until the input is closed.
+
+    Each request is an object with an "id", a "kind" ("pack" or
+    "algorithm") and a "context". Each response is a line with the "id" and
+    either the "filename" and base64 encoded "zip", or an "error". Requests
+    are handled concurrently, so responses can be out of order.
+    """
+    stdin = stdin or sys.stdin
+    stdout = stdout or sys.stdout
+    lock = threading.Lock()
+
+    def respond(response):
+        with lock:
+            stdout.write(json.dumps(response) + "\n")
+            stdout.flush()
+
+    def handle(request_id, kind, context):
+        try:
+            filename, content = service.render(kind, context, block=True)
+        except ChallengeForgeError as e:
+            respond({"id": request_id, **error_response(e)})
+        except Exception:
+            logger.exception(f"Failed to render request {request_id!r}")
+            respond({"id": request_id, "error": "Internal error"})
+        else:
+            respond(
+                {
+                    "id": request_id,
+                    "filename": filename,
+                    "zip": base64.b64encode(content).decode("ascii"),
+                }
+            )
+
+    with ThreadPoolExecutor(max_workers=service.max_concurrency) as executor:
+        for line in stdin:
+            if not line.strip():
+                continue
+
+            try:
+                request = json.loads(line)
+                request_id = request.get("id")
+                kind, context = request["kind"], request["context"]
+            except (json.JSONDecodeError, AttributeError, KeyError) as e:
+                respond({"id": None, "error": f"Invalid request: {e}"})
+                continue
+
+            executor.submit(handle, request_id, kind, context)
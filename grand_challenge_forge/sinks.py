@@ -0,0 +1,628 @@
+import hashlib
+import importlib
+import json
+import logging
+import os
+import shutil
+import stat
+import sys
+import zipfile
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from grand_challenge_forge import reproducibility
+
+logger = logging.getLogger(__name__)
+
+
+def _to_bytes(content):
+    if isinstance(content, str):
+        return content.encode("utf-8")
+    return content
+
+
+def _file_mode(path):
+    return stat.S_IMODE(os.stat(path).st_mode)
+
+
+class Sink:
+    """
+    Output that generated members (files) are written to.
+
+    Members are identified by their zpath: a relative path in the output.
+    A mode of None leaves the permissions of a member up to the sink.
+    """
+
+    def add(self, zpath, content, *, mode=None):
+        """Adds a member with the provided str or bytes content"""
+        raise NotImplementedError
+
+    def add_file(self, source, zpath, *, mode=None):
+        """Adds a member with the content of the source file"""
+        if mode is None:
+            mode = _file_mode(source)
+        self.add(zpath, Path(source).read_bytes(), mode=mode)
+
+    def add_deferred(self, zpath, produce, *, mode=None):
+        """
+        Adds a member with the content returned by calling produce.
+
+        Sinks that can, such as those that stream members on request, defer
+        the call until the content is needed.
+        """
+        self.add(zpath, produce(), mode=mode)
+
+    def add_chunks(self, zpath, chunks, *, mode=None):
+        """
+        Adds a member with the content of an iterable of str or bytes chunks.
+
+        Sinks that can, such as those that write files, write the chunks as
+        they are produced instead of joining them in memory first.
+        """
+        self.add(
+            zpath, b"".join(_to_bytes(chunk) for chunk in chunks), mode=mode
+        )
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+COMPRESSION_METHODS = {
+    "stored": zipfile.ZIP_STORED,
+    "deflate": zipfile.ZIP_DEFLATED,
+    "bzip2": zipfile.ZIP_BZIP2,
+    "lzma": zipfile.ZIP_LZMA,
+}
+
+_COMPRESSION_MODULES = {
+    zipfile.ZIP_DEFLATED: "zlib",
+    zipfile.ZIP_BZIP2: "bz2",
+    zipfile.ZIP_LZMA: "lzma",
+}
+
+
+def get_compression(name):
+    """Returns the zipfile compression method for its name, if available"""
+    try:
+        compression = COMPRESSION_METHODS[name]
+    except KeyError:
+        raise ValueError(f"Unknown compression {name!r}") from None
+
+    module = _COMPRESSION_MODULES.get(compression)
+    if module is not None:
+        try:
+            importlib.import_module(module)
+        except ImportError:
+            raise ValueError(
+                f"Compression {name!r} requires the {module} module"
+            ) from None
+
+    return compression
+
+
+# Parallel compression writes members that are already compressed, which
+# zipfile has no public API for. It relies on internals of zipfile that are
+# verified for these versions, elsewhere members are compressed while they
+# are written.
+_WRITES_PRECOMPRESSED = (
+    (3, 11) <= sys.version_info[:2] <= (3, 14)
+    and hasattr(zipfile, "_get_compressor")
+    and hasattr(zipfile.ZipFile, "_writecheck")
+)
+
+
+def _set_compresslevel(zinfo, compresslevel):
+    """Sets the level that ZipFile.open(zinfo, "w") compresses with"""
+    if sys.version_info >= (3, 13):
+        zinfo.compress_level = compresslevel
+    else:  # Only available as a private attribute before Python 3.13
+        zinfo._compresslevel = compresslevel
+
+
+def _compress(data, compression, compresslevel):
+    # Uses the compressors of zipfile itself so the output is identical.
+    # The compression libraries release the GIL while compressing.
+    compressor = zipfile._get_compressor(compression, compresslevel)
+    if compressor is None:
+        compressed = data
+    else:
+        compressed = compressor.compress(data) + compressor.flush()
+    return zlib.crc32(data), compressed
+
+
+class ZipSink(Sink):
+    """
+    Sink that writes members to an open, writable, ZipFile.
+
+    By default members are compressed in the calling thread. With
+    max_workers, members are compressed in a pool of threads and written in
+    order of addition: close the sink before closing the ZipFile. On Python
+    versions where that is not supported, max_workers is ignored.
+
+    Args
+    ----
+        zip_file (ZipFile): Zip file to write the members to.
+        compression (int, optional): zipfile.ZIP_STORED, ZIP_DEFLATED,
+        ZIP_BZIP2 or ZIP_LZMA. Defaults to that of the zip file.
+        compresslevel (int, optional): Level of compression, see zipfile.
+        max_workers (int, optional): Number of threads compressing members.
+        max_pending (int): Maximum number of members that can be queued
+        before adding blocks, which bounds memory use.
+    """
+
+    def __init__(
+        self,
+        zip_file,
+        *,
+        compression=None,
+        compresslevel=None,
+        max_workers=None,
+        max_pending=64,
+    ):
+        self.zip_file = zip_file
+        self.compression = (
+            zip_file.compression if compression is None else compression
+        )
+        self.compresslevel = (
+            zip_file.compresslevel if compresslevel is None else compresslevel
+        )
+        self.max_pending = max_pending
+
+        self._executor = None
+        if max_workers and max_workers > 1:
+            if _WRITES_PRECOMPRESSED:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=max_workers,
+                    thread_name_prefix="grand-challenge-forge-zip",
+                )
+            else:
+                logger.warning(
+                    "Parallel compression is not supported on this Python "
+                    "version, compressing members in the calling thread"
+                )
+        self._pending = deque()
+
+    def _zinfo(self, zpath, mode):
+        zinfo = zipfile.ZipInfo(
+            str(zpath),
+            # Technically, we are creating a new file.
+            # Also (partially) addresses a problem where docker build injects
+            # incorrect files:
+            # https://github.com/moby/buildkit/issues/4817#issuecomment-2032551066
+            date_time=reproducibility.zip_date_time(),
+        )
+        zinfo.compress_type = self.compression
+        if mode is not None:
+            zinfo.external_attr = (stat.S_IFREG | mode) << 16
+        return zinfo
+
+    def add(self, zpath, content, *, mode=None):
+        zinfo = self._zinfo(zpath, mode)
+        content = _to_bytes(content)
+
+        if self._executor is None:
+            self.zip_file.writestr(
+                zinfo, content, compresslevel=self.compresslevel
+            )
+            return
+
+        future = self._executor.submit(
+            _compress, content, self.compression, self.compresslevel
+        )
+        self._pending.append((zinfo, len(content), future))
+        while len(self._pending) > self.max_pending:
+            self._write_next()
+
+    def add_file(self, source, zpath, *, mode=None):
+        if self._executor is not None:
+            super().add_file(source, zpath, mode=mode)
+        elif mode is None and reproducibility.get_active_settings() is None:
+            self.zip_file.write(
+                str(source),
+                arcname=str(zpath),
+                compress_type=self.compression,
+                compresslevel=self.compresslevel,
+            )
+        else:
+            # Do not take over the modification time of the source
+            if mode is None:
+                mode = _file_mode(source)
+            zinfo = self._zinfo(zpath, mode)
+            _set_compresslevel(zinfo, self.compresslevel)
+            with (
+                open(source, "rb") as src,
+                self.zip_file.open(zinfo, "w") as dst,
+            ):
+                shutil.copyfileobj(src, dst)
+
+    def add_chunks(self, zpath, chunks, *, mode=None):
+        # Members are written in order of addition
+        self.flush()
+
+        zinfo = self._zinfo(zpath, mode)
+        _set_compresslevel(zinfo, self.compresslevel)
+        with self.zip_file.open(zinfo, "w") as dst:
+            for chunk in chunks:
+                dst.write(_to_bytes(chunk))
+
+    def _write_next(self):
+        zinfo, file_size, future = self._pending.popleft()
+        crc, compressed = future.result()
+        self._write_compressed(
+            zinfo, file_size=file_size, crc=crc, compressed=compressed
+        )
+
+    def _write_compressed(self, zinfo, *, file_size, crc, compressed):
+        # Mirrors ZipFile.open(..., "w") for data that is already compressed,
+        # the sizes are known so the header is written only once. Only used
+        # where _WRITES_PRECOMPRESSED holds.
+        zip_file = self.zip_file
+
+        zinfo.file_size = file_size
+        zinfo.compress_size = len(compressed)
+        zinfo.CRC = crc
+        zinfo.flag_bits = 0
+        if zinfo.compress_type == zipfile.ZIP_LZMA:
+            # Compressed data includes an end-of-stream marker
+            zinfo.flag_bits |= 0x02
+        if not zinfo.external_attr:
+            zinfo.external_attr = 0o600 << 16
+
+        with zip_file._lock:
+            if zip_file._writing:
+                raise ValueError(
+                    "Can't write to the ZIP file while another write handle "
+                    "is open"
+                )
+            if zip_file._seekable:
+                zip_file.fp.seek(zip_file.start_dir)
+            zinfo.header_offset = zip_file.fp.tell()
+
+            zip_file._writecheck(zinfo)
+            zip_file._didModify = True
+
+            zip_file.fp.write(zinfo.FileHeader())
+            zip_file.fp.write(compressed)
+
+            zip_file.start_dir = zip_file.fp.tell()
+            zip_file.filelist.append(zinfo)
+            zip_file.NameToInfo[zinfo.filename] = zinfo
+
+    def flush(self):
+        while self._pending:
+            self._write_next()
+
+    def close(self):
+        if self._executor is None:
+            return
+        try:
+            self.flush()
+        finally:
+            self._executor.shutdown(wait=True)
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.close()
+        elif self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._pending.clear()
+
+
+class MemorySink(Sink):
+    """Sink that keeps the members, in order of addition, in memory"""
+
+    def __init__(self):
+        self.members = []
+
+    def add(self, zpath, content, *, mode=None):
+        self.members.append((Path(zpath), _to_bytes(content), mode))
+
+    def replay(self, sink):
+        """Adds all kept members to another sink"""
+        for zpath, content, mode in self.members:
+            sink.add(zpath, content, mode=mode)
+
+    def __iter__(self):
+        return iter(self.members)
+
+    def __len__(self):
+        return len(self.members)
+
+
+class DirectorySink(Sink):
+    """
+    Sink that writes members as files to a directory.
+
+    File writes are batched through a pool of threads and file modes are set
+    directly. Writes are awaited, and errors raised, on close.
+
+    Args
+    ----
+        output_path (str, Path): Directory to write the members to.
+        max_workers (int): Number of threads writing files.
+        max_pending (int): Maximum number of writes that can be queued
+        before adding blocks, which bounds memory use.
+    """
+
+    def __init__(self, output_path, *, max_workers=4, max_pending=64):
+        self.output_path = Path(output_path)
+        self.max_pending = max_pending
+        self.written = []
+
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix="grand-challenge-forge-sink",
+        )
+        self._pending = deque()
+        self._created_dirs = set()
+
+    def _target_path(self, zpath):
+        parts = [part for part in Path(zpath).parts if part not in ("/", "")]
+        if ".." in parts:
+            raise PermissionError(f"Refusing to write outside: {zpath}")
+        return self.output_path.joinpath(*parts)
+
+    def _prepare(self, zpath):
+        path = self._target_path(zpath)
+
+        parent = path.parent
+        if parent not in self._created_dirs:
+            parent.mkdir(parents=True, exist_ok=True)
+            self._created_dirs.add(parent)
+
+        self.written.append(path)
+        return path
+
+    def _submit(self, fn, *args):
+        while len(self._pending) >= self.max_pending:
+            self._pending.popleft().result()
+        self._pending.append(self._executor.submit(fn, *args))
+
+    @staticmethod
+    def _write(path, content, mode):
+        # Existing files could be read-only
+        path.unlink(missing_ok=True)
+        with open(path, "wb") as f:
+            f.write(content)
+        if mode is not None:
+            os.chmod(path, mode)
+
+    @staticmethod
+    def _copy(path, source, mode):
+        path.unlink(missing_ok=True)
+        shutil.copyfile(source, path)
+        os.chmod(path, mode)
+
+    def add(self, zpath, content, *, mode=None):
+        path = self._prepare(zpath)
+        self._submit(self._write, path, _to_bytes(content), mode)
+
+    def add_file(self, source, zpath, *, mode=None):
+        if mode is None:
+            mode = _file_mode(source)
+        path = self._prepare(zpath)
+        self._submit(self._copy, path, source, mode)
+
+    def add_chunks(self, zpath, chunks, *, mode=None):
+        # Chunks are produced, and written, in the calling thread
+        path = self._prepare(zpath)
+        path.unlink(missing_ok=True)
+        with open(path, "wb") as f:
+            for chunk in chunks:
+                f.write(_to_bytes(chunk))
+        if mode is not None:
+            os.chmod(path, mode)
+
+    def flush(self):
+        while self._pending:
+            self._pending.popleft().result()
+
+    def close(self):
+        try:
+            self.flush()
+        finally:
+            self._executor.shutdown(wait=True)
+
+    def remove_written(self):
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        self._pending.clear()
+        for path in reversed(self.written):
+            path.unlink(missing_ok=True)
+        self.written.clear()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            try:
+                self.close()
+                return
+            except BaseException:
+                self.remove_written()
+                raise
+        self.remove_written()
+
+
+class SyncDirectorySink(DirectorySink):
+    """
+    Directory sink that only writes members whose content or mode changed.
+
+    A manifest with the content hash, size, mode and modification time of
+    each member is kept next to the output. Members that are unchanged are
+    not rewritten and keep their modification time. Files that were
+    modified since the last sync, according to their size and modification
+    time, are hashed to check they still have the same content, so local
+    edits are restored. Members of a previous sync that are no longer added
+    are removed on close. Without a (valid) manifest, for instance for
+    output of a generation that did not sync, all files in root that are
+    not added are removed.
+
+    Args
+    ----
+        output_path (str, Path): Directory to write the members to.
+        manifest_path (str, Path): File to keep the manifest in.
+        root (str, Path, optional): Directory, relative to output_path,
+        that holds all members.
+    """
+
+    def __init__(self, output_path, *, manifest_path, root=None, **kwargs):
+        super().__init__(output_path, **kwargs)
+        self.manifest_path = Path(manifest_path)
+        self.root = root
+
+        manifest = self._load_manifest()
+        self.tracked = manifest is not None
+        self.previous_manifest = manifest or {}
+        self.manifest = {}
+        self.skipped = 0
+        self.removed = 0
+
+    def _load_manifest(self):
+        try:
+            with open(self.manifest_path) as f:
+                return json.load(f)["members"]
+        except FileNotFoundError:
+            return None
+        except (ValueError, KeyError):
+            logger.warning(f"Ignoring invalid manifest {self.manifest_path}")
+            return None
+
+    def _save_manifest(self, members):
+        self.manifest_path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = self.manifest_path.with_suffix(".tmp")
+        with open(temp_path, "w") as f:
+            json.dump({"members": members}, f, indent=2, sort_keys=True)
+        os.replace(temp_path, self.manifest_path)
+
+    def _is_unchanged(self, key, entry):
+        previous = self.previous_manifest.get(key)
+        if previous is None or any(
+            previous.get(name) != value for name, value in entry.items()
+        ):
+            return False
+
+        path = self.output_path / key
+        try:
+            file_stat = path.stat()
+        except FileNotFoundError:
+            return False
+        if file_stat.st_size != entry["size"] or (
+            entry["mode"] is not None
+            and stat.S_IMODE(file_stat.st_mode) != entry["mode"]
+        ):
+            return False
+        if file_stat.st_mtime_ns == previous.get("mtime_ns"):
+            return True
+
+        # Touched since the last sync, possibly without changing the content
+        return _file_sha256(path) == entry["sha256"]
+
+    def add(self, zpath, content, *, mode=None):
+        content = _to_bytes(content)
+
+        key = self._target_path(zpath).relative_to(self.output_path)
+        key = key.as_posix()
+        entry = {
+            "sha256": hashlib.sha256(content).hexdigest(),
+            "size": len(content),
+            "mode": mode,
+        }
+        self.manifest[key] = entry
+
+        if self._is_unchanged(key, entry):
+            self.skipped += 1
+            return
+
+        super().add(zpath, content, mode=mode)
+
+    def add_file(self, source, zpath, *, mode=None):
+        if mode is None:
+            mode = _file_mode(source)
+        self.add(zpath, Path(source).read_bytes(), mode=mode)
+
+    def add_chunks(self, zpath, chunks, *, mode=None):
+        # The whole content is needed to compare it to the manifest
+        Sink.add_chunks(self, zpath, chunks, mode=mode)
+
+    def _previous_members(self):
+        if self.tracked or self.root is None:
+            return set(self.previous_manifest)
+
+        # Whatever is in the output is not known to be a member
+        root_path = self.output_path / self.root
+        return {
+            path.relative_to(self.output_path).as_posix()
+            for path in root_path.glob("**/*")
+            if not path.is_dir()
+        }
+
+    def _remove_stale(self):
+        for key in sorted(self._previous_members() - set(self.manifest)):
+            path = self.output_path / key
+            path.unlink(missing_ok=True)
+            self.removed += 1
+
+            # Clean up directories that became empty
+            parent = path.parent
+            while parent != self.output_path:
+                try:
+                    parent.rmdir()
+                except OSError:
+                    break
+                parent = parent.parent
+
+    def close(self):
+        super().close()
+        self._remove_stale()
+
+        # Record the modification times once all members are written
+        for key, entry in self.manifest.items():
+            try:
+                entry["mtime_ns"] = (self.output_path / key).stat().st_mtime_ns
+            except FileNotFoundError:
+                pass
+        self._save_manifest(self.manifest)
+
+    def remove_written(self):
+        # Files that were overwritten cannot be restored: keep them, but make
+        # sure they are rewritten during the next sync
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        self._pending.clear()
+
+        if not self.tracked:
+            return
+
+        written = {
+            path.relative_to(self.output_path).as_posix()
+            for path in self.written
+        }
+        self._save_manifest(
+            {
+                key: entry
+                for key, entry in self.previous_manifest.items()
+                if key not in written
+            }
+        )
+
+
+def _file_sha256(path):
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(1024 * 1024):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def as_sink(output):
+    """Returns a Sink for the output, wrapping ZipFile handles"""
+    if isinstance(output, Sink):
+        return output
+    if isinstance(output, zipfile.ZipFile):
+        return ZipSink(output)
+    raise TypeError(f"Cannot write generated output to {output!r}")
@@ -0,0 +1,219 @@
+import concurrent.futures
+import contextvars
+import queue
+import threading
+from collections.abc import Iterable
+from functools import partial
+from pathlib import Path
+from typing import NamedTuple
+
+from grand_challenge_forge.sinks import Sink, _file_mode, _to_bytes
+
+CHUNK_SIZE = 64 * 1024
+
+# Members generated ahead of the consumer
+MAX_QUEUED = 16
+
+# Interval, in seconds, at which a blocked producer checks for abandonment
+_CANCEL_POLL_INTERVAL = 0.1
+
+
+class Member(NamedTuple):
+    """
+    A file of a pack or algorithm template.
+
+    The content is either bytes or a single-use iterable of byte chunks that
+    are only produced, for instance rendered, when iterated over.
+    """
+
+    path: Path
+    mode: int | None
+    content: bytes | Iterable[bytes]
+
+    def chunks(self):
+        """Returns the content as an iterable of byte chunks"""
+        if isinstance(self.content, bytes):
+            return (self.content,)
+        return self.content
+
+    def read(self):
+        """Returns the content as bytes"""
+        return b"".join(self.chunks())
+
+
+class _Done(NamedTuple):
+    """End of the members, with the error the generation raised, if any"""
+
+    error: Exception | None
+
+
+def _read_chunks(path):
+    with open(path, "rb") as f:
+        while chunk := f.read(CHUNK_SIZE):
+            yield chunk
+
+
+def _produce_chunks(produce):
+    yield _to_bytes(produce())
+
+
+class _QueueSink(Sink):
+    """
+    Sink that hands members, from the thread that generates them, to a
+    bounded queue without producing deferred or chunked content
+    """
+
+    def __init__(self, *, members, cancelled):
+        self.members = members
+        self.cancelled = cancelled
+
+    def _put(self, item):
+        # Block while the consumer is behind, but not past an abandonment
+        while True:
+            if self.cancelled.is_set():
+                raise concurrent.futures.CancelledError
+            try:
+                return self.members.put(item, timeout=_CANCEL_POLL_INTERVAL)
+            except queue.Full:
+                pass
+
+    def add(self, zpath, content, *, mode=None):
+        self._put(Member(Path(zpath), mode, _to_bytes(content)))
+
+    def add_file(self, source, zpath, *, mode=None):
+        if mode is None:
+            mode = _file_mode(source)
+        self._put(Member(Path(zpath), mode, _read_chunks(source)))
+
+    def add_deferred(self, zpath, produce, *, mode=None):
+        self._put(Member(Path(zpath), mode, _produce_chunks(produce)))
+
+    def add_chunks(self, zpath, chunks, *, mode=None):
+        self._put(Member(Path(zpath), mode, (_to_bytes(c) for c in chunks)))
+
+
+def _produce(generate, *, sink, **kwargs):
+    try:
+        generate(output_zip_file=sink, validate=False, **kwargs)
+    except concurrent.futures.CancelledError:
+        return
+    except Exception as e:
+        done = _Done(error=e)
+    else:
+        done = _Done(error=None)
+
+    try:
+        sink._put(done)
+    except concurrent.futures.CancelledError:
+        pass
+
+
+def _iter_members(generate, *, context_vars, **kwargs):
+    members = queue.Queue(maxsize=MAX_QUEUED)
+    cancelled = threading.Event()
+    thread = threading.Thread(
+        target=context_vars.run,
+        args=(
+            partial(
+                _produce,
+                generate,
+                sink=_QueueSink(members=members, cancelled=cancelled),
+                **kwargs,
+            ),
+        ),
+        name="grand-challenge-forge-stream",
+        daemon=True,
+    )
+    thread.start()
+
+    try:
+        while True:
+            item = members.get()
+            if isinstance(item, _Done):
+                if item.error is not None:
+                    raise item.error
+                return
+            yield item
+    finally:
+        # Stop a generation that is abandoned, and wait for it to stop
+        cancelled.set()
+        thread.join()
+
+
+def iter_pack_files(
+    *,
+    context,
+    target_zpath,
+    engine=None,
+    reproducible=None,
+    python_format=None,
+):
+    """
+    Returns an iterator over the members of a challenge pack.
+
+    The context is validated when called. The members are generated in a
+    thread while they are consumed, at most `MAX_QUEUED` ahead of the
+    consumer, and closing the iterator stops the generation. Templates are
+    only rendered once the content of their member is iterated over, so
+    listing the paths does not render anything. The context must not be
+    modified until the members are consumed.
+
+    Args
+    ----
+        context (dict): The pack context.
+        target_zpath (Path): Path to generate the pack at.
+        engine (Forge, optional): Engine to render with.
+        reproducible (bool, Reproducible, optional): Generate identical
+        members for identical contexts, see `generate_challenge_pack`.
+        python_format (str, optional): How rendered Python code is
+        formatted, see `generate_challenge_pack`.
+
+    Returns
+    -------
+        An iterator of Member tuples: (path, mode, content).
+    """
+    from grand_challenge_forge.forge import generate_challenge_pack
+    from grand_challenge_forge.schemas import validate_pack_context
+
+    validate_pack_context(context)
+
+    return _iter_members(
+        generate_challenge_pack,
+        context_vars=contextvars.copy_context(),
+        target_zpath=Path(target_zpath),
+        context=context,
+        engine=engine,
+        reproducible=reproducible,
+        python_format=python_format,
+    )
+
+
+def iter_algorithm_template_files(
+    *,
+    context,
+    target_zpath,
+    engine=None,
+    reproducible=None,
+    python_format=None,
+):
+    """
+    Returns an iterator over the members of an algorithm template.
+
+    See `iter_pack_files` for how the members are generated and rendered.
+    """
+    from grand_challenge_forge.forge import generate_algorithm_template
+    from grand_challenge_forge.schemas import (
+        validate_algorithm_template_context,
+    )
+
+    validate_algorithm_template_context(context)
+
+    return _iter_members(
+        generate_algorithm_template,
+        context_vars=contextvars.copy_context(),
+        target_zpath=Path(target_zpath),
+        context=context,
+        engine=engine,
+        reproducible=reproducible,
+        python_format=python_format,
+    )
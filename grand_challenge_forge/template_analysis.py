@@ -0,0 +1,142 @@
+from collections.abc import Mapping
+
+from grand_challenge_forge.cache import hash_key
+
+ATTR = "attr"
+ITEM = "item"
+
+_MISSING = object()
+
+
+def find_context_reads(ast):
+    """
+    Returns the context paths that a parsed Jinja2 template reads.
+
+    A path is the name of a context variable followed by the constant
+    attribute and item lookups made on it, for instance
+    ('phase', ('attr', 'archive'), ('attr', 'slug')) for `phase.archive.slug`.
+    Where a lookup is dynamic, or a variable is used as a whole, the path
+    stops early and covers more of the context.
+    """
+    from jinja2 import meta, nodes
+
+    loaded, assigned = set(), set()
+    for name in ast.find_all(nodes.Name):
+        (loaded if name.ctx == "load" else assigned).add(name.name)
+
+    # Variables that are assigned in the template, but possibly read from
+    # the context before that, are read as a whole
+    roots = (loaded - assigned) | meta.find_undeclared_variables(ast)
+
+    reads = set()
+    _collect_reads(ast, roots=roots, assigned=assigned, reads=reads)
+    return frozenset(reads)
+
+
+def _lookup_chain(node):
+    from jinja2 import nodes
+
+    path = []
+    while True:
+        if isinstance(node, nodes.Getattr):
+            path.append((ATTR, node.attr))
+        elif (
+            isinstance(node, nodes.Getitem)
+            and isinstance(node.arg, nodes.Const)
+            and isinstance(node.arg.value, (str, int))
+        ):
+            path.append((ITEM, node.arg.value))
+        else:
+            return node, tuple(reversed(path))
+        node = node.node
+
+
+def _collect_reads(node, *, roots, assigned, reads):
+    from jinja2 import nodes
+
+    if isinstance(node, (nodes.Getattr, nodes.Getitem)):
+        base, path = _lookup_chain(node)
+        if path and isinstance(base, nodes.Name):
+            if base.ctx == "load" and base.name in roots:
+                if base.name in assigned:
+                    reads.add((base.name,))
+                else:
+                    reads.add((base.name, *path))
+            return
+    elif isinstance(node, nodes.Name):
+        if node.ctx == "load" and node.name in roots:
+            reads.add((node.name,))
+        return
+
+    for child in node.iter_child_nodes():
+        _collect_reads(child, roots=roots, assigned=assigned, reads=reads)
+
+
+def resolve_read(context, path):
+    """
+    Returns the value in the context that a read covers, following the
+    lookups as far as they are unambiguous
+    """
+    value = context.get(path[0], _MISSING)
+
+    for kind, key in path[1:]:
+        if isinstance(value, Mapping):
+            # Jinja2 prefers attributes, such as dict.items, over items
+            # for attribute lookups and the other way around for items
+            if kind == ATTR and hasattr(value, key):
+                break
+            if key not in value:
+                break
+            value = value[key]
+        elif isinstance(value, (list, tuple)):
+            if not isinstance(key, int) or not -len(value) <= key < len(value):
+                break
+            value = value[key]
+        elif (
+            kind == ATTR
+            and not key.startswith("_")
+            and not isinstance(value, str)
+            and not callable(getattr(value, key, None))
+            and hasattr(value, key)
+        ):
+            value = getattr(value, key)
+        else:
+            break
+
+    return value
+
+
+def _canonical_parts(value):
+    # Types are part of the representation: a tuple renders differently
+    # than a list. The order of mappings is kept, as it is for iterating.
+    if value is _MISSING:
+        yield "missing"
+    elif isinstance(value, str):
+        yield "str"
+        yield value
+    elif value is None or isinstance(value, (bool, int, float)):
+        yield type(value).__name__
+        yield repr(value)
+    elif isinstance(value, Mapping):
+        yield "mapping"
+        yield str(len(value))
+        for key, item in value.items():
+            yield from _canonical_parts(key)
+            yield from _canonical_parts(item)
+    elif isinstance(value, (list, tuple)):
+        yield type(value).__name__
+        yield str(len(value))
+        for item in value:
+            yield from _canonical_parts(item)
+    else:
+        yield f"{type(value).__module__}.{type(value).__qualname__}"
+        yield repr(value)
+
+
+def context_digest(context, reads):
+    """Returns a canonical digest of the context values covered by reads"""
+    parts = []
+    for path in sorted(reads, key=repr):
+        parts.append(repr(path))
+        parts.extend(_canonical_parts(resolve_read(context, path)))
+    return hash_key(*parts)
@@ -1,3 +1,4 @@
+import functools
 import importlib
 import os
 from contextlib import contextmanager
@@ -33,3 +34,12 @@ def directly_import_module(name, path):
     spec.loader.exec_module(module)
 
     return module
+
+
+@functools.cache
+def get_forge_version():
+    """Returns the installed version of grand-challenge-forge"""
+    # Resolving distribution metadata scans sys.path, so only do it once
+    from importlib import metadata
+
+    return metadata.version("grand-challenge-forge")
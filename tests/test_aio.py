@@ -0,0 +1,217 @@
+import asyncio
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+
+import pytest
+
+from grand_challenge_forge import aio
+from grand_challenge_forge.aio import (
+    agenerate_algorithm_template,
+    agenerate_challenge_pack,
+    aiter_algorithm_template_files,
+    aiter_pack_files,
+)
+from grand_challenge_forge.exceptions import InvalidContextError
+from grand_challenge_forge.forge import (
+    generate_algorithm_template,
+    generate_challenge_pack,
+)
+from grand_challenge_forge.images import ImageStub
+from grand_challenge_forge.sinks import MemorySink
+from tests.utils import (
+    algorithm_template_context_factory,
+    members_of,
+    pack_context_factory,
+)
+
+
+@pytest.mark.parametrize(
+    "agenerate, aiter_files, generate, context_factory",
+    (
+        (
+            agenerate_challenge_pack,
+            aiter_pack_files,
+            generate_challenge_pack,
+            pack_context_factory,
+        ),
+        (
+            agenerate_algorithm_template,
+            aiter_algorithm_template_files,
+            generate_algorithm_template,
+            algorithm_template_context_factory,
+        ),
+    ),
+)
+def test_async_generation_matches_generate(
+    agenerate, aiter_files, generate, context_factory
+):
+    context = context_factory()
+    kwargs = dict(
+        context=context, target_zpath=Path("output"), reproducible=True
+    )
+
+    expected = MemorySink()
+    generate(output_zip_file=expected, **kwargs)
+
+    async def main():
+        sink = MemorySink()
+        await agenerate(output_zip_file=sink, **kwargs)
+
+        streamed = {
+            str(member.path): await member.read()
+            async for member in aiter_files(**kwargs)
+        }
+        return sink, streamed
+
+    sink, streamed = asyncio.run(main())
+
+    assert members_of(sink) == members_of(expected)
+    assert streamed == members_of(expected)
+
+
+def test_aiter_pack_files_streams_large_members_in_chunks():
+    context = pack_context_factory()
+    context["challenge"]["phases"] = context["challenge"]["phases"][:1]
+
+    async def main():
+        images = []
+        async for member in aiter_pack_files(
+            context=context,
+            target_zpath="pack",
+            image_stub=ImageStub(shape=(16, 16, 8)),
+        ):
+            if member.path.suffix == ".mha":
+                images.append([chunk async for chunk in member.chunks()])
+            # Other members are left unread, and discarded
+        return images
+
+    images = asyncio.run(main())
+
+    assert images
+    for chunks in images:
+        assert len(chunks) > 1
+        assert len(b"".join(chunks)) > 16 * 16 * 8 * 2
+
+
+def test_aiter_pack_files_raises_generation_errors():
+    async def main():
+        return [
+            member
+            async for member in aiter_pack_files(
+                context={}, target_zpath="pack"
+            )
+        ]
+
+    with pytest.raises(InvalidContextError):
+        asyncio.run(main())
+
+
+def test_aiter_pack_files_stops_generation_when_abandoned():
+    executor = ThreadPoolExecutor(max_workers=1)
+
+    async def main():
+        members = aiter_pack_files(
+            context=pack_context_factory(),
+            target_zpath="pack",
+            executor=executor,
+        )
+        async for _ in members:
+            break
+        await members.aclose()
+
+        # The pack has more members than are queued ahead, so the worker
+        # is only free again if the generation was stopped
+        return await asyncio.get_running_loop().run_in_executor(
+            executor, threading.current_thread
+        )
+
+    try:
+        assert asyncio.run(asyncio.wait_for(main(), timeout=30))
+    finally:
+        executor.shutdown()
+
+
+def test_agenerate_challenge_pack_cancellation():
+    started = threading.Event()
+    added = []
+
+    class SlowSink(MemorySink):
+        def add(self, zpath, content, *, mode=None):
+            started.set()
+            added.append(zpath)
+            threading.Event().wait(0.01)
+            super().add(zpath, content, mode=mode)
+
+    async def main():
+        task = asyncio.create_task(
+            agenerate_challenge_pack(
+                output_zip_file=SlowSink(),
+                context=pack_context_factory(),
+                target_zpath=Path("pack"),
+            )
+        )
+        while not started.is_set():
+            await asyncio.sleep(0.01)
+        task.cancel()
+
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        return len(added)
+
+    number_added = asyncio.run(main())
+
+    # Nothing is added once the cancellation is raised
+    assert len(added) == number_added
+
+    complete = MemorySink()
+    generate_challenge_pack(
+        output_zip_file=complete,
+        context=pack_context_factory(),
+        target_zpath=Path("pack"),
+    )
+    assert number_added < len(members_of(complete))
+
+
+def test_concurrent_generations_share_the_default_executor():
+    async def main():
+        sinks = [MemorySink() for _ in range(8)]
+        await asyncio.gather(
+            *(
+                agenerate_algorithm_template(
+                    output_zip_file=sink,
+                    context=algorithm_template_context_factory(),
+                    target_zpath=Path("template"),
+                )
+                for sink in sinks
+            )
+        )
+        return sinks
+
+    sinks = asyncio.run(main())
+
+    assert all(members_of(sink) for sink in sinks)
+    executor = aio.get_default_executor()
+    assert executor is aio.get_default_executor()
+    assert executor._max_workers == aio.DEFAULT_MAX_WORKERS
+
+
+def test_process_pool_executors_are_rejected():
+    context = pack_context_factory()
+
+    async def main(executor):
+        with pytest.raises(TypeError, match="ProcessPoolExecutor"):
+            await agenerate_challenge_pack(
+                output_zip_file=MemorySink(),
+                context=context,
+                target_zpath=Path("pack"),
+                executor=executor,
+            )
+
+        with pytest.raises(TypeError, match="ProcessPoolExecutor"):
+            aiter_pack_files(
+                context=context, target_zpath="pack", executor=executor
+            )
+
+    with ProcessPoolExecutor(max_workers=1) as executor:
+        asyncio.run(main(executor))
@@ -1,5 +1,9 @@
+from copy import deepcopy
+from pathlib import Path
+
 from grand_challenge_forge.forge import generate_algorithm_template
 from grand_challenge_forge.generation_utils import zipfile_to_filesystem
+from grand_challenge_forge.sinks import MemorySink
 from tests.utils import _test_script_run, algorithm_template_context_factory
 
 
@@ -27,6 +31,19 @@ def test_for_algorithm_template_content(tmp_path, testrun_zpath):
         assert (template_path / filename).exists()
 
 
+def test_algorithm_template_context_is_not_modified():
+    context = algorithm_template_context_factory()
+    expected_context = deepcopy(context)
+
+    generate_algorithm_template(
+        context=context,
+        output_zip_file=MemorySink(),
+        target_zpath=Path("template"),
+    )
+
+    assert context == expected_context
+
+
 def test_algorithm_template_run(tmp_path, testrun_zpath):
     algorithm_template_context = algorithm_template_context_factory()
     with zipfile_to_filesystem(output_path=tmp_path) as zip_file:
@@ -0,0 +1,96 @@
+import json
+
+from click.testing import CliRunner
+
+from benchmarks.contexts import (
+    synthetic_algorithm_template_context,
+    synthetic_pack_context,
+)
+from benchmarks.suite import cli, compare_results, run_benchmarks
+from grand_challenge_forge.schemas import (
+    validate_algorithm_template_context,
+    validate_pack_context,
+)
+
+
+def test_synthetic_contexts_are_valid():
+    pack_context = synthetic_pack_context(
+        phases=3, interfaces_per_phase=2, sockets_per_interface=5
+    )
+    validate_pack_context(pack_context)
+
+    phases = pack_context["challenge"]["phases"]
+    assert len(phases) == 3
+    assert len(phases[0]["algorithm_interfaces"]) == 2
+    assert len(phases[0]["algorithm_interfaces"][0]["inputs"]) == 5
+
+    validate_algorithm_template_context(synthetic_algorithm_template_context())
+
+
+def test_synthetic_contexts_are_reproducible():
+    assert synthetic_pack_context(seed=1) == synthetic_pack_context(seed=1)
+
+
+def test_synthetic_context_image_share():
+    def super_kinds(image_share):
+        context = synthetic_pack_context(image_share=image_share)
+        return {
+            socket["super_kind"]
+            for phase in context["challenge"]["phases"]
+            for interface in phase["algorithm_interfaces"]
+            for socket in interface["inputs"] + interface["outputs"]
+        }
+
+    assert "Image" not in super_kinds(0)
+    assert super_kinds(1) == {"Image"}
+
+
+def test_run_benchmarks():
+    results = run_benchmarks(
+        scenarios=["small"],
+        benchmarks=["validate_pack_context", "zip_stored", "zip_deflate"],
+        repeats=1,
+    )["results"]
+
+    assert set(results) == {
+        "small/validate_pack_context",
+        "small/zip_stored",
+        "small/zip_deflate",
+    }
+    assert all(r["min"] > 0 for r in results.values())
+    assert results["small/zip_deflate"]["size"] < (
+        results["small/zip_stored"]["size"]
+    )
+
+
+def test_compare_reports_regressions(tmp_path):
+    def results(**timings):
+        return {
+            "results": {
+                name: {"min": value, "median": value, "repeats": 1}
+                for name, value in timings.items()
+            }
+        }
+
+    baseline = results(a=1.0, b=1.0, only_in_baseline=1.0)
+    current = results(a=1.1, b=2.0, only_in_current=1.0)
+
+    assert compare_results(baseline=baseline, current=current) == [
+        ("a", 1.0, 1.1, 0.10000000000000009, False),
+        ("b", 1.0, 2.0, 1.0, True),
+    ]
+
+    for name, content in (("baseline", baseline), ("current", current)):
+        (tmp_path / f"{name}.json").write_text(json.dumps(content))
+
+    result = CliRunner().invoke(
+        cli,
+        [
+            "compare",
+            str(tmp_path / "baseline.json"),
+            str(tmp_path / "current.json"),
+        ],
+    )
+
+    assert result.exit_code == 1
+    assert "REGRESSION" in result.output
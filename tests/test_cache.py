@@ -0,0 +1,78 @@
+import os
+from unittest.mock import patch
+
+import black
+
+from grand_challenge_forge.cache import (
+    DiskCache,
+    LRUCache,
+    TieredCache,
+    hash_key,
+)
+from grand_challenge_forge.generation_utils import apply_black
+
+
+def test_hash_key_is_unambiguous():
+    assert hash_key("ab", "c") != hash_key("a", "bc")
+    assert hash_key("a", "b") == hash_key(b"a", b"b")
+
+
+def test_lru_cache_eviction():
+    cache = LRUCache(maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+
+    assert cache.get("a") == 1  # Marks 'a' as recently used
+
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert (cache.hits, cache.misses) == (3, 1)
+
+
+def test_disk_cache_size_based_eviction(tmp_path):
+    cache = DiskCache(tmp_path, max_size=25)
+
+    for idx, key in enumerate(["a" * 64, "b" * 64, "c" * 64]):
+        cache.set(key, b"0123456789")
+        # Ensure a deterministic order of use
+        os.utime(cache._path(key), (idx, idx))
+
+    cache.set("d" * 64, b"0123456789")
+
+    assert cache.get("a" * 64) is None
+    assert cache.get("b" * 64) is None
+    assert cache.get("c" * 64) == b"0123456789"
+    assert cache.get("d" * 64) == b"0123456789"
+
+
+def test_disk_cache_persists_across_instances(tmp_path):
+    DiskCache(tmp_path).set("a" * 64, b"value")
+    assert DiskCache(tmp_path).get("a" * 64) == b"value"
+
+
+def test_apply_black_cache(tmp_path):
+    def new_cache():
+        return TieredCache(
+            memory=LRUCache(),
+            disk=DiskCache(tmp_path),
+        )
+
+    cache = new_cache()
+    source = "x = {  'a':37,'b':42,\n'c':927}\n"
+    expected = black.format_str(source, mode=black.Mode())
+
+    with patch("black.format_str", wraps=black.format_str) as format_str:
+        assert apply_black(source, cache=cache) == expected
+        assert apply_black(source, cache=cache) == expected
+        assert format_str.call_count == 1
+
+        # Sanity: different content is not served from the cache
+        apply_black(source + "y = 1\n", cache=cache)
+        assert format_str.call_count == 2
+
+        # A fresh process only has the disk cache
+        assert apply_black(source, cache=new_cache()) == expected
+        assert format_str.call_count == 2
@@ -0,0 +1,309 @@
+import json
+import os
+import subprocess
+import sys
+from unittest.mock import patch
+
+from click.testing import CliRunner
+
+from grand_challenge_forge import forge
+from grand_challenge_forge.cli import cli
+from grand_challenge_forge.exceptions import ChallengeForgeError
+from grand_challenge_forge.utils import get_forge_version
+from tests.utils import (
+    algorithm_template_context_factory,
+    pack_context_factory,
+)
+
+
+def test_pack_jobs(tmp_path):
+    contexts = [pack_context_factory() for _ in range(3)]
+
+    # Sanity: one already exists
+    (tmp_path / f"{contexts[0]['challenge']['slug']}-challenge-pack").mkdir()
+
+    result = CliRunner().invoke(
+        cli,
+        [
+            "pack",
+            "--jobs",
+            "2",
+            "--output",
+            str(tmp_path),
+            *[json.dumps(context) for context in contexts],
+            "{ not a json",
+        ],
+    )
+
+    assert result.exit_code == 0, result.output
+    assert result.stdout.splitlines() == [
+        str(tmp_path / f"{context['challenge']['slug']}-challenge-pack")
+        for context in contexts[1:]
+    ]
+    assert "2 succeeded, 2 failed" in result.stderr
+
+
+def test_algorithm_jobs(tmp_path):
+    contexts = [algorithm_template_context_factory() for _ in range(2)]
+
+    result = CliRunner().invoke(
+        cli,
+        [
+            "algorithm",
+            "-j",
+            "2",
+            "--output",
+            str(tmp_path),
+            *[json.dumps(context) for context in contexts],
+        ],
+    )
+
+    assert result.exit_code == 0, result.output
+    for context in contexts:
+        template_dir = tmp_path / f"{context['algorithm']['slug']}-template"
+        assert (template_dir / "inference.py").exists()
+    assert "2 succeeded, 0 failed" in result.stderr
+
+
+def test_pack_jobs_propagates_unexpected_errors(tmp_path):
+    result = CliRunner().invoke(
+        cli,
+        [
+            "pack",
+            "--jobs",
+            "2",
+            "--output",
+            str(tmp_path),
+            json.dumps(pack_context_factory()),
+            json.dumps({"not-a-challenge": {}}),
+        ],
+    )
+
+    assert isinstance(result.exception, KeyError)
+
+
+def test_pack_sync(tmp_path):
+    context = pack_context_factory()
+    pack_dir = tmp_path / f"{context['challenge']['slug']}-challenge-pack"
+
+    def sync():
+        return CliRunner().invoke(
+            cli,
+            ["pack", "--sync", "--output", str(tmp_path), json.dumps(context)],
+        )
+
+    assert sync().exit_code == 0
+
+    readme = pack_dir / "README.md"
+    os.utime(readme, (0, 0))
+    (pack_dir / "stale.txt").touch()
+
+    assert sync().exit_code == 0
+
+    # Sanity: files not generated by the forge are left alone
+    assert (pack_dir / "stale.txt").exists()
+    assert readme.stat().st_mtime == 0
+    assert (tmp_path / f".{pack_dir.name}.manifest.json").exists()
+
+
+def test_pack_sync_over_unsynced_output(tmp_path):
+    context = pack_context_factory()
+    pack_name = f"{context['challenge']['slug']}-challenge-pack"
+
+    def pack(output, *args):
+        result = CliRunner().invoke(
+            cli, ["pack", *args, "--output", str(output), json.dumps(context)]
+        )
+        assert result.exit_code == 0, result.output
+        return {
+            path.relative_to(output)
+            for path in (output / pack_name).rglob("*")
+        }
+
+    expected = pack(tmp_path / "expected", "--sync")
+
+    pack(tmp_path / "output")
+    assert pack(tmp_path / "output", "--sync") == expected
+
+    # Output of any other run is not described by the manifest anymore
+    pack(tmp_path / "output", "--force")
+    assert not (tmp_path / "output" / f".{pack_name}.manifest.json").exists()
+    assert pack(tmp_path / "output", "--sync") == expected
+
+
+def test_pack_sync_unchanged_context_writes_nothing(tmp_path):
+    context = pack_context_factory()
+    pack_dir = tmp_path / f"{context['challenge']['slug']}-challenge-pack"
+
+    def sync():
+        result = CliRunner().invoke(
+            cli,
+            ["pack", "--sync", "--output", str(tmp_path), json.dumps(context)],
+        )
+        assert result.exit_code == 0, result.output
+        return {
+            path: (path.stat().st_ino, path.stat().st_mtime_ns)
+            for path in pack_dir.rglob("*")
+        }
+
+    assert sync() == sync()
+
+
+def test_pack_force(tmp_path):
+    context = pack_context_factory()
+    pack_dir = tmp_path / f"{context['challenge']['slug']}-challenge-pack"
+
+    def force(context):
+        return CliRunner().invoke(
+            cli,
+            [
+                "pack",
+                "--force",
+                "--output",
+                str(tmp_path),
+                json.dumps(context),
+            ],
+        )
+
+    assert force(context).exit_code == 0
+    (pack_dir / "stale.txt").touch()
+
+    # Failed generations leave the existing pack in place
+    invalid_context = {"challenge": {"slug": context["challenge"]["slug"]}}
+    force(invalid_context)
+
+    assert (pack_dir / "stale.txt").exists()
+    assert (pack_dir / "README.md").exists()
+
+    assert force(context).exit_code == 0
+
+    assert not (pack_dir / "stale.txt").exists()
+    assert (pack_dir / "README.md").exists()
+    assert sorted(p.name for p in tmp_path.iterdir()) == [pack_dir.name]
+
+
+def test_pack_retry_after_failed_generation(tmp_path):
+    context = pack_context_factory()
+    pack_dir = tmp_path / f"{context['challenge']['slug']}-challenge-pack"
+
+    def pack():
+        return CliRunner().invoke(
+            cli, ["pack", "--output", str(tmp_path), json.dumps(context)]
+        )
+
+    with patch.object(
+        forge,
+        "generate_example_evaluation",
+        side_effect=ChallengeForgeError("Failed mid-generation"),
+    ):
+        result = pack()
+    assert "0 succeeded, 1 failed" in result.stderr
+
+    # Nothing is left behind that would block a retry
+    assert list(tmp_path.iterdir()) == []
+
+    result = pack()
+    assert result.exit_code == 0, result.output
+    assert (pack_dir / "README.md").exists()
+    assert sorted(p.name for p in tmp_path.iterdir()) == [pack_dir.name]
+
+
+def test_cli_import_does_not_load_heavy_dependencies():
+    result = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            "import sys, grand_challenge_forge.cli; "
+            "print(' '.join(sorted(sys.modules)))",
+        ],
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    loaded = set(result.stdout.split())
+
+    for module in ("black", "jinja2", "jsonschema"):
+        assert module not in loaded
+
+
+def test_cli_version_does_not_load_heavy_dependencies():
+    # Startup time is dominated by what is imported, timing it is too noisy
+    # to tell an import of the rendering stack apart
+    result = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            "import atexit, sys; "
+            "atexit.register("
+            "lambda: print(' '.join(sorted(sys.modules)), file=sys.stderr)"
+            "); "
+            "from grand_challenge_forge.cli import cli; cli()",
+            "--version",
+        ],
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    loaded = set(result.stderr.split())
+
+    assert get_forge_version() in result.stdout
+    assert "grand_challenge_forge.cli" in loaded
+    for module in ("black", "jinja2", "jsonschema"):
+        assert module not in loaded
+
+
+def test_pack_profile(tmp_path):
+    profile_json = tmp_path / "profile.json"
+    context = pack_context_factory()
+
+    result = CliRunner().invoke(
+        cli,
+        [
+            "pack",
+            "--output",
+            str(tmp_path / "dist"),
+            "--profile",
+            "--profile-json",
+            str(profile_json),
+            json.dumps(context),
+        ],
+    )
+
+    assert result.exit_code == 0, result.output
+    assert "⏱️ Profile of" in result.stderr
+
+    (report,) = json.loads(profile_json.read_text())
+    assert report["output"].endswith("-challenge-pack")
+    assert report["members"] > 0
+    assert "render" in report["stages"]
+
+
+def test_pack_number_of_jobs(tmp_path):
+    context = pack_context_factory()
+
+    result = CliRunner().invoke(
+        cli,
+        [
+            "pack",
+            "--number-of-jobs",
+            "7",
+            "--output",
+            str(tmp_path),
+            json.dumps(context),
+        ],
+    )
+
+    assert result.exit_code == 0, result.output
+    phase = context["challenge"]["phases"][0]
+    predictions = json.loads(
+        (
+            tmp_path
+            / f"{context['challenge']['slug']}-challenge-pack"
+            / phase["slug"]
+            / "example-evaluation-method"
+            / "test"
+            / "input"
+            / "predictions.json"
+        ).read_text()
+    )
+    assert len(predictions) == 7 * len(phase["algorithm_interfaces"])
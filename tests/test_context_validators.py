@@ -1,9 +1,15 @@
+import copy
+import pickle
 from contextlib import nullcontext
 
+import jsonschema
 import pytest
 
 from grand_challenge_forge.exceptions import InvalidContextError
 from grand_challenge_forge.schemas import (
+    SchemaValidator,
+    UnsupportedSchemaError,
+    compile_schema,
     validate_algorithm_template_context,
     validate_pack_context,
 )
@@ -57,3 +63,106 @@ def test_pack_context_validity(json_context, condition):
 def test_algorithm_template_context_validity(json_context, condition):
     with condition:
         validate_algorithm_template_context(json_context)
+
+
+def test_pack_context_all_errors():
+    context = pack_context_factory()
+    context["challenge"]["slug"] = 1
+    del context["challenge"]["phases"][0]["archive"]
+    context["challenge"]["phases"][1]["algorithm_interfaces"][0]["inputs"][0][
+        "kind"
+    ] = None
+
+    with pytest.raises(InvalidContextError) as e:
+        validate_pack_context(context)
+    assert len(e.value.errors) == 1
+
+    with pytest.raises(InvalidContextError) as e:
+        validate_pack_context(context, all_errors=True)
+    assert len(e.value.errors) == 3
+    assert "$.challenge.slug" in str(e.value)
+    assert "$.challenge.phases[0]" in str(e.value)
+    assert (
+        "$.challenge.phases[1].algorithm_interfaces[0].inputs[0].kind"
+        in str(e.value)
+    )
+
+
+def test_algorithm_template_context_all_errors():
+    context = algorithm_template_context_factory()
+    context["algorithm"]["title"] = None
+    context["algorithm"]["url"] = None
+
+    with pytest.raises(InvalidContextError) as e:
+        validate_algorithm_template_context(context, all_errors=True)
+    assert len(e.value.errors) == 2
+
+
+def test_invalid_context_error_pickles():
+    error = InvalidContextError("message", errors=["an error"])
+    for copied in (pickle.loads(pickle.dumps(error)), copy.copy(error)):
+        assert str(copied) == "message"
+        assert copied.errors == ["an error"]
+
+
+@pytest.mark.parametrize(
+    "instance",
+    [
+        {},
+        "",
+        [],
+        {"a": "b", "c": [{"d": "e"}]},
+        {"a": 1, "c": [{"d": "e"}]},
+        {"a": "b", "c": [{"d": 1}]},
+        {"a": "b", "c": [{}]},
+        {"a": "b", "c": {}},
+        {"a": "b", "c": [], "f": 1},
+        {"a": "b", "c": [], "f": 1.0},
+        {"a": "b", "c": [], "f": -1},
+        {"a": "b", "c": [], "f": True},
+        {"a": "b", "c": [], "f": "1"},
+        {"a": "b", "c": [], "g": "x"},
+        {"a": "b", "c": [], "g": "z"},
+        {"a": "b", "c": [], "g": 1},
+        {"a": "b", "c": [], "h": False},
+        {"a": "b", "c": [], "h": 0},
+        {"a": "b", "c": [], "i": []},
+        {"a": "b", "c": [], "i": [1, 2]},
+        {"a": "b", "c": [], "i": [1, 2, 3]},
+    ],
+)
+def test_compiled_schema_matches_jsonschema(instance):
+    schema = {
+        "type": "object",
+        "properties": {
+            "a": {"type": "string"},
+            "c": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {"d": {"type": "string"}},
+                    "required": ["d"],
+                },
+            },
+            "f": {"type": "integer", "minimum": 0},
+            "g": {"enum": ["x", "y"]},
+            "h": {"type": "boolean"},
+            "i": {"type": "array", "minItems": 1, "maxItems": 2},
+        },
+        "required": ["a", "c"],
+        "additionalProperties": True,
+    }
+
+    assert compile_schema(schema)(
+        instance
+    ) == jsonschema.validators.validator_for(schema)(schema).is_valid(instance)
+
+
+def test_compile_schema_unsupported():
+    with pytest.raises(UnsupportedSchemaError):
+        compile_schema({"type": "object", "additionalProperties": False})
+
+    # Sanity: falls back to jsonschema
+    validator = SchemaValidator({"type": "string", "maxLength": 1})
+    assert validator.is_valid("a")
+    assert not validator.is_valid("ab")
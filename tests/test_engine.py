@@ -0,0 +1,141 @@
+import os
+import re
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from copy import deepcopy
+from io import BytesIO
+from pathlib import Path
+
+from grand_challenge_forge.engine import Forge
+from grand_challenge_forge.forge import generate_challenge_pack
+from grand_challenge_forge.sinks import MemorySink
+from tests.utils import (
+    TEST_RESOURCES,
+    deterministic_uuids,
+    members_of,
+    pack_context_factory,
+)
+
+
+def test_forge_reuses_environment_and_templates():
+    forge = Forge()
+    source_path = TEST_RESOURCES / "partials" / "working"
+
+    env = forge.get_environment(source_path)
+    assert forge.get_environment(source_path) is env
+
+    template = forge.get_template(source_path=source_path, name="template.j2")
+    assert (
+        forge.get_template(source_path=source_path, name="template.j2")
+        is template
+    )
+
+
+def test_forge_template_cache_invalidates_on_mtime(tmp_path):
+    forge = Forge()
+    template_file = tmp_path / "template.j2"
+    template_file.write_text("first")
+
+    template = forge.get_template(source_path=tmp_path, name="template.j2")
+    assert template.render() == "first"
+
+    template_file.write_text("second")
+    stat = template_file.stat()
+    os.utime(template_file, (stat.st_atime, stat.st_mtime + 10))
+
+    template = forge.get_template(source_path=tmp_path, name="template.j2")
+    assert template.render() == "second"
+
+
+def test_forge_shared_across_threads():
+    forge = Forge()
+    context = pack_context_factory()
+
+    def generate(_):
+        with zipfile.ZipFile(BytesIO(), "w") as zip_file:
+            generate_challenge_pack(
+                output_zip_file=zip_file,
+                target_zpath=Path("pack"),
+                context=deepcopy(context),
+                engine=forge,
+            )
+            # Stub files and predictions are named with random UUIDs
+            return sorted(
+                re.sub(r"[0-9a-f]{8}-[0-9a-f-]{27}", "<uuid>", name)
+                for name in zip_file.namelist()
+            )
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        results = list(executor.map(generate, range(8)))
+
+    assert len(results[0]) > 0
+    assert all(result == results[0] for result in results)
+
+
+def _generate_pack_members(*, context, engine):
+    sink = MemorySink()
+    generate_challenge_pack(
+        output_zip_file=sink,
+        target_zpath=Path("pack"),
+        context=context,
+        engine=engine,
+    )
+    uuid_pattern = r"[0-9a-f]{8}-[0-9a-f-]{27}"
+    return {
+        re.sub(uuid_pattern, "<uuid>", zpath): re.sub(
+            uuid_pattern.encode(), b"<uuid>", content
+        )
+        for zpath, content in members_of(sink).items()
+    }
+
+
+def test_forge_render_cache_reuses_identical_phases():
+    context = pack_context_factory()
+    first, second = context["challenge"]["phases"]
+    second["algorithm_interfaces"] = deepcopy(first["algorithm_interfaces"])
+
+    forge = Forge()
+    members = _generate_pack_members(context=context, engine=forge)
+
+    assert forge.render_cache.hits > 0
+
+    # Only the templates that read the slug are rendered for both phases
+    algorithm_path = "pack/{}/example-algorithm/{}"
+    assert (
+        members[algorithm_path.format(first["slug"], "inference.py")]
+        == members[algorithm_path.format(second["slug"], "inference.py")]
+    )
+    assert (
+        first["slug"].encode()
+        in members[algorithm_path.format(first["slug"], "do_build.sh")]
+    )
+    assert (
+        second["slug"].encode()
+        in members[algorithm_path.format(second["slug"], "do_build.sh")]
+    )
+
+    assert members == _generate_pack_members(
+        context=context, engine=Forge(render_cache_size=0)
+    )
+
+
+def test_forge_render_cache_misses_on_changed_reads():
+    forge = Forge()
+    context = pack_context_factory()
+
+    def generate():
+        # The upload script reads the random names of the stub files
+        with deterministic_uuids():
+            _generate_pack_members(context=context, engine=forge)
+
+    generate()
+    misses = forge.render_cache.misses
+    generate()
+
+    assert forge.render_cache.misses == misses
+
+    interface = context["challenge"]["phases"][0]["algorithm_interfaces"][0]
+    interface["inputs"][0]["kind"] = "Anything"
+    generate()
+
+    assert forge.render_cache.misses > misses
@@ -1,3 +1,5 @@
+import json
+import os
 import zipfile
 from contextlib import nullcontext
 from io import BytesIO
@@ -8,10 +10,18 @@ import pytest
 from jinja2 import TemplateNotFound
 from jinja2.exceptions import SecurityError
 
+from grand_challenge_forge import PARTIALS_PATH
 from grand_challenge_forge.generation_utils import (
     copy_and_render,
+    generate_socket_value_stub_file,
     get_jinja2_environment,
+    get_partials_manifest,
+    load_resource,
+    memoizing_example_values,
+    serialize_example_value,
+    zipfile_to_filesystem,
 )
+from grand_challenge_forge.sinks import MemorySink
 from tests.utils import TEST_RESOURCES
 
 
@@ -75,3 +85,122 @@ def test_copy_and_render_source_restrictions(name, context):
                     target_zpath=Path(""),
                     context={},
                 )
+
+
+def test_zipfile_to_filesystem_preserves_permissions(tmp_path):
+    source_file = tmp_path / "source.sh"
+    source_file.write_text("#!/usr/bin/env bash\n")
+    source_file.chmod(0o755)
+
+    output_path = tmp_path / "output"
+    with zipfile_to_filesystem(output_path=output_path) as sink:
+        sink.add_file(source_file, "a/b/script.sh")
+        sink.add("a/rendered.sh", "#!/usr/bin/env bash\n", mode=0o750)
+        sink.add("/c/value.json", "{}")
+
+        # Sanity: files are written as they are added
+        sink.flush()
+        assert (output_path / "a" / "b" / "script.sh").exists()
+
+    def mode(path):
+        return (output_path / path).stat().st_mode & 0o777
+
+    assert mode("a/b/script.sh") == 0o755
+    assert mode("a/rendered.sh") == 0o750
+    assert (output_path / "c" / "value.json").read_text() == "{}"
+
+
+def test_zipfile_to_filesystem_cleans_up_on_error(tmp_path):
+    with pytest.raises(RuntimeError):
+        with zipfile_to_filesystem(output_path=tmp_path) as sink:
+            sink.add("a/value.json", "{}")
+            raise RuntimeError
+
+    assert not (tmp_path / "a" / "value.json").exists()
+
+
+def test_zipfile_to_filesystem_refuses_parent_paths(tmp_path):
+    with pytest.raises(PermissionError):
+        with zipfile_to_filesystem(output_path=tmp_path) as sink:
+            sink.add("../value.json", "{}")
+
+
+def test_socket_value_stub_file_resources_are_read_once():
+    load_resource.cache_clear()
+
+    socket = {
+        "slug": "a-slug",
+        "relative_path": "images/a-image",
+        "super_kind": "Image",
+        "example_value": None,
+    }
+
+    sink = MemorySink()
+    for _ in range(3):
+        generate_socket_value_stub_file(
+            output_zip_file=sink,
+            target_zpath=Path("input"),
+            socket=socket,
+        )
+
+    assert load_resource.cache_info().misses == 1
+    assert len(sink) == 3
+    assert len({content for _, content, _ in sink}) == 1
+
+
+def test_serialize_example_value():
+    value = {"key": ["value", 1, 1.0, True, None]}
+    expected = json.dumps(value, indent=4).encode("utf-8")
+
+    with patch(
+        "grand_challenge_forge.generation_utils.json.dumps", wraps=json.dumps
+    ) as dumps:
+        with memoizing_example_values():
+            assert serialize_example_value(value) == expected
+            assert serialize_example_value(value) == expected
+
+            # Sanity: values that are equal, but not the same, are not
+            # conflated
+            assert serialize_example_value({"key": 1}) != (
+                serialize_example_value({"key": 1.0})
+            )
+
+        assert dumps.call_count == 3
+
+        # Values are only memoized within a generation
+        value["key"] = "changed"
+        assert serialize_example_value(value) == b'{\n    "key": "changed"\n}'
+
+        with memoizing_example_values(max_size=0):
+            serialize_example_value(value)
+            serialize_example_value(value)
+
+        assert dumps.call_count == 6
+
+
+def test_partials_manifest_is_built_once():
+    get_partials_manifest.cache_clear()
+
+    with patch(
+        "grand_challenge_forge.generation_utils.os.walk", wraps=os.walk
+    ) as walk:
+        for _ in range(3):
+            copy_and_render(
+                templates_dir_name="pack-readme",
+                output_zip_file=MemorySink(),
+                target_zpath=Path(""),
+                context={
+                    "challenge": {"slug": "a-slug", "archives": [], "url": ""},
+                    "grand_challenge_forge_version": "0.0.0",
+                },
+            )
+
+    assert walk.call_count == 1
+
+    manifest = get_partials_manifest(
+        source_path=PARTIALS_PATH / "pack-readme", partials_path=PARTIALS_PATH
+    )
+    assert all(entry.allowed for entry in manifest)
+    assert {
+        str(entry.relative_path) for entry in manifest if entry.is_template
+    } == {"LICENSE.j2", "README.md.j2"}
@@ -0,0 +1,97 @@
+import math
+import zlib
+from pathlib import Path
+
+import pytest
+
+from grand_challenge_forge.forge import generate_challenge_pack
+from grand_challenge_forge.images import ImageStub, iter_mha_chunks
+from grand_challenge_forge.sinks import MemorySink
+from tests.utils import pack_context_factory
+
+
+def read_mha(content):
+    header, _, data = content.partition(b"ElementDataFile = LOCAL\n")
+    fields = dict(
+        line.split(" = ", 1) for line in header.decode("ascii").splitlines()
+    )
+    return fields, data
+
+
+@pytest.mark.parametrize(
+    "stub, element_type, itemsize",
+    (
+        (ImageStub(shape=(5, 4, 3)), "MET_SHORT", 2),
+        (ImageStub(shape=(5, 4), pixel_type="uint8"), "MET_UCHAR", 1),
+        (ImageStub(shape=(2, 3, 2, 2), pixel_type="float64"), "MET_DOUBLE", 8),
+    ),
+)
+def test_mha_stub(stub, element_type, itemsize):
+    fields, data = read_mha(b"".join(iter_mha_chunks(stub)))
+
+    assert fields["NDims"] == str(len(stub.shape))
+    assert fields["DimSize"] == " ".join(map(str, stub.shape))
+    assert fields["ElementType"] == element_type
+    assert fields["CompressedData"] == "False"
+    assert len(data) == itemsize * math.prod(stub.shape)
+
+
+def test_compressed_mha_stub():
+    stub = ImageStub(shape=(64, 32, 10), pixel_type="int16")
+
+    _, data = read_mha(b"".join(iter_mha_chunks(stub)))
+    fields, compressed = read_mha(
+        b"".join(iter_mha_chunks(stub._replace(compressed=True)))
+    )
+
+    assert fields["CompressedData"] == "True"
+    assert int(fields["CompressedDataSize"]) == len(compressed)
+    assert zlib.decompress(compressed) == data
+    assert len(compressed) < len(data)
+
+
+@pytest.mark.parametrize(
+    "value, expected",
+    (
+        ("512x512x300", ImageStub(shape=(512, 512, 300))),
+        (
+            "10x10:uint8:compressed",
+            ImageStub(shape=(10, 10), pixel_type="uint8", compressed=True),
+        ),
+    ),
+)
+def test_parse_image_stub(value, expected):
+    assert ImageStub.parse(value) == expected
+
+
+def test_image_stub_from_context():
+    stub = ImageStub.from_context({"shape": [4.0, 4], "compressed": True})
+
+    assert stub == ImageStub(shape=(4, 4), compressed=True)
+    assert all(isinstance(size, int) for size in stub.shape)
+    assert b"".join(iter_mha_chunks(stub))
+
+
+@pytest.mark.parametrize("value", ("10", "10x0", "10x10:int4", "axb"))
+def test_parse_invalid_image_stub(value):
+    with pytest.raises(ValueError):
+        ImageStub.parse(value)
+
+
+def test_pack_image_stubs():
+    context = pack_context_factory()
+    phase = context["challenge"]["phases"][0]
+    context["challenge"]["phases"] = [phase]
+    phase["image_stub"] = {"shape": [8, 8, 2], "pixel_type": "uint16"}
+
+    sink = MemorySink()
+    generate_challenge_pack(
+        output_zip_file=sink, target_zpath=Path("pack"), context=context
+    )
+
+    images = [content for zpath, content, _ in sink if zpath.suffix == ".mha"]
+    assert images
+    for content in images:
+        fields, data = read_mha(content)
+        assert fields["DimSize"] == "8 8 2"
+        assert len(data) == 8 * 8 * 2 * 2
@@ -1,6 +1,8 @@
 import glob
 import json
+import re
 import zipfile
+from copy import deepcopy
 from io import BytesIO
 from pathlib import Path
 from unittest.mock import MagicMock, patch
@@ -14,6 +16,7 @@ from grand_challenge_forge.forge import (
     generate_upload_to_archive_script,
 )
 from grand_challenge_forge.generation_utils import zipfile_to_filesystem
+from grand_challenge_forge.sinks import MemorySink
 from grand_challenge_forge.utils import (
     change_directory,
     directly_import_module,
@@ -22,6 +25,7 @@ from tests.utils import (
     _test_script_run,
     add_numerical_slugs,
     mocked_binaries,
+    members_of,
     pack_context_factory,
     phase_context_factory,
 )
@@ -56,6 +60,54 @@ def test_maximum_path_length():
             ), f"Path {file.filename} exceeds maximum characters"
 
 
+def test_parallel_pack_generation():
+    context = pack_context_factory()
+
+    def generate(**kwargs):
+        zip_handle = BytesIO()
+        with zipfile.ZipFile(zip_handle, "w") as zip_file:
+            generate_challenge_pack(
+                output_zip_file=zip_file,
+                target_zpath=Path("pack"),
+                context=context,
+                **kwargs,
+            )
+
+        # Stub files and predictions are named with random UUIDs
+        def normalize(value):
+            return re.sub(
+                rb"[0-9a-f]{8}-[0-9a-f-]{27}",
+                b"<uuid>",
+                value.encode() if isinstance(value, str) else value,
+            )
+
+        with zipfile.ZipFile(zip_handle) as zip_file:
+            return [
+                (
+                    normalize(zinfo.filename),
+                    zinfo.external_attr,
+                    zinfo.compress_type,
+                    normalize(zip_file.read(zinfo)),
+                )
+                for zinfo in zip_file.infolist()
+            ]
+
+    assert generate() == generate(max_workers=2)
+
+
+def test_pack_context_is_not_modified():
+    context = pack_context_factory()
+    expected_context = deepcopy(context)
+
+    generate_challenge_pack(
+        output_zip_file=MemorySink(),
+        target_zpath=Path("pack"),
+        context=context,
+    )
+
+    assert context == expected_context
+
+
 def test_for_pack_content(tmp_path, testrun_zpath):
     context = pack_context_factory()
 
@@ -320,3 +372,59 @@ def test_pack_example_evaluation_save(tmp_path, testrun_zpath):
         f"Example do_save.sh does not generate the exported "
         f"image matching: {pattern}"
     )
+
+
+@pytest.mark.parametrize(
+    "phase_counts, kwargs, expected_cases, expected_jobs",
+    (
+        ({}, {}, 3, 3),
+        ({"number_of_cases": 1, "number_of_jobs": 5}, {}, 1, 5),
+        ({"number_of_cases": 2.0, "number_of_jobs": 1.0}, {}, 2, 1),
+        (
+            {"number_of_cases": 1, "number_of_jobs": 5},
+            {"number_of_cases": 0, "number_of_jobs": 2},
+            0,
+            2,
+        ),
+    ),
+)
+def test_pack_number_of_cases_and_jobs(
+    phase_counts, kwargs, expected_cases, expected_jobs
+):
+    context = pack_context_factory()
+    phase = context["challenge"]["phases"][0]
+    phase.update(phase_counts)
+    context["challenge"]["phases"] = [phase]
+
+    sink = MemorySink()
+    generate_challenge_pack(
+        output_zip_file=sink,
+        target_zpath=Path("pack"),
+        context=context,
+        **kwargs,
+    )
+    members = members_of(sink)
+
+    input_zpath = "pack/{}/example-evaluation-method/test/input".format(
+        phase["slug"]
+    )
+    predictions = json.loads(members[f"{input_zpath}/predictions.json"])
+    number_of_interfaces = len(phase["algorithm_interfaces"])
+
+    assert len(predictions) == expected_jobs * number_of_interfaces
+    for prediction in predictions:
+        for output in prediction["outputs"]:
+            relative_path = output["interface"]["relative_path"]
+            assert any(
+                zpath.startswith(
+                    f"{input_zpath}/{prediction['pk']}/output/{relative_path}"
+                )
+                for zpath in members
+            )
+
+    cases = {
+        re.search(r"/(interf\d+/case\d+)/", zpath).group(1)
+        for zpath in members
+        if "/upload-to-archive/interf" in zpath
+    }
+    assert len(cases) == expected_cases * number_of_interfaces
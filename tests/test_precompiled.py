@@ -0,0 +1,139 @@
+import json
+import shutil
+from unittest.mock import patch
+
+import pytest
+from jinja2 import Environment
+
+from grand_challenge_forge import PARTIALS_PATH, precompiled
+from grand_challenge_forge.engine import Forge
+from grand_challenge_forge.generation_utils import get_jinja2_environment
+from grand_challenge_forge.precompiled import (
+    MANIFEST_NAME,
+    PrecompiledLoader,
+    compile_partials,
+    get_precompiled_loader,
+    jinja2_compatibility,
+)
+from grand_challenge_forge.template_analysis import find_context_reads
+from tests.utils import algorithm_template_context_factory
+
+SOURCE_PATH = PARTIALS_PATH / "algorithm-template-readme"
+
+JINJA2_MAJOR, JINJA2_MINOR = jinja2_compatibility()["version"]
+
+
+@pytest.fixture(scope="module")
+def compiled_path(tmp_path_factory):
+    return compile_partials(tmp_path_factory.mktemp("compiled"))
+
+
+@pytest.fixture
+def use_compiled(compiled_path, monkeypatch):
+    monkeypatch.setattr(precompiled, "COMPILED_PARTIALS_PATH", compiled_path)
+
+
+def readme_context():
+    return {
+        **algorithm_template_context_factory(),
+        "grand_challenge_forge_version": "1.0",
+    }
+
+
+def test_compile_partials(compiled_path):
+    manifest = json.loads((compiled_path / MANIFEST_NAME).read_text())
+
+    assert "README.md.j2" in manifest["environments"][SOURCE_PATH.name]
+    assert all(
+        name.endswith(".j2")
+        for templates in manifest["environments"].values()
+        for name in templates
+    )
+
+
+def test_precompiled_templates_are_not_compiled_again(use_compiled):
+    env = get_jinja2_environment(searchpath=SOURCE_PATH, precompiled=False)
+    source, _, _ = env.loader.get_source(env, "README.md.j2")
+    expected = env.get_template("README.md.j2").render(**readme_context())
+    expected_reads = find_context_reads(env.parse(source))
+
+    forge = Forge()
+    with (
+        patch.object(Environment, "_parse") as parse,
+        patch.object(Environment, "_compile") as compile,
+    ):
+        template = forge.get_template(SOURCE_PATH, "README.md.j2")
+        rendered = template.render(**readme_context())
+        _, reads = forge.get_template_reads(template)
+
+    assert isinstance(template.environment.loader, PrecompiledLoader)
+    assert parse.call_count == 0
+    assert compile.call_count == 0
+    assert rendered == expected
+    assert reads == expected_reads
+
+
+def test_stale_precompiled_templates_are_compiled_from_source(
+    compiled_path,
+):
+    manifest = json.loads((compiled_path / MANIFEST_NAME).read_text())
+    templates = manifest["environments"][SOURCE_PATH.name]
+    templates["README.md.j2"]["digest"] = "stale"
+
+    loader = PrecompiledLoader(
+        searchpath=[SOURCE_PATH, PARTIALS_PATH],
+        compiled_path=compiled_path / SOURCE_PATH.name,
+        templates=templates,
+    )
+    env = get_jinja2_environment(searchpath=SOURCE_PATH, precompiled=False)
+    env.loader = loader
+
+    with patch.object(Environment, "_compile", wraps=env._compile) as compile:
+        env.get_template("README.md.j2")
+
+    assert compile.call_count == 1
+    assert loader.get_context_reads(env, "README.md.j2") is None
+
+
+@pytest.mark.parametrize(
+    "jinja2_version, compatibility, usable",
+    (
+        # Compatibility does not depend on the patch version
+        ("0.0.1", {}, True),
+        ("0.0.1", {"version": [0, 0]}, False),
+        ("0.0.1", {"version": [JINJA2_MAJOR, JINJA2_MINOR + 1]}, False),
+        ("0.0.1", {"runtime": ["a_removed_runtime_name"]}, False),
+    ),
+)
+def test_precompiled_templates_of_incompatible_jinja2_versions_are_ignored(
+    compiled_path, tmp_path, caplog, jinja2_version, compatibility, usable
+):
+    manifest = json.loads((compiled_path / MANIFEST_NAME).read_text())
+    manifest["jinja2"] = jinja2_version
+    manifest["compatibility"].update(compatibility)
+    (tmp_path / MANIFEST_NAME).write_text(json.dumps(manifest))
+
+    loader = get_precompiled_loader(SOURCE_PATH, compiled_path=tmp_path)
+
+    assert bool(loader) is usable
+    assert ("Ignoring templates precompiled" in caplog.text) is not usable
+
+
+def test_precompiled_modules_that_cannot_be_imported_are_compiled(
+    compiled_path, tmp_path, caplog
+):
+    shutil.copytree(compiled_path, tmp_path, dirs_exist_ok=True)
+    for module in (tmp_path / SOURCE_PATH.name).glob("*.py"):
+        module.write_text("from jinja2.runtime import a_removed_runtime_name")
+
+    env = get_jinja2_environment(searchpath=SOURCE_PATH, precompiled=False)
+    env.loader = get_precompiled_loader(SOURCE_PATH, compiled_path=tmp_path)
+    template = env.get_template("README.md.j2")
+
+    assert template.render(**readme_context())
+    assert "cannot be loaded" in caplog.text
+
+
+def test_only_package_partials_are_precompiled(compiled_path, tmp_path):
+    assert not get_precompiled_loader(tmp_path, compiled_path=compiled_path)
+    assert not get_precompiled_loader(None, compiled_path=compiled_path)
@@ -0,0 +1,101 @@
+import zipfile
+from io import BytesIO
+from pathlib import Path
+
+import pytest
+
+from grand_challenge_forge.forge import (
+    generate_algorithm_template,
+    generate_challenge_pack,
+)
+from grand_challenge_forge.profiling import Profile, profiling, stage
+from tests.utils import (
+    algorithm_template_context_factory,
+    pack_context_factory,
+)
+
+
+def test_stage_without_profile_is_a_no_op():
+    with stage("validate"):
+        pass
+
+    profile = Profile()
+    with profiling(profile):
+        with stage("validate"):
+            pass
+
+    assert profile.stages["validate"].calls == 1
+
+
+@pytest.mark.parametrize("max_workers", (None, 2))
+def test_pack_profile(max_workers):
+    with zipfile.ZipFile(BytesIO(), "w") as zip_file:
+        profile = generate_challenge_pack(
+            output_zip_file=zip_file,
+            target_zpath=Path("pack"),
+            context=pack_context_factory(),
+            max_workers=max_workers,
+            profile=True,
+        )
+        infos = zip_file.infolist()
+
+    assert set(profile.stages) == {
+        "generate",
+        "validate",
+        "render",
+        "format",
+        "stubs",
+        "write",
+    }
+    assert profile.stages["generate"].wall > 0
+
+    assert profile.members == len(infos)
+    assert profile.bytes == sum(info.file_size for info in infos)
+
+    assert profile.templates["pack-readme/README.md.j2"].calls == 1
+    # One per phase
+    assert profile.templates["example-algorithm/inference.py.j2"].calls == 2
+
+    report = profile.as_dict()
+    assert report["caches"]["format (memory)"]["misses"] > 0
+
+
+def test_algorithm_template_profile_callback():
+    reports = []
+
+    with zipfile.ZipFile(BytesIO(), "w") as zip_file:
+        result = generate_algorithm_template(
+            output_zip_file=zip_file,
+            target_zpath=Path("template"),
+            context=algorithm_template_context_factory(),
+            on_profile=reports.append,
+        )
+
+    assert reports == [result]
+    assert result.templates["algorithm-template-readme/README.md.j2"].calls
+
+
+def test_no_profile_by_default():
+    with zipfile.ZipFile(BytesIO(), "w") as zip_file:
+        result = generate_challenge_pack(
+            output_zip_file=zip_file,
+            target_zpath=Path("pack"),
+            context=pack_context_factory(),
+        )
+
+    assert result is None
+
+
+def test_profile_is_added_to():
+    profile = Profile()
+
+    for _ in range(2):
+        with zipfile.ZipFile(BytesIO(), "w") as zip_file:
+            generate_challenge_pack(
+                output_zip_file=zip_file,
+                target_zpath=Path("pack"),
+                context=pack_context_factory(),
+                profile=profile,
+            )
+
+    assert profile.stages["generate"].calls == 2
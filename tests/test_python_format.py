@@ -0,0 +1,257 @@
+import json
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+from click.testing import CliRunner
+
+from grand_challenge_forge import generation_utils
+from grand_challenge_forge.cli import cli
+from grand_challenge_forge.exceptions import QualityFailureError
+from grand_challenge_forge.forge import (
+    generate_algorithm_template,
+    generate_challenge_pack,
+)
+from grand_challenge_forge.generation_utils import (
+    apply_black,
+    formatting,
+    get_python_format,
+)
+from grand_challenge_forge.partials.filters import (
+    python_assignment,
+    python_literal,
+)
+from grand_challenge_forge.sinks import MemorySink
+from tests.utils import (
+    add_numerical_slugs,
+    algorithm_template_context_factory,
+    members_of,
+    pack_context_factory,
+    phase_context_factory,
+)
+
+EXAMPLE_VALUES = (
+    None,
+    True,
+    -3,
+    12345678901234567890,
+    1e100,
+    1e-7,
+    'it\'s a "quoted" string',
+    "a\nmultiline\\string",
+    "x" * 200,
+    [],
+    {},
+    {"key": "value"},
+    list(range(20)),
+    list(range(60)),
+    {"nested": [[1, 2], [3.5, None]], "key": "v" * 100},
+)
+
+
+def pack_context(**phase):
+    context = pack_context_factory()
+    context["challenge"]["phases"] = [phase_context_factory(**phase)["phase"]]
+    return context
+
+
+def with_example_values(context, value):
+    phases = context.get("challenge", {}).get("phases", [])
+    interfaces = [
+        interface
+        for phase in [*phases, context.get("algorithm", {})]
+        for interface in phase.get("algorithm_interfaces", [])
+    ]
+    sockets = [
+        socket
+        for phase in phases
+        for socket in (
+            phase["evaluation_additional_inputs"]
+            + phase["evaluation_additional_outputs"]
+        )
+    ] + [
+        socket
+        for interface in interfaces
+        for socket in interface["inputs"] + interface["outputs"]
+    ]
+    for socket in sockets:
+        if socket["relative_path"].endswith(".json"):
+            socket["example_value"] = value
+    return context
+
+
+def python_members(generate, context):
+    sink = MemorySink()
+    generate(
+        output_zip_file=sink,
+        target_zpath=Path("output"),
+        context=context,
+        python_format="never",
+    )
+    return {
+        str(zpath): content.decode()
+        for zpath, content, _ in sink
+        if zpath.suffix == ".py"
+    }
+
+
+@pytest.mark.parametrize(
+    "generate, context",
+    (
+        (generate_challenge_pack, pack_context_factory()),
+        (generate_challenge_pack, add_numerical_slugs(pack_context_factory())),
+        (
+            generate_challenge_pack,
+            pack_context(
+                evaluation_additional_inputs=[],
+                evaluation_additional_outputs=[],
+            ),
+        ),
+        (
+            generate_challenge_pack,
+            pack_context(
+                algorithm_interfaces=[],
+                evaluation_additional_inputs=[],
+                evaluation_additional_outputs=[],
+            ),
+        ),
+        *(
+            (generate_challenge_pack, with_example_values(pack_context(), v))
+            for v in EXAMPLE_VALUES
+        ),
+        (generate_algorithm_template, algorithm_template_context_factory()),
+        *(
+            (
+                generate_algorithm_template,
+                with_example_values(algorithm_template_context_factory(), v),
+            )
+            for v in EXAMPLE_VALUES
+        ),
+    ),
+)
+def test_rendered_python_is_black_stable(generate, context):
+    members = python_members(generate, context)
+
+    assert members
+    for name, content in members.items():
+        assert apply_black(content) == content, name
+
+
+@pytest.mark.parametrize("python_format", ("never", "verify", "always"))
+def test_python_formats_render_identical_output(python_format):
+    context = pack_context_factory()
+
+    def render(python_format):
+        sink = MemorySink()
+        generate_challenge_pack(
+            output_zip_file=sink,
+            target_zpath=Path("pack"),
+            context=context,
+            reproducible=True,
+            python_format=python_format,
+        )
+        return members_of(sink)
+
+    assert render(python_format) == render("always")
+
+
+def test_python_format_never_skips_black():
+    with patch.object(generation_utils, "apply_black") as apply:
+        generate_algorithm_template(
+            output_zip_file=MemorySink(),
+            target_zpath=Path("template"),
+            context=algorithm_template_context_factory(),
+            python_format="never",
+        )
+
+    assert apply.call_count == 0
+
+
+def test_python_format_verify_raises_on_unformatted_code():
+    def reformat(content, **_):
+        return content + "\n"
+
+    with (
+        patch.object(generation_utils, "apply_black", side_effect=reformat),
+        pytest.raises(QualityFailureError, match="inference.py"),
+    ):
+        generate_algorithm_template(
+            output_zip_file=MemorySink(),
+            target_zpath=Path("template"),
+            context=algorithm_template_context_factory(),
+            python_format="verify",
+        )
+
+
+def test_formatting():
+    assert get_python_format() == "always"
+
+    with formatting("never"):
+        assert get_python_format() == "never"
+        with formatting(None):
+            assert get_python_format() == "never"
+
+    assert get_python_format() == "always"
+
+    with pytest.raises(ValueError), formatting("sometimes"):
+        pass
+
+
+@pytest.mark.parametrize(
+    "value, expected",
+    (
+        ("it's", '"it\'s"'),
+        ('"quoted"', "'\"quoted\"'"),
+        (1e100, "1e100"),
+        (("a",), '("a",)'),
+        ([], "[]"),
+        ({"a": [1]}, '{"a": [1]}'),
+        ((1, "b"), '(1, "b")'),
+        (
+            {"a": [1], "b": ["x" * 80]},
+            '{\n    "a": [1],\n    "b": [\n        "'
+            + "x" * 80
+            + '",\n    ],\n}',
+        ),
+    ),
+)
+def test_python_literal(value, expected):
+    assert python_literal(value) == expected
+
+
+def test_python_assignment():
+    fits = "x" * 70
+    too_long = "x" * 90
+
+    assert python_assignment("short", "name") == 'name = "short"'
+    assert python_assignment(fits, "a_long_name") == (
+        'a_long_name = (\n        "' + fits + '"\n    )'
+    )
+    assert python_assignment(too_long, "name") == 'name = "' + too_long + '"'
+
+    # Containers stay on one line if they fit, and are split otherwise
+    assert python_assignment({"key": "value"}, "name") == (
+        'name = {"key": "value"}'
+    )
+    assert python_assignment(list(range(30)), "name", indent=4) == (
+        "name = [\n" + "".join(f"        {i},\n" for i in range(30)) + "    ]"
+    )
+
+
+def test_cli_format(tmp_path):
+    with patch.object(generation_utils, "apply_black") as apply:
+        result = CliRunner().invoke(
+            cli,
+            [
+                "algorithm",
+                "--format",
+                "never",
+                "--output",
+                str(tmp_path),
+                json.dumps(algorithm_template_context_factory()),
+            ],
+        )
+
+    assert result.exit_code == 0, result.output
+    assert apply.call_count == 0
+    assert list(tmp_path.rglob("inference.py"))
@@ -0,0 +1,127 @@
+import json
+import zipfile
+from io import BytesIO
+from pathlib import Path
+
+import pytest
+from click.testing import CliRunner
+
+from grand_challenge_forge.cli import cli
+from grand_challenge_forge.forge import (
+    generate_algorithm_template,
+    generate_challenge_pack,
+)
+from grand_challenge_forge.reproducibility import (
+    ZIP_EPOCH,
+    Reproducible,
+    new_uuid,
+    now,
+    reproducible,
+)
+from tests.utils import (
+    algorithm_template_context_factory,
+    pack_context_factory,
+    zip_bytes,
+)
+
+
+@pytest.mark.parametrize(
+    "generate, context_factory",
+    (
+        (generate_challenge_pack, pack_context_factory),
+        (generate_algorithm_template, algorithm_template_context_factory),
+    ),
+)
+def test_reproducible_output_is_identical(generate, context_factory):
+    context = context_factory()
+    settings = Reproducible(seed=42, timestamp=1700000000)
+
+    outputs = [
+        zip_bytes(
+            generate,
+            context=context,
+            target_zpath=Path("output"),
+            reproducible=settings,
+        )
+        for _ in range(2)
+    ]
+
+    assert outputs[0] == outputs[1]
+
+    with zipfile.ZipFile(BytesIO(outputs[0])) as zip_file:
+        infos = zip_file.infolist()
+        assert {info.date_time for info in infos} == {
+            (2023, 11, 14, 22, 13, 20)
+        }
+
+    if generate is generate_challenge_pack:
+        # Seeds name the predictions and image stubs
+        assert outputs[0] != zip_bytes(
+            generate,
+            context=context,
+            target_zpath=Path("output"),
+            reproducible=settings._replace(seed=43),
+        )
+
+
+def test_reproducible_parallel_phases_match_serial():
+    context = pack_context_factory()
+    settings = Reproducible(seed=1)
+
+    serial, parallel = (
+        zip_bytes(
+            generate_challenge_pack,
+            context=context,
+            target_zpath=Path("pack"),
+            reproducible=settings,
+            max_workers=max_workers,
+        )
+        for max_workers in (None, 2)
+    )
+
+    assert serial == parallel
+
+
+def test_reproducible_settings(monkeypatch):
+    settings = Reproducible(seed=7, timestamp=0)
+
+    with reproducible(settings):
+        assert now().year == 1970
+        assert new_uuid("a", 1) == new_uuid("a", 1) != new_uuid("a", 2)
+        assert new_uuid("a", 1).version == 4
+
+    assert new_uuid("a", 1) != new_uuid("a", 1)
+    assert settings.zip_date_time() == (1980, 1, 1, 0, 0, 0)
+
+    monkeypatch.setenv("SOURCE_DATE_EPOCH", "1700000000")
+    assert Reproducible.from_environment(seed=3) == Reproducible(
+        seed=3, timestamp=1700000000
+    )
+    monkeypatch.delenv("SOURCE_DATE_EPOCH")
+    assert Reproducible.from_environment().timestamp == ZIP_EPOCH
+
+
+def test_cli_reproducible(tmp_path):
+    context = pack_context_factory()
+
+    def forge(output):
+        result = CliRunner().invoke(
+            cli,
+            [
+                "pack",
+                "--seed",
+                "5",
+                "--output",
+                str(output),
+                json.dumps(context),
+            ],
+            env={"SOURCE_DATE_EPOCH": "1700000000"},
+        )
+        assert result.exit_code == 0, result.output
+        return {
+            path.relative_to(output): path.read_bytes()
+            for path in output.rglob("*")
+            if path.is_file()
+        }
+
+    assert forge(tmp_path / "a") == forge(tmp_path / "b")
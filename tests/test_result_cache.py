@@ -0,0 +1,206 @@
+import json
+import shutil
+import subprocess
+import sys
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+from grand_challenge_forge import PARTIALS_PATH, result_cache
+from grand_challenge_forge.exceptions import InvalidContextError
+from grand_challenge_forge.forge import generate_challenge_pack
+from grand_challenge_forge.reproducibility import Reproducible
+from grand_challenge_forge.result_cache import (
+    ResultCache,
+    get_partials_digest,
+)
+from grand_challenge_forge.sinks import DirectorySink, MemorySink
+from tests.utils import (
+    algorithm_template_context_factory,
+    pack_context_factory,
+)
+
+
+@pytest.mark.parametrize(
+    "method, context_factory",
+    (
+        ("generate_challenge_pack", pack_context_factory),
+        ("generate_algorithm_template", algorithm_template_context_factory),
+    ),
+)
+def test_result_cache_replays_members(tmp_path, method, context_factory):
+    cache = ResultCache(tmp_path / "cache")
+    context = context_factory()
+
+    outputs = []
+    for _ in range(2):
+        sink = MemorySink()
+        getattr(cache, method)(
+            output_zip_file=sink, target_zpath=Path("output"), context=context
+        )
+        outputs.append(list(sink))
+
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert outputs[0] == outputs[1]
+    # Sanity: modes that were left to the sink are replayed as such
+    assert None in {mode for _, _, mode in outputs[0]}
+
+
+def test_result_cache_hit_does_not_render(tmp_path):
+    cache = ResultCache(tmp_path / "cache")
+    context = pack_context_factory()
+    kwargs = {"target_zpath": Path("pack"), "context": context}
+
+    cache.generate_challenge_pack(output_zip_file=MemorySink(), **kwargs)
+
+    with (
+        patch("grand_challenge_forge.forge.validate_pack_context") as validate,
+        patch("grand_challenge_forge.forge.copy_and_render") as render,
+    ):
+        with DirectorySink(tmp_path / "output") as sink:
+            profile = cache.generate_challenge_pack(
+                output_zip_file=sink, profile=True, **kwargs
+            )
+
+    validate.assert_not_called()
+    render.assert_not_called()
+    assert (tmp_path / "output" / "pack" / "README.md").exists()
+    assert profile.members == len(
+        [path for path in (tmp_path / "output").rglob("*") if path.is_file()]
+    )
+
+
+def test_result_cache_keys(tmp_path):
+    cache = ResultCache(tmp_path)
+    context = pack_context_factory()
+
+    def key(**kwargs):
+        return cache.key(
+            "pack",
+            context=kwargs.pop("context", context),
+            target_zpath=Path("pack"),
+            **kwargs,
+        )
+
+    reordered = json.loads(json.dumps(context))
+    reordered["challenge"] = dict(reversed(reordered["challenge"].items()))
+
+    assert key() == key(context=reordered)
+    assert key() == key(max_workers=4, profile=True)
+    assert key() != key(number_of_jobs=5)
+    assert key(reproducible=Reproducible(seed=1)) != key(
+        reproducible=Reproducible(seed=2)
+    )
+    assert key() != cache.key(
+        "algorithm", context=context, target_zpath=Path("pack")
+    )
+
+
+def test_result_cache_eviction(tmp_path):
+    contexts = [pack_context_factory() for _ in range(3)]
+
+    def generate(cache, context):
+        cache.generate_challenge_pack(
+            output_zip_file=MemorySink(),
+            target_zpath=Path("pack"),
+            context=context,
+        )
+
+    generate(ResultCache(tmp_path / "small", max_size=1), contexts[0])
+    # Archives larger than the cache are not kept
+    assert list((tmp_path / "small").rglob("*.*")) == []
+
+    cache = ResultCache(tmp_path / "cache")
+    generate(cache, contexts[0])
+    (archive,) = (tmp_path / "cache").rglob("*.cache")
+
+    cache.disk.max_size = int(archive.stat().st_size * 2.5)
+    for context in contexts:
+        generate(cache, context)
+
+    assert len(list((tmp_path / "cache").rglob("*.cache"))) == 2
+    assert (cache.hits, cache.misses) == (1, 3)
+
+
+def test_result_cache_failure_is_not_cached(tmp_path):
+    cache = ResultCache(tmp_path / "cache")
+
+    with pytest.raises(InvalidContextError):
+        cache.generate_challenge_pack(
+            output_zip_file=MemorySink(),
+            target_zpath=Path("pack"),
+            context={"challenge": {}},
+        )
+
+    assert list((tmp_path / "cache").rglob("*")) == []
+
+
+def test_result_cache_hit_does_not_import_renderers(tmp_path):
+    context = pack_context_factory()
+    ResultCache(tmp_path / "cache").generate_challenge_pack(
+        output_zip_file=MemorySink(),
+        target_zpath=Path("pack"),
+        context=context,
+    )
+
+    code = f"""
+import json, sys
+from pathlib import Path
+from grand_challenge_forge.result_cache import ResultCache
+from grand_challenge_forge.sinks import MemorySink
+
+cache = ResultCache({str(tmp_path / "cache")!r})
+cache.generate_challenge_pack(
+    output_zip_file=MemorySink(),
+    target_zpath=Path("pack"),
+    context=json.loads({json.dumps(context)!r}),
+)
+assert cache.hits == 1
+print(sorted({{"jinja2", "black"}} & set(sys.modules)))
+"""
+    result = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, check=True
+    )
+
+    assert result.stdout.decode().strip() == "[]"
+
+
+def test_generated_output_matches_uncached(tmp_path):
+    settings = Reproducible(seed=3)
+    context = pack_context_factory()
+    kwargs = {
+        "target_zpath": Path("pack"),
+        "context": context,
+        "reproducible": settings,
+    }
+
+    expected = MemorySink()
+    generate_challenge_pack(output_zip_file=expected, **kwargs)
+
+    sink = MemorySink()
+    ResultCache(tmp_path).generate_challenge_pack(
+        output_zip_file=sink, **kwargs
+    )
+
+    assert list(sink) == list(expected)
+
+
+def test_partials_digest_ignores_bytecode(tmp_path, monkeypatch):
+    partials = tmp_path / "partials"
+    shutil.copytree(
+        PARTIALS_PATH,
+        partials,
+        ignore=shutil.ignore_patterns("__pycache__"),
+    )
+    monkeypatch.setattr(result_cache, "PARTIALS_PATH", partials)
+    digest = get_partials_digest.__wrapped__()
+
+    (partials / "__pycache__").mkdir()
+    (partials / "__pycache__" / "filters.cpython-311.pyc").write_bytes(b"")
+
+    assert get_partials_digest.__wrapped__() == digest
+
+    (partials / "filters.py").write_text("")
+
+    assert get_partials_digest.__wrapped__() != digest
@@ -0,0 +1,273 @@
+import base64
+import http.client
+import json
+import threading
+import zipfile
+from contextlib import contextmanager
+from io import BytesIO, StringIO
+from unittest.mock import patch
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+
+import pytest
+from click.testing import CliRunner
+
+from grand_challenge_forge import schemas
+from grand_challenge_forge.cli import cli
+from grand_challenge_forge.exceptions import ServiceBusyError
+from grand_challenge_forge.result_cache import ResultCache
+from grand_challenge_forge.server import (
+    RENDERERS,
+    ForgeService,
+    make_http_server,
+    serve_stdio,
+)
+from tests.utils import (
+    algorithm_template_context_factory,
+    pack_context_factory,
+)
+
+
+@contextmanager
+def running_server(service):
+    server = make_http_server(service, host="127.0.0.1", port=0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def post(url, data):
+    request = Request(
+        url,
+        data=data,
+        headers={"Content-Type": "application/json"},
+        method="POST",
+    )
+    with urlopen(request, timeout=30) as response:
+        return response.headers, response.read()
+
+
+def post_error(url, data):
+    with pytest.raises(HTTPError) as exc_info:
+        post(url, data)
+    return exc_info.value.code, json.loads(exc_info.value.read())
+
+
+@pytest.mark.parametrize("workers", (0, 1))
+def test_http_pack(workers):
+    context = pack_context_factory()
+    slug = context["challenge"]["slug"]
+
+    with ForgeService(workers=workers) as service:
+        with running_server(service) as url:
+            with urlopen(f"{url}/health", timeout=30) as response:
+                assert json.loads(response.read()) == {"status": "ok"}
+
+            for _ in range(2):  # Sanity: the service is reused
+                headers, content = post(
+                    f"{url}/pack", json.dumps(context).encode()
+                )
+
+    assert headers["Content-Type"] == "application/zip"
+    assert f"{slug}-challenge-pack.zip" in headers["Content-Disposition"]
+
+    with zipfile.ZipFile(BytesIO(content)) as zip_file:
+        assert f"{slug}-challenge-pack/README.md" in zip_file.namelist()
+
+
+def test_http_algorithm():
+    context = algorithm_template_context_factory()
+
+    with ForgeService() as service, running_server(service) as url:
+        _, content = post(f"{url}/algorithm", json.dumps(context).encode())
+
+    with zipfile.ZipFile(BytesIO(content)) as zip_file:
+        assert (
+            f"{context['algorithm']['slug']}-template/README.md"
+            in zip_file.namelist()
+        )
+
+
+def test_http_compression():
+    context = algorithm_template_context_factory()
+
+    with (
+        ForgeService(compression=zipfile.ZIP_STORED) as service,
+        running_server(service) as url,
+    ):
+        _, content = post(f"{url}/algorithm", json.dumps(context).encode())
+
+    with zipfile.ZipFile(BytesIO(content)) as zip_file:
+        assert {i.compress_type for i in zip_file.infolist()} == {
+            zipfile.ZIP_STORED
+        }
+
+
+def test_service_result_cache(tmp_path):
+    context = pack_context_factory()
+    cache = ResultCache(tmp_path)
+
+    with ForgeService(result_cache=cache) as service:
+        first = service.render("pack", context)
+        with patch.dict(RENDERERS, {"pack": None}):
+            second = service.render("pack", context)
+
+    assert first == second
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_http_errors():
+    with ForgeService() as service, running_server(service) as url:
+        status, response = post_error(f"{url}/pack", b"{ not json")
+        assert status == 400
+        assert response["error"].startswith("Invalid JSON")
+
+        status, response = post_error(f"{url}/pack", b'{"challenge": {}}')
+        assert status == 400
+        assert {e["path"] for e in response["errors"]} == {"$.challenge"}
+
+        status, _ = post_error(f"{url}/unknown", b"{}")
+        assert status == 404
+
+
+def test_http_content_disposition_of_unsafe_slugs():
+    filename = 'a "slug"\r\nX-Injected: 1-challenge-pack.zip'
+
+    def render(context, **_):
+        return filename, b"zip"
+
+    with (
+        patch.dict(RENDERERS, {"pack": render}),
+        ForgeService() as service,
+        running_server(service) as url,
+    ):
+        headers, content = post(
+            f"{url}/pack", json.dumps(pack_context_factory()).encode()
+        )
+
+    assert content == b"zip"
+    assert "X-Injected" not in headers
+    assert headers["Content-Disposition"] == (
+        "attachment; filename=a__slug___X-Injected__1-challenge-pack.zip; "
+        "filename*=UTF-8''a%20%22slug%22%0D%0AX-Injected%3A%201-challenge-pack"
+        ".zip"
+    )
+
+
+@pytest.mark.parametrize("content_length", ("not a number", "-1"))
+def test_http_invalid_content_length(content_length):
+    with ForgeService() as service, running_server(service) as url:
+        connection = http.client.HTTPConnection(
+            url.removeprefix("http://"), timeout=30
+        )
+        try:
+            connection.putrequest("POST", "/pack")
+            connection.putheader("Content-Length", content_length)
+            connection.endheaders()
+            response = connection.getresponse()
+            status, content = response.status, json.loads(response.read())
+        finally:
+            connection.close()
+
+    assert status == 400
+    assert content == {"error": "Invalid Content-Length"}
+
+
+def test_http_busy():
+    started, release = threading.Event(), threading.Event()
+    context = pack_context_factory()
+    data = json.dumps(context).encode("utf-8")
+
+    def slow_render(context, **_):
+        started.set()
+        release.wait(timeout=30)
+        return "slow.zip", b""
+
+    with (
+        patch.dict(RENDERERS, {"pack": slow_render}),
+        ForgeService(max_concurrency=1) as service,
+        running_server(service) as url,
+    ):
+        thread = threading.Thread(target=post, args=(f"{url}/pack", data))
+        thread.start()
+        started.wait(timeout=30)
+
+        try:
+            status, _ = post_error(f"{url}/pack", data)
+            assert status == 503
+
+            with pytest.raises(ServiceBusyError):
+                service.render("pack", context)
+        finally:
+            release.set()
+            thread.join()
+
+
+def test_stdio():
+    context = pack_context_factory()
+    requests = [
+        {"id": 1, "kind": "pack", "context": context},
+        {"id": 2, "kind": "pack", "context": {"challenge": {}}},
+        {"id": 3, "kind": "unknown", "context": {}},
+    ]
+    stdin = StringIO(
+        "\n".join(json.dumps(r) for r in requests) + "\n\n{ not json\n"
+    )
+    stdout = StringIO()
+
+    with ForgeService() as service:
+        serve_stdio(service, stdin=stdin, stdout=stdout)
+
+    responses = {
+        response["id"]: response
+        for response in map(json.loads, stdout.getvalue().splitlines())
+    }
+
+    assert set(responses) == {1, 2, 3, None}
+    assert responses[1]["filename"] == (
+        f"{context['challenge']['slug']}-challenge-pack.zip"
+    )
+    with zipfile.ZipFile(BytesIO(base64.b64decode(responses[1]["zip"]))):
+        pass
+    assert responses[2]["errors"]
+    assert "Unknown kind" in responses[3]["error"]
+    assert "Invalid request" in responses[None]["error"]
+
+
+def test_cli_serve_stdio():
+    context = algorithm_template_context_factory()
+    request = {"id": "a", "kind": "algorithm", "context": context}
+
+    result = CliRunner().invoke(
+        cli, ["serve", "--stdio"], input=json.dumps(request) + "\n"
+    )
+
+    assert result.exit_code == 0, result.output
+    (response,) = map(json.loads, result.stdout.splitlines())
+    assert response["id"] == "a"
+    assert "zip" in response
+
+
+@pytest.mark.parametrize(
+    "kind, context_factory",
+    (
+        ("pack", pack_context_factory),
+        ("algorithm", algorithm_template_context_factory),
+    ),
+)
+def test_service_validates_contexts_once(kind, context_factory):
+    context = context_factory()
+
+    with patch.object(
+        schemas, "_validate", wraps=schemas._validate
+    ) as validate:
+        with ForgeService() as service:
+            service.render(kind, context)
+        assert validate.call_count == 1
+
+        RENDERERS[kind](context)
+        assert validate.call_count == 2
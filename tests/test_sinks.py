@@ -0,0 +1,327 @@
+import os
+import stat
+import zipfile
+from io import BytesIO
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+from grand_challenge_forge import sinks
+from grand_challenge_forge.forge import generate_challenge_pack
+from grand_challenge_forge.sinks import (
+    COMPRESSION_METHODS,
+    DirectorySink,
+    MemorySink,
+    SyncDirectorySink,
+    ZipSink,
+    as_sink,
+    get_compression,
+)
+from tests.utils import (
+    deterministic_uuids,
+    pack_context_factory,
+    zip_bytes,
+)
+
+
+def test_as_sink():
+    sink = MemorySink()
+    assert as_sink(sink) is sink
+
+    with zipfile.ZipFile(BytesIO(), "w") as zip_file:
+        assert isinstance(as_sink(zip_file), ZipSink)
+
+    with pytest.raises(TypeError):
+        as_sink(BytesIO())
+
+
+def test_zip_sink_modes(tmp_path):
+    source_file = tmp_path / "source.sh"
+    source_file.write_text("echo")
+    source_file.chmod(0o755)
+
+    zip_handle = BytesIO()
+    with zipfile.ZipFile(zip_handle, "w") as zip_file:
+        sink = ZipSink(zip_file)
+        sink.add("a.txt", "a")
+        sink.add("b.sh", b"b", mode=0o700)
+        sink.add_file(source_file, "c.sh")
+        sink.add_file(source_file, "d.sh", mode=0o644)
+
+    with zipfile.ZipFile(zip_handle) as zip_file:
+        modes = {
+            zinfo.filename: stat.S_IMODE(zinfo.external_attr >> 16)
+            for zinfo in zip_file.infolist()
+        }
+        assert zip_file.read("d.sh") == b"echo"
+
+    # Sanity: zipfile defaults to user read/write
+    assert modes == {
+        "a.txt": 0o600,
+        "b.sh": 0o700,
+        "c.sh": 0o755,
+        "d.sh": 0o644,
+    }
+
+
+def zip_pack(context, **sink_options):
+    return zipfile.ZipFile(
+        BytesIO(
+            zip_bytes(
+                generate_challenge_pack,
+                sink_options=sink_options,
+                target_zpath=Path("pack"),
+                context=context,
+            )
+        )
+    )
+
+
+@pytest.mark.parametrize("max_workers", (None, 4))
+@pytest.mark.parametrize("compression", COMPRESSION_METHODS.values())
+def test_zip_sink_compression(compression, max_workers):
+    context = pack_context_factory()
+
+    with deterministic_uuids():
+        expected = zip_pack(context)
+    with deterministic_uuids():
+        result = zip_pack(
+            context,
+            compression=compression,
+            compresslevel=9 if compression == zipfile.ZIP_DEFLATED else None,
+            max_workers=max_workers,
+            max_pending=2,
+        )
+
+    assert result.testzip() is None
+    # Members are written in order of addition
+    assert result.namelist() == expected.namelist()
+
+    for expected_info, info in zip(
+        expected.infolist(), result.infolist(), strict=True
+    ):
+        assert info.compress_type == compression
+        assert info.external_attr == expected_info.external_attr
+        assert result.read(info) == expected.read(expected_info)
+
+
+def test_get_compression():
+    assert get_compression("deflate") == zipfile.ZIP_DEFLATED
+
+    with pytest.raises(ValueError):
+        get_compression("zstd")
+
+
+def test_directory_sink(tmp_path):
+    with DirectorySink(tmp_path, max_pending=2) as sink:
+        for idx in range(10):
+            sink.add(Path("a") / f"{idx}.sh", f"echo {idx}", mode=0o750)
+
+    for idx in range(10):
+        path = tmp_path / "a" / f"{idx}.sh"
+        assert path.read_text() == f"echo {idx}"
+        assert stat.S_IMODE(path.stat().st_mode) == 0o750
+
+
+def test_sinks_produce_same_members(tmp_path):
+    context = pack_context_factory()
+
+    memory_sink = MemorySink()
+    generate_challenge_pack(
+        output_zip_file=memory_sink,
+        target_zpath=Path("pack"),
+        context=context,
+    )
+
+    with DirectorySink(tmp_path) as directory_sink:
+        generate_challenge_pack(
+            output_zip_file=directory_sink,
+            target_zpath=Path("pack"),
+            context=context,
+        )
+
+    written = {
+        path.relative_to(tmp_path)
+        for path in tmp_path.glob("**/*")
+        if path.is_file()
+    }
+    assert len(written) == len(memory_sink)
+    assert Path("pack/README.md") in written
+
+
+@pytest.mark.parametrize("max_workers", (None, 2))
+def test_zip_sink_add_chunks(max_workers):
+    buffer = BytesIO()
+    with zipfile.ZipFile(buffer, "w") as zip_file:
+        with ZipSink(zip_file, max_workers=max_workers) as sink:
+            sink.add("a.txt", "a")
+            sink.add_chunks("b.txt", iter(["b", b"b" * 100_000]), mode=0o750)
+            sink.add("c.txt", "c")
+
+    with zipfile.ZipFile(buffer) as zip_file:
+        assert zip_file.namelist() == ["a.txt", "b.txt", "c.txt"]
+        assert zip_file.read("b.txt") == b"b" * 100_001
+        assert zip_file.getinfo("b.txt").external_attr >> 16 & 0o777 == 0o750
+
+
+@pytest.mark.parametrize("precompressed", (True, False))
+def test_zip_sink_parallel_compression(precompressed):
+    if precompressed and not sinks._WRITES_PRECOMPRESSED:
+        pytest.skip("Parallel compression is not supported")
+
+    buffer = BytesIO()
+    with (
+        patch.object(sinks, "_WRITES_PRECOMPRESSED", precompressed),
+        zipfile.ZipFile(buffer, "w") as zip_file,
+    ):
+        with ZipSink(
+            zip_file,
+            compression=zipfile.ZIP_DEFLATED,
+            max_workers=2,
+            max_pending=1,
+        ) as sink:
+            assert (sink._executor is not None) == precompressed
+            for name in "abc":
+                sink.add(f"{name}.txt", name * 10_000, mode=0o640)
+
+    with zipfile.ZipFile(buffer) as zip_file:
+        assert zip_file.testzip() is None
+        assert zip_file.namelist() == ["a.txt", "b.txt", "c.txt"]
+        for info in zip_file.infolist():
+            assert info.compress_type == zipfile.ZIP_DEFLATED
+            assert info.compress_size < info.file_size
+            assert info.external_attr >> 16 & 0o777 == 0o640
+        assert zip_file.read("b.txt") == b"b" * 10_000
+
+
+def test_zip_sink_add_chunks_compresslevel():
+    def compress_size(compresslevel):
+        buffer = BytesIO()
+        with zipfile.ZipFile(buffer, "w") as zip_file:
+            ZipSink(
+                zip_file,
+                compression=zipfile.ZIP_DEFLATED,
+                compresslevel=compresslevel,
+            ).add_chunks("a.txt", iter([b"a" * 10_000]))
+        with zipfile.ZipFile(buffer) as zip_file:
+            assert zip_file.read("a.txt") == b"a" * 10_000
+            return zip_file.getinfo("a.txt").compress_size
+
+    assert compress_size(0) > 10_000 > compress_size(9)
+
+
+def test_add_chunks_to_sinks(tmp_path):
+    chunks = ["a", b"b", "c"]
+
+    memory_sink = MemorySink()
+    memory_sink.add_chunks("x/y.txt", iter(chunks), mode=0o644)
+    assert list(memory_sink) == [(Path("x/y.txt"), b"abc", 0o644)]
+
+    with DirectorySink(tmp_path / "directory") as sink:
+        sink.add_chunks("x/y.txt", iter(chunks), mode=0o640)
+    path = tmp_path / "directory" / "x" / "y.txt"
+    assert path.read_bytes() == b"abc"
+    assert stat.S_IMODE(path.stat().st_mode) == 0o640
+
+    for _ in range(2):
+        with SyncDirectorySink(
+            tmp_path / "sync", manifest_path=tmp_path / "manifest.json"
+        ) as sink:
+            sink.add_chunks("x/y.txt", iter(chunks))
+    assert sink.skipped == 1
+    assert (tmp_path / "sync" / "x" / "y.txt").read_bytes() == b"abc"
+
+
+def test_sync_directory_sink(tmp_path):
+    output_path = tmp_path / "output"
+    manifest_path = tmp_path / "manifest.json"
+
+    def sync(members):
+        with SyncDirectorySink(
+            output_path, manifest_path=manifest_path
+        ) as sink:
+            for zpath, content in members.items():
+                sink.add(zpath, content, mode=0o644)
+        return sink
+
+    sync({"a.txt": "a", "b.txt": "b", "c/d.txt": "d"})
+
+    # Make the initial files distinguishable by their modification time
+    for path in output_path.glob("**/*.txt"):
+        os.utime(path, (0, 0))
+
+    sink = sync({"a.txt": "a", "b.txt": "changed"})
+
+    assert (sink.skipped, sink.removed) == (1, 1)
+    assert (output_path / "a.txt").stat().st_mtime == 0
+    assert (output_path / "b.txt").read_text() == "changed"
+    assert (output_path / "b.txt").stat().st_mtime != 0
+    assert not (output_path / "c").exists()
+
+
+def test_sync_directory_sink_rewrites_after_error(tmp_path):
+    output_path = tmp_path / "output"
+    manifest_path = tmp_path / "manifest.json"
+
+    with SyncDirectorySink(output_path, manifest_path=manifest_path) as sink:
+        sink.add("a.txt", "a")
+        sink.add("b.txt", "b")
+
+    with pytest.raises(RuntimeError):
+        with SyncDirectorySink(
+            output_path, manifest_path=manifest_path
+        ) as sink:
+            sink.add("a.txt", "changed")
+            raise RuntimeError
+
+    # Sanity: the file is not restored
+    assert (output_path / "a.txt").read_text() == "changed"
+
+    with SyncDirectorySink(output_path, manifest_path=manifest_path) as sink:
+        sink.add("a.txt", "a")
+        sink.add("b.txt", "b")
+
+    assert sink.skipped == 1
+    assert (output_path / "a.txt").read_text() == "a"
+
+
+def test_sync_directory_sink_restores_edits_of_the_same_size(tmp_path):
+    output_path = tmp_path / "output"
+    manifest_path = tmp_path / "manifest.json"
+
+    def sync():
+        with SyncDirectorySink(
+            output_path, manifest_path=manifest_path
+        ) as sink:
+            sink.add("a.txt", "abc")
+            sink.add("b.txt", "def")
+        return sink
+
+    sync()
+    (output_path / "a.txt").write_text("xyz")
+    os.utime(output_path / "b.txt", (0, 0))
+
+    sink = sync()
+
+    assert sink.skipped == 1
+    assert (output_path / "a.txt").read_text() == "abc"
+    assert (output_path / "b.txt").stat().st_mtime == 0
+
+
+def test_sync_directory_sink_without_manifest(tmp_path):
+    output_path = tmp_path / "output"
+    for name in ("root/a.txt", "root/old/b.txt", "other.txt"):
+        (output_path / name).parent.mkdir(parents=True, exist_ok=True)
+        (output_path / name).write_text("old")
+
+    with SyncDirectorySink(
+        output_path, manifest_path=tmp_path / "manifest.json", root="root"
+    ) as sink:
+        sink.add("root/a.txt", "a", mode=0o644)
+
+    # Without a manifest, files in the root that were not added are stale
+    assert sink.removed == 1
+    assert (output_path / "root" / "a.txt").read_text() == "a"
+    assert not (output_path / "root" / "old").exists()
+    assert (output_path / "other.txt").exists()
@@ -0,0 +1,122 @@
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+from grand_challenge_forge import generation_utils, streaming
+from grand_challenge_forge.exceptions import InvalidContextError
+from grand_challenge_forge.forge import (
+    generate_algorithm_template,
+    generate_challenge_pack,
+)
+from grand_challenge_forge.streaming import (
+    iter_algorithm_template_files,
+    iter_pack_files,
+)
+from tests.utils import (
+    algorithm_template_context_factory,
+    deterministic_uuids,
+    pack_context_factory,
+    zip_members,
+)
+
+
+@pytest.mark.parametrize(
+    "iter_files, generate, context_factory",
+    (
+        (iter_pack_files, generate_challenge_pack, pack_context_factory),
+        (
+            iter_algorithm_template_files,
+            generate_algorithm_template,
+            algorithm_template_context_factory,
+        ),
+    ),
+)
+def test_iter_files_matches_generate(iter_files, generate, context_factory):
+    context = context_factory()
+
+    with deterministic_uuids():
+        expected = zip_members(
+            generate, context=context, target_zpath=Path("output")
+        )
+
+    with deterministic_uuids():
+        members = {
+            str(member.path): member.read()
+            for member in iter_files(
+                context=context, target_zpath=Path("output")
+            )
+        }
+
+    assert members == expected
+
+
+def test_iter_pack_files_renders_lazily():
+    with patch.object(
+        generation_utils,
+        "_render_template",
+        wraps=generation_utils._render_template,
+    ) as render:
+        members = iter_pack_files(
+            context=pack_context_factory(), target_zpath="pack"
+        )
+        paths = [member.path for member in members]
+        assert render.call_count == 0
+
+        members = iter_pack_files(
+            context=pack_context_factory(), target_zpath="pack"
+        )
+        for member in members:
+            if member.path.name == "README.md":
+                content = member.read()
+                break
+        assert render.call_count == 1
+
+    assert content.startswith(b"#")
+    assert Path("pack/README.md") in paths
+
+
+def test_iter_pack_files_chunks_and_modes():
+    members = {
+        member.path.name: member
+        for member in iter_pack_files(
+            context=pack_context_factory(), target_zpath="pack"
+        )
+    }
+
+    # Copied files are read in chunks, on request
+    chunks = members["Dockerfile"].chunks()
+    assert not isinstance(chunks, bytes)
+    assert b"".join(chunks)
+
+    assert members["do_build.sh"].mode & 0o111
+
+
+def test_iter_pack_files_validates_when_called():
+    with pytest.raises(InvalidContextError):
+        iter_pack_files(context={}, target_zpath="pack")
+
+
+def test_iter_pack_files_generates_while_consumed():
+    context = pack_context_factory()
+    total = len(list(iter_pack_files(context=context, target_zpath="pack")))
+
+    put = streaming._QueueSink._put
+    items = []
+
+    def counted_put(self, item):
+        items.append(item)
+        return put(self, item)
+
+    with (
+        patch.object(streaming, "MAX_QUEUED", 1),
+        patch.object(streaming._QueueSink, "_put", counted_put),
+    ):
+        members = iter_pack_files(context=context, target_zpath="pack")
+        assert items == []
+
+        next(members)
+        members.close()
+
+    # The one consumed, one queued and one blocked member at most
+    assert len(items) <= 3 < total
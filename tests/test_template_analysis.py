@@ -0,0 +1,70 @@
+from datetime import datetime
+from types import MappingProxyType
+
+import pytest
+from jinja2 import Environment
+
+from grand_challenge_forge.template_analysis import (
+    context_digest,
+    find_context_reads,
+    resolve_read,
+)
+
+
+def reads_of(source):
+    return find_context_reads(Environment().parse(source))
+
+
+@pytest.mark.parametrize(
+    "source, expected",
+    (
+        ("{{ phase.slug }}", {("phase", ("attr", "slug"))}),
+        (
+            "{{ phase['archive'].url }}",
+            {("phase", ("item", "archive"), ("attr", "url"))},
+        ),
+        # Dynamic lookups read the whole prefix
+        ("{{ phase[key] }}", {("phase",), ("key",)}),
+        ("{% for s in sockets %}{{ s.slug }}{% endfor %}", {("sockets",)}),
+        # Names that are assigned do not come from the context...
+        ("{% set x = 1 %}{{ x }}", set()),
+        # ...unless they are read before being assigned
+        (
+            "{{ x.y }}{% set x = 1 %}",
+            {("x",)},
+        ),
+        ("{{ now.year }}", {("now", ("attr", "year"))}),
+        ("{{ items | join(sep) }}", {("items",), ("sep",)}),
+    ),
+)
+def test_find_context_reads(source, expected):
+    assert reads_of(source) == expected
+
+
+def test_resolve_read():
+    context = {
+        "phase": MappingProxyType({"slug": "a", "items": [1, 2]}),
+        "now": datetime(2025, 1, 1),
+    }
+
+    assert resolve_read(context, ("phase", ("attr", "slug"))) == "a"
+    assert resolve_read(context, ("now", ("attr", "year"))) == 2025
+    # Attributes of the mapping itself shadow its items
+    assert resolve_read(context, ("phase", ("attr", "items"))) == (
+        context["phase"]
+    )
+    assert (
+        resolve_read(context, ("phase", ("item", "items"), ("item", 1))) == 2
+    )
+
+
+def test_context_digest_only_depends_on_reads():
+    reads = reads_of("{{ phase.algorithm_interfaces }}")
+
+    first = {"phase": {"slug": "a", "algorithm_interfaces": [1]}}
+    second = {"phase": {"slug": "b", "algorithm_interfaces": [1]}}
+    third = {"phase": {"slug": "a", "algorithm_interfaces": (1,)}}
+
+    assert context_digest(first, reads) == context_digest(second, reads)
+    assert context_digest(first, reads) != context_digest(third, reads)
+    assert context_digest(first, reads) != context_digest({}, reads)
@@ -1,12 +1,17 @@
 import os
 import subprocess
+import uuid
+import zipfile
 from collections import Counter
 from contextlib import contextmanager
 from copy import deepcopy
+from io import BytesIO
+from itertools import count
 from pathlib import Path
 from unittest.mock import patch
 
 from grand_challenge_forge import RESOURCES_PATH
+from grand_challenge_forge.sinks import ZipSink
 
 TEST_RESOURCES = (
     Path(os.path.dirname(os.path.realpath(__file__))) / "resources"
@@ -371,6 +376,34 @@ def algorithm_template_context_factory(**kwargs):
     return make_slugs_unique(result)
 
 
+def deterministic_uuids():
+    """Patch uuid4 to return sequential UUIDs, so generations can be compared"""
+    counter = count()
+    return patch("uuid.uuid4", lambda: uuid.UUID(int=next(counter)))
+
+
+def zip_bytes(generate, *, sink_options=None, **kwargs):
+    """Generate into an in-memory zip file and return its content"""
+    buffer = BytesIO()
+    with zipfile.ZipFile(buffer, "w") as zip_file:
+        with ZipSink(zip_file, **(sink_options or {})) as sink:
+            generate(output_zip_file=sink, **kwargs)
+    return buffer.getvalue()
+
+
+def zip_members(generate, **kwargs):
+    """Generate into an in-memory zip file and return its members by name"""
+    with zipfile.ZipFile(BytesIO(zip_bytes(generate, **kwargs))) as zip_file:
+        return {
+            info.filename: zip_file.read(info) for info in zip_file.infolist()
+        }
+
+
+def members_of(sink):
+    """Return the members of a MemorySink by their zpath"""
+    return {str(zpath): content for zpath, content, _ in sink}
+
+
 def _test_script_run(
     *,
     script_path,